@@ -2,8 +2,8 @@
 # TODO title bar is incorrect (shows app title, not current thumbwin title)
 
 from tkinter import *
-from tkinter.scrolledtext import *
 from CreateToolTip import *
+from TagPalette import TagPalette
 
 class FilterView(Toplevel):
     
@@ -47,7 +47,7 @@ class FilterView(Toplevel):
         blah.grid(row=4, column=1, columnspan=1, pady=2, ipady=2)
         
         # Folder-wide tags row
-        self.btnFrame = ScrolledText(self, height=12, wrap="word")
+        self.btnFrame = TagPalette(self, onclick=self.addToCurrentTag, height=12)
         self.btnFrame.grid(row=5,column=0,columnspan=2,sticky='nsew',pady=3)
         
         self.updateCurrentTags()
@@ -122,19 +122,7 @@ class FilterView(Toplevel):
     
     def updateCurrentTags(self):
         self.masterTagList = sorted(self.masterTagList)
-        
-        # for each tag in masterTagList
-        #   create a button
-        
-        self.btnFrame.configure(state="normal")
-        self.btnFrame.delete('1.0', END) 
-        for atag in self.masterTagList:
-
-            handler = lambda whichtag=atag: self.addToCurrentTag(whichtag)
-            abtn = Button(self.btnFrame, text=f" {atag} ", padx=2, pady=2, command=handler)
-            self.btnFrame.window_create("insert", window=abtn, padx=2, pady=2)
-
-        self.btnFrame.configure(state="disabled")
+        self.btnFrame.setTags(self.masterTagList)
 
     def onClosing(self):
       # TODO HACK inform the main win we're being closed
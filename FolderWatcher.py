@@ -0,0 +1,181 @@
+"""
+===============================================================================
+Watch an open image folder for files added, removed, edited, or re-tagged
+by other programs, so its window can update just those files' thumbs, tags,
+and buttons, instead of the user reopening the folder (which re-ran the full
+makeThumbs_pklfile reconciliation).
+
+On Linux, this uses inotify through ctypes (no extra packages): the kernel
+queues the names of changed files, and each poll is one non-blocking read.
+Elsewhere, or if inotify is unavailable (e.g., its watch limit is reached),
+it polls: a folder-modtime stat() on each poll catches adds, removes, and
+renames, and a scandir() of all sizes and modtimes, every FULLSCANS polls,
+catches in-place edits.
+
+Either way the result is only a set of changed filenames; what a change
+means (add, remove, or edit) is decided by looking at the file when changes
+are applied, which also coalesces bursts like create+write+rename.  Changes
+are collected until the folder has been quiet for SETTLEMS, so half-written
+files aren't thumbnailed, and are delivered on the Tk thread via after().
+===============================================================================
+"""
+
+import os, sys, struct, time, traceback
+
+POLLMS    = 250      # msecs between inotify reads
+SLOWPOLLMS = 2000    # msecs between polls, if no inotify
+FULLSCANS = 5        # polls per full rescan, if no inotify
+SETTLEMS  = 750      # quiet msecs before changes are delivered
+
+# inotify constants, from <sys/inotify.h>
+IN_ATTRIB      = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM  = 0x00000040
+IN_MOVED_TO    = 0x00000080
+IN_CREATE      = 0x00000100
+IN_DELETE      = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF   = 0x00000800
+IN_Q_OVERFLOW  = 0x00004000
+IN_IGNORED     = 0x00008000
+IN_NONBLOCK    = os.O_NONBLOCK
+IN_CLOEXEC     = 0o2000000
+
+WATCHMASK = (IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO |
+             IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF)
+LOSTTRACK = IN_Q_OVERFLOW | IN_DELETE_SELF | IN_MOVE_SELF | IN_IGNORED
+
+
+class InotifyWatch:
+    """
+    changes() returns names changed since the last call, or None if events
+    were lost (queue overflow) or the folder itself went away
+    """
+    EVENT = struct.Struct('iIII')     # wd, mask, cookie, len; then name
+
+    def __init__(self, imgdir):
+        if not sys.platform.startswith('linux'):
+            raise OSError('no inotify')
+        import ctypes, ctypes.util
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        if libc.inotify_add_watch(self.fd, os.fsencode(imgdir), WATCHMASK) < 0:
+            errno = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(errno, 'inotify_add_watch failed')     # e.g., ENOSPC
+
+    def changes(self):
+        names, lost = set(), False
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset < len(data):
+                wd, mask, cookie, namelen = self.EVENT.unpack_from(data, offset)
+                offset += self.EVENT.size
+                name = data[offset:offset + namelen].rstrip(b'\0')
+                offset += namelen
+                if mask & LOSTTRACK:
+                    lost = True
+                elif name:
+                    names.add(os.fsdecode(name))
+        return None if lost else names
+
+    def close(self):
+        os.close(self.fd)
+
+
+class PollWatch:
+    """
+    same interface, by comparing scandir() snapshots; the full scan runs
+    only when the folder's modtime has changed, or every FULLSCANS polls
+    """
+    def __init__(self, imgdir):
+        self.imgdir = imgdir
+        self.dirtime = self.getDirTime()
+        self.snapshot = self.scan()
+        self.polls = 0
+
+    def getDirTime(self):
+        try:
+            return os.stat(self.imgdir).st_mtime_ns
+        except OSError:
+            return None
+
+    def scan(self):
+        snapshot = {}
+        try:
+            for entry in os.scandir(self.imgdir):
+                try:
+                    if entry.is_file():
+                        stat = entry.stat()
+                        snapshot[entry.name] = (stat.st_mtime_ns, stat.st_size)
+                except OSError:
+                    pass                            # removed while scanning
+        except OSError:
+            pass                                    # folder gone: all removed
+        return snapshot
+
+    def changes(self):
+        self.polls += 1
+        dirtime = self.getDirTime()
+        if dirtime == self.dirtime and self.polls % FULLSCANS:
+            return set()
+        self.dirtime = dirtime
+        oldsnap, self.snapshot = self.snapshot, self.scan()
+        return {name for name in oldsnap.keys() | self.snapshot.keys()
+                         if oldsnap.get(name) != self.snapshot.get(name)}
+
+    def close(self):
+        pass
+
+
+class FolderWatcher:
+    """
+    ---------------------------------------------------------------------------
+    Calls onchanges(names) on widget's Tk thread with a set of changed
+    filenames (not filtered: the client knows which it shows), or with None
+    if the watch lost track and the client should check all its files.
+    Names in ignore (e.g., the thumbs cache file) are never reported.
+    stop() ends the watch: call it when the folder's window is closed.
+    ---------------------------------------------------------------------------
+    """
+    def __init__(self, widget, imgdir, onchanges, ignore=()):
+        self.widget = widget
+        self.onchanges = onchanges
+        self.ignore = set(ignore)
+        try:
+            self.backend, self.pollms = InotifyWatch(imgdir), POLLMS
+        except (OSError, AttributeError):
+            self.backend, self.pollms = PollWatch(imgdir), SLOWPOLLMS
+        self.pending = set()
+        self.lost = False
+        self.lastchange = 0
+        self.timer = self.widget.after(self.pollms, self.poll)
+
+    def poll(self):
+        names = self.backend.changes()
+        now = time.monotonic()
+        if names is None:
+            self.lost, self.lastchange = True, now
+        elif names - self.ignore:
+            self.pending |= names - self.ignore
+            self.lastchange = now
+        elif (self.pending or self.lost) and (now - self.lastchange) * 1000 >= SETTLEMS:
+            names = None if self.lost else self.pending
+            self.pending, self.lost = set(), False
+            try:
+                self.onchanges(names)
+            except Exception:
+                traceback.print_exc()               # keep watching regardless
+        self.timer = self.widget.after(self.pollms, self.poll)
+
+    def stop(self):
+        if self.timer is not None:
+            self.widget.after_cancel(self.timer)
+            self.timer = None
+            self.backend.close()
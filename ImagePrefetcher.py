@@ -0,0 +1,249 @@
+"""
+===============================================================================
+Background prefetch and decoded-image LRU cache for ViewOne's next/prior.
+
+ViewOne formerly started reading, decoding, and reorienting the next image
+only after N or P was pressed, which takes about a second per step for 40MP
+photos.  Here, a worker thread decodes the current image's neighbors in the
+current navigation direction while the user looks at (and tags) the current
+one, and keeps a bounded LRU of the resulting oriented, screen-fitted images,
+so that paging through a folder shows each image at once.  The same worker
+also decodes the image the user asks for, so the GUI never blocks on it.
+
+Images are decoded at roughly screen scale (see loadImageScaled), so each
+cached entry is a screen fit, the image's full-size dimensions, and the
+reduced decode itself, which ViewOne zooms and resizes from; it loads full
+resolution only when an operation needs more than the decode has.
+
+Only Pillow work runs in the worker thread; all Tk calls remain in ViewOne
+on the main thread.  Cache keys include file modtime, so edited images are
+redecoded, and the fit size, so changed screen/view sizes don't reuse fits.
+===============================================================================
+"""
+
+import os, threading, traceback
+from collections import OrderedDict
+from PIL import Image
+from viewer_thumbs import openImageSafely, reorientImage, getExifTags, loadCodecPlugins
+from perfstats import span
+
+
+def scaleToFit(imgsize, scrsize, scale=.90):
+    """
+    ---------------------------------------------------------------------------
+    Size to fit both height and width of screen, allowing scale for window
+    borders (as in ViewOne.onSizeToDisplayBoth), keeping the aspect ratio.
+    ---------------------------------------------------------------------------
+    """
+    imgwide, imghigh = imgsize
+    scrwide, scrhigh = (int(x * scale) for x in scrsize)
+    ratio = min(1.0, scrwide / imgwide, scrhigh / imghigh)
+    return (max(int(imgwide * ratio), 1), max(int(imghigh * ratio), 1))
+
+
+def loadImage(imgpath):
+    """
+    open, fully load (so errors happen now), and reorient an image
+    """
+    with span('view.decode'):
+        imgpil = openImageSafely(imgpath)     # [2.2] avoid pillow files bug
+        imgpil.load()                         # [2.1] load now so errors here
+        return reorientImage(imgpil)          # [2.2] right-side up, iff needed
+
+
+def loadImageScaled(imgpath, scrsize):
+    """
+    ---------------------------------------------------------------------------
+    Decode an image at roughly the scale needed to fit scrsize, instead of
+    at full size: a 100MP image need not be fully decoded to show 2MP.
+    JPEGs use Pillow's draft() to have the decoder itself scale by 1/2,
+    1/4, or 1/8; any remaining excess of 2X or more is cut by reduce(),
+    a fast integer box downscale.  The result is never smaller than the
+    fit, so fitImage() finishes with a LANCZOS resize as before.
+
+    Returns (oriented image, oriented full-size (W, H)).  Reorientation
+    must precede reduce(): its Exif tags are only on the opened image.
+    ---------------------------------------------------------------------------
+    """
+    with span('view.decode'):
+        return decodeScaled(imgpath, scrsize)
+
+
+def decodeScaled(imgpath, scrsize):
+    imgpil = openImageSafely(imgpath)
+    rotated = getExifTags(imgpil).get('Orientation') in (6, 8)
+    rawsize = imgpil.size
+    truesize = (rawsize[1], rawsize[0]) if rotated else rawsize
+
+    fitwide, fithigh = scaleToFit(truesize, scrsize)
+    if (fitwide, fithigh) != truesize:                     # won't be shown full
+        rawfit = (fithigh, fitwide) if rotated else (fitwide, fithigh)
+        imgpil.draft(None, rawfit)                         # JPEG only, else no-op
+    imgpil.load()                                          # errors here, as before
+    imgpil = reorientImage(imgpil)
+
+    factor = min(imgpil.size[0] // fitwide, imgpil.size[1] // fithigh)
+    if factor >= 2 and hasattr(imgpil, 'reduce'):          # Pillow 7.0+
+        imgpil = imgpil.reduce(factor)
+    return imgpil, truesize
+
+
+def fitSize(truesize, scrsize):
+    """
+    the size ViewOne first draws: actual if it fits, else fit to screen
+    """
+    imgwide, imghigh = truesize
+    scrwide, scrhigh = scrsize
+    if imgwide <= scrwide and imghigh <= scrhigh:
+        return truesize
+    return scaleToFit(truesize, scrsize)
+
+
+def peekImageSize(imgpath):
+    """
+    oriented full-size (W, H) from the image header only: no decode
+    """
+    loadCodecPlugins(imgpath)
+    with open(imgpath, 'rb') as fileobj:
+        imgpil = Image.open(fileobj)
+        wide, high = imgpil.size
+        rotated = getExifTags(imgpil).get('Orientation') in (6, 8)
+    return (high, wide) if rotated else (wide, high)
+
+
+def fitImage(imgpil, scrsize, truesize=None):
+    """
+    the image ViewOne first draws: actual size if it fits the screen,
+    else a LANCZOS downsize to fit (see ViewOne.drawImageFirst); pass
+    truesize if imgpil was decoded at reduced scale by loadImageScaled
+    """
+    newsize = fitSize(tuple(truesize or imgpil.size), scrsize)
+    if imgpil.size == newsize:
+        return imgpil
+    filter = Image.LANCZOS if hasattr(Image, 'LANCZOS') else Image.ANTIALIAS
+    with span('view.fit'):
+        return imgpil.resize(newsize, filter)
+
+
+def cacheKey(imgpath, scrsize):
+    try:
+        modtime = os.stat(imgpath).st_mtime_ns
+    except OSError:
+        modtime = None
+    return (imgpath, modtime, tuple(scrsize))
+
+
+class ImagePrefetcher:
+    """
+    ---------------------------------------------------------------------------
+    One worker thread, two kinds of work, both keyed by cacheKey():
+
+    request(path, scrsize) asks for the image the user wants to see now: it
+    goes ahead of all prefetches, and replaces any earlier request not yet
+    started, so a newer N/P press cancels a decode that's no longer needed
+    (a decode already running can't be interrupted; its result is kept in
+    the LRU, where going back finds it).  poll(key) reports its progress.
+
+    prefetch(paths, scrsize) replaces any not-yet-started prefetches with
+    paths (nearest first).  get(path, scrsize) returns a cached entry or
+    None, without waiting.
+
+    Cache entries are (reduced decode, fitted image, full-size (W, H)), as
+    ViewOne.setImage takes them; the fit is the decode itself if it fits.
+    ---------------------------------------------------------------------------
+    """
+    def __init__(self, maxitems=8):
+        self.maxitems = maxitems
+        self.cache = OrderedDict()          # key => (decoded, fit, truesize), LRU order
+        self.lock = threading.Condition()   # guards all state below
+        self.urgent = None                  # key of the latest request()
+        self.wanted = []                    # prefetch keys, nearest first
+        self.inflight = None                # key being decoded by worker
+        self.requested = set()              # keys request()ed, not yet done
+        self.failed = set()                 # requested keys that wouldn't load
+        self.thread = None
+
+    def startWorker(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.worker, daemon=True)
+            self.thread.start()
+
+    def request(self, imgpath, scrsize):
+        key = cacheKey(imgpath, scrsize)
+        with self.lock:
+            self.failed.discard(key)
+            if key not in self.cache:
+                self.requested.add(key)       # even if in flight as a prefetch
+                if key != self.inflight:
+                    self.requested.discard(self.urgent)
+                    self.urgent = key         # supersedes any older request
+                    self.lock.notify()
+        self.startWorker()
+        return key
+
+    def poll(self, key):
+        """
+        (done, entry): entry is None when done if the image failed to load
+        """
+        with self.lock:
+            if key in self.cache:
+                self.cache.move_to_end(key)
+                return True, self.cache[key]
+            if key in self.failed:
+                self.failed.discard(key)
+                return True, None
+            return False, None
+
+    def prefetch(self, imgpaths, scrsize):
+        keys = [cacheKey(path, scrsize) for path in imgpaths]
+        with self.lock:
+            self.wanted = [key for key in keys if key not in self.cache]
+            self.lock.notify()
+        self.startWorker()
+
+    def get(self, imgpath, scrsize):
+        key = cacheKey(imgpath, scrsize)
+        with self.lock:
+            entry = self.cache.get(key)
+            if entry is not None:
+                self.cache.move_to_end(key)
+            return entry
+
+    def insert(self, key, entry):
+        # caller holds lock
+        self.cache[key] = entry
+        self.cache.move_to_end(key)
+        while len(self.cache) > self.maxitems:
+            self.cache.popitem(last=False)
+
+    def worker(self):
+        while True:
+            with self.lock:
+                while self.urgent is None and not self.wanted:
+                    self.lock.wait()
+                if self.urgent is not None:
+                    key, self.urgent = self.urgent, None
+                else:
+                    key = self.wanted.pop(0)
+                if key in self.cache:
+                    self.requested.discard(key)
+                    continue
+                self.inflight = key
+            imgpath, modtime, scrsize = key
+            try:
+                imgpil, truesize = loadImageScaled(imgpath, scrsize)
+                entry = (imgpil, fitImage(imgpil, scrsize, truesize), truesize)
+            except Exception:
+                error = traceback.format_exc()
+                entry = None
+            with self.lock:
+                # requested before or during the decode: a failure is reported
+                requested = key in self.requested
+                self.requested.discard(key)
+                if entry is not None:
+                    self.insert(key, entry)
+                elif requested:
+                    self.failed.add(key)
+                self.inflight = None
+            if entry is None and requested:
+                print(error, end='')             # ViewOne reports it in GUI
@@ -0,0 +1,142 @@
+"""
+===============================================================================
+PyPhoto's "Library Search" window: tag searches across all folders in a
+library tree, answered from its tag database (see TagLibrary.py).
+
+The window lists the images matching the current search, as paths relative
+to the library root; double-clicking one opens its folder's thumbs window
+via the onopen(folder, imgfile) callback.  "Search..." opens a FilterView
+on all of the library's tags; "Refresh" brings the database up to date with
+the tree in a thread (scans can take a while in large trees), then reruns
+the search.  A new library is refreshed on first open.
+===============================================================================
+"""
+
+import os, threading, traceback
+from tkinter import *
+from FilterView import FilterView
+from TagLibrary import TagLibrary
+
+POLLMS = 200     # msecs between checks for a finished refresh
+
+
+class LibraryView(Toplevel):
+
+    def __init__(self, root, onopen):
+        Toplevel.__init__(self)
+        self.title('PyPhoto Library: ' + root)
+        self.geometry('700x500')
+        self.library = TagLibrary(root)
+        self.onopen = onopen
+        self.searchtags = []
+        self.results = []
+        self.filterview = None
+        self.refreshing = None           # thread, while refreshing
+
+        # buttons row
+        btns = Frame(self)
+        Button(btns, text=' Search... ', command=self.clickSearch).pack(side=LEFT, padx=5)
+        self.btnRefresh = Button(btns, text=' Refresh ', command=self.clickRefresh)
+        self.btnRefresh.pack(side=LEFT, padx=5)
+        self.status = Label(btns, anchor=W)
+        self.status.pack(side=LEFT, expand=YES, fill=X, padx=5)
+        btns.pack(side=TOP, fill=X, pady=3)
+
+        # results list
+        frame = Frame(self)
+        sbar = Scrollbar(frame)
+        self.listbox = Listbox(frame, yscrollcommand=sbar.set, activestyle='none')
+        sbar.config(command=self.listbox.yview)
+        sbar.pack(side=RIGHT, fill=Y)
+        self.listbox.pack(side=LEFT, expand=YES, fill=BOTH)
+        frame.pack(side=TOP, expand=YES, fill=BOTH)
+        self.listbox.bind('<Double-1>', self.onDoubleClick)
+        self.listbox.bind('<Return>', self.onDoubleClick)
+
+        self.protocol('WM_DELETE_WINDOW', self.onClosing)
+        if not self.library.statusCounts():
+            self.clickRefresh()          # new library: build it
+        else:
+            self.showStatus()
+
+    def showStatus(self, message=None):
+        if message is None:
+            images = sum(self.library.statusCounts().values())
+            if self.searchtags:
+                message = '%d of %d images have: %s' % (
+                           len(self.results), images, ', '.join(self.searchtags))
+            else:
+                message = '%d images: use Search to find tags' % images
+        self.status.config(text=message)
+
+    def runSearch(self):
+        # answer the current search from the database: no image reads
+        self.results = self.library.find(self.searchtags)
+        self.listbox.delete(0, END)
+        root = self.library.root
+        for path in self.results:
+            self.listbox.insert(END, os.path.relpath(path, root))
+        self.showStatus()
+
+    def clickSearch(self):
+        if self.filterview:             # search dialog is active
+            self.filterview.lift()
+            return
+        alltags = sorted(self.library.tagCounts())
+        self.filterview = FilterView(alltags, LibraryView.searchExec, self)
+        self.filterview.title('PyPhoto Library Search')
+
+    def searchExec(self, taglist):
+        # FilterView callback: None when the dialog is closed
+        if taglist is None:
+            self.filterview = None
+            return
+        self.searchtags = taglist
+        self.runSearch()
+
+    def clickRefresh(self):
+        if self.refreshing:
+            return
+        self.btnRefresh.config(state=DISABLED)
+        self.showStatus('Scanning library folders...')
+        self.refreshcounts = None
+        self.refreshing = threading.Thread(target=self.refreshThread, daemon=True)
+        self.refreshing.start()
+        self.after(POLLMS, self.checkRefresh)
+
+    def refreshThread(self):
+        # sqlite connections are per-thread: this one is just for the refresh
+        try:
+            library = TagLibrary(self.library.root, self.library.dbpath)
+            self.refreshcounts = library.refresh()
+            library.close()
+        except Exception:
+            traceback.print_exc()
+            self.refreshcounts = False
+
+    def checkRefresh(self):
+        if not self.winfo_exists():
+            return                      # closed while refreshing
+        if self.refreshing.is_alive():
+            self.after(POLLMS, self.checkRefresh)
+            return
+        self.refreshing = None
+        self.btnRefresh.config(state=NORMAL)
+        if self.refreshcounts is False:
+            self.showStatus('Library scan failed: see console')
+            return
+        self.runSearch()
+        read, removed, unchanged = self.refreshcounts
+        self.showStatus('Library refreshed: read %d, removed %d, unchanged %d' % (read, removed, unchanged))
+
+    def onDoubleClick(self, event):
+        selected = self.listbox.curselection()
+        if selected:
+            path = self.results[selected[0]]
+            self.onopen(os.path.dirname(path), os.path.basename(path))
+
+    def onClosing(self):
+        if self.filterview:
+            self.filterview.destroy()
+        self.library.close()             # a refresh has its own connection
+        self.destroy()
@@ -0,0 +1,157 @@
+"""
+===============================================================================
+Cached, index-backed image order for ViewOne's next/prior.
+
+ViewOne formerly listed, sorted, and mimetype-filtered the whole folder on
+every N/P press, then searched the result with list.index(): tens of msecs
+per keypress in 30k-file folders before any image I/O, and more on network
+shares.  Here, a folder's display order is built once, along with a
+filename => position dict, and is shared by all windows on that folder.  It
+is rebuilt only when the folder's modtime changes (files were added, removed,
+or renamed), at the cost of one stat() per step; steps are otherwise O(1).
+
+A NavIndex can also be limited to a subset of its folder: pyphoto sets it to
+the thumbs a folder window currently shows (win.currbtns, after Tagged,
+Untagged, or Search), so that N/P walks what the user sees.  A ListIndex
+does the same for an explicit list of files, e.g., the relative paths of a
+multi-folder tree window (see TreeThumbs.py).
+===============================================================================
+"""
+
+import os, bisect
+from viewer_thumbs import sortedDisplayOrder, isTaggableImage
+
+folders = {}     # absolute folder path => FolderOrder, shared by all windows
+
+
+class FolderOrder:
+    """
+    one folder's taggable images in thumbs-display order, with positions
+    """
+    def __init__(self, imgdir):
+        self.imgdir = imgdir
+        self.files = []
+        self.positions = {}       # imgfile => index in files
+        self.modtime = None
+        self.version = 0          # bumped on rebuilds, for subsets
+        self.built = False
+
+    def refresh(self):
+        try:
+            modtime = os.stat(self.imgdir).st_mtime_ns
+        except OSError:
+            modtime = None
+        if not self.built or modtime != self.modtime:
+            # [2.1] same order as thumbs display: see sortedDisplayOrder
+            self.files = list(filter(isTaggableImage, sortedDisplayOrder(self.imgdir)))
+            self.positions = {imgfile: ix for (ix, imgfile) in enumerate(self.files)}
+            self.modtime = modtime
+            self.version += 1
+            self.built = True
+        return self
+
+    def invalidate(self):
+        self.built = False        # rebuild on next use, e.g., on file changes
+
+
+def getFolderOrder(imgdir):
+    imgdir = os.path.abspath(imgdir)
+    if imgdir not in folders:
+        folders[imgdir] = FolderOrder(imgdir)
+    return folders[imgdir].refresh()
+
+
+class NavIndex:
+    """
+    ---------------------------------------------------------------------------
+    Next/prior stepping within a folder, or within a subset of it set by
+    setSubset(imgfiles) (None = whole folder).  A subset is kept in folder
+    order as a list of folder positions, redone only on folder rebuilds.
+    ---------------------------------------------------------------------------
+    """
+    def __init__(self, imgdir):
+        self.imgdir = imgdir
+        self.subnames = None      # subset's imgfiles, or None for all
+        self.subset = []          # subset's folder positions, sorted
+        self.subfiles = []        # subset's imgfiles, in folder order
+        self.subpositions = {}    # imgfile => index in subfiles
+        self.subversion = None    # folder version the subset was made for
+
+    def setSubset(self, imgfiles):
+        self.subnames = None if imgfiles is None else list(imgfiles)
+        self.subversion = None
+
+    def getFolder(self):
+        return getFolderOrder(self.imgdir)
+
+    def getOrder(self):
+        """
+        (files, positions, folder) for the whole folder or the subset
+        """
+        folder = self.getFolder()
+        if self.subnames is None:
+            return folder.files, folder.positions, folder
+        if self.subversion != folder.version:
+            self.subset = sorted(folder.positions[imgfile]
+                                 for imgfile in set(self.subnames)
+                                     if imgfile in folder.positions)
+            self.subfiles = [folder.files[ix] for ix in self.subset]
+            self.subpositions = {imgfile: ix for (ix, imgfile) in enumerate(self.subfiles)}
+            self.subversion = folder.version
+        return self.subfiles, self.subpositions, folder
+
+    def step(self, imgfile, offset):
+        """
+        the imgfile offset steps from imgfile, wrapping around; if imgfile
+        is not in the order (e.g., deleted), steps from where it would be;
+        None if there are no images
+        """
+        files, positions, folder = self.getOrder()
+        if not files:
+            return None
+        ix = positions.get(imgfile)
+        if ix is None:
+            # insertion point: the next image is there, the prior one before
+            folderix = folder.positions.get(imgfile)
+            if self.subnames is not None and folderix is not None:
+                after = bisect.bisect_left(self.subset, folderix)
+            else:
+                after = 0
+            ix = after - 1 if offset > 0 else after
+        return files[(ix + offset) % len(files)]
+
+    def neighbors(self, imgfile, direction, depth):
+        """
+        the next depth imgfiles in direction (+1 or -1), nearest first
+        """
+        return [self.step(imgfile, direction * count) for count in range(1, depth+1)]
+
+
+class ListOrder:
+    """
+    a FolderOrder for a given list of imgfiles, in the list's order
+    """
+    def __init__(self, imgfiles):
+        self.version = 0
+        self.setFiles(imgfiles)
+
+    def setFiles(self, imgfiles):
+        self.files = list(imgfiles)
+        self.positions = {imgfile: ix for (ix, imgfile) in enumerate(self.files)}
+        self.version += 1
+
+
+class ListIndex(NavIndex):
+    """
+    NavIndex stepping over a fixed list of imgfiles (e.g., paths relative
+    to a tree window's root folder) instead of a folder's listing
+    """
+    def __init__(self, imgfiles):
+        NavIndex.__init__(self, None)
+        self.order = ListOrder(imgfiles)
+
+    def setFiles(self, imgfiles):
+        self.order.setFiles(imgfiles)
+
+    def getFolder(self):
+        return self.order
@@ -0,0 +1,135 @@
+"""
+===============================================================================
+A watchdog for Tk main-loop stalls: what froze the GUI, and for how long.
+
+Thumb builds, tag reads and writes, LANCZOS resizes, and update() calls all
+run on the Tk thread, so the GUI can freeze for reasons that are hard to
+pin down after the fact.  Here, a heartbeat scheduled with after() every
+BEATMS records when the main loop last ran, and a sampler thread checks it
+every SAMPLEMS.  When the heartbeat is late by more than the threshold, the
+loop is blocked: the sampler takes the main thread's stack (by
+sys._current_frames()) on each check until the heartbeat resumes.  Each
+stall is then logged with its duration and its most-sampled stack, the code
+it was stuck in.
+
+Stalls are also ranked by where they happened (their most-sampled stack's
+innermost RANKFRAMES frames): report() lists places by total stall time,
+and is appended to the log on exit.  With perfstats enabled, stalls are
+recorded there too, as span 'ui.stall'.
+
+PyPhoto starts one on its main window per its StallMs config (0 = off),
+logging to its StallLog config's file, else stderr.
+===============================================================================
+"""
+
+import sys, time, atexit, threading, traceback
+from collections import Counter
+import perfstats
+
+BEATMS     = 50      # msecs between main-loop heartbeats
+SAMPLEMS   = 50      # msecs between sampler checks
+STACKDEPTH = 15      # innermost frames kept per sampled stack
+RANKFRAMES = 3       # innermost frames that identify a stall's place
+
+
+class StallWatch:
+    """
+    ---------------------------------------------------------------------------
+    Watch the main loop of widget's Tk for stalls over thresholdms, logging
+    each to logfile (a filename; default stderr).  stop() ends the watch;
+    it also ends if widget is destroyed.
+    ---------------------------------------------------------------------------
+    """
+    def __init__(self, widget, thresholdms=250, logfile=None):
+        self.widget = widget
+        self.threshold = thresholdms / 1000
+        self.logfile = logfile
+        self.mainident = threading.main_thread().ident
+        self.lastbeat = time.perf_counter()
+        self.stall = None                 # (start beat, Counter of stacks), if stalled
+        self.places = {}                  # place => [stalls, total secs, worst secs]
+        self.timer = None
+        self.stopped = threading.Event()
+        self.beat()
+        self.sampler = threading.Thread(target=self.sample, daemon=True)
+        self.sampler.start()
+        atexit.register(self.logReport)
+
+    def beat(self):
+        # on the Tk thread: the loop is running
+        self.lastbeat = time.perf_counter()
+        try:
+            self.timer = self.widget.after(BEATMS, self.beat)
+        except Exception:                 # widget destroyed
+            self.stopped.set()
+
+    def stop(self):
+        self.stopped.set()
+        if self.timer is not None:
+            try:
+                self.widget.after_cancel(self.timer)
+            except Exception:
+                pass
+            self.timer = None
+
+    def sample(self):
+        # on the sampler thread
+        while not self.stopped.wait(SAMPLEMS / 1000):
+            lastbeat = self.lastbeat
+            if self.stall and lastbeat != self.stall[0]:
+                self.endStall(lastbeat)                          # loop resumed
+            late = time.perf_counter() - lastbeat - BEATMS / 1000
+            if late >= self.threshold:
+                if self.stall is None:
+                    self.stall = (lastbeat, Counter())
+                stack = self.mainStack()
+                if stack:
+                    self.stall[1][stack] += 1
+
+    def mainStack(self):
+        frame = sys._current_frames().get(self.mainident)
+        if frame is None:
+            return None
+        return tuple(traceback.format_stack(frame)[-STACKDEPTH:])
+
+    def endStall(self, resumed):
+        start, stacks = self.stall
+        self.stall = None
+        secs = resumed - start - BEATMS / 1000                   # beat gap, less its interval
+        if stacks:
+            stack, samples = stacks.most_common(1)[0]
+        else:
+            stack, samples = ('  (no stack sampled)\n',), 0
+        place = ''.join(stack[-RANKFRAMES:])
+        counts = self.places.setdefault(place, [0, 0.0, 0.0])
+        counts[0] += 1
+        counts[1] += secs
+        counts[2] = max(counts[2], secs)
+        if perfstats.enabled:
+            perfstats.record('ui.stall', secs)
+        self.log('Main loop stalled %.3f secs at %s (%d of %d samples here):\n%s' %
+                 (secs, time.strftime('%H:%M:%S'), samples, sum(stacks.values()),
+                  ''.join(stack)))
+
+    def report(self):
+        """
+        stall places, by total stall secs: [(place, stalls, total, worst)]
+        """
+        ranked = sorted(self.places.items(), key=lambda item: -item[1][1])
+        return [(place,) + tuple(counts) for (place, counts) in ranked]
+
+    def logReport(self):
+        ranked = self.report()
+        if ranked:
+            lines = ['Main loop stalls by place (%d places):' % len(ranked)]
+            for (rank, (place, stalls, total, worst)) in enumerate(ranked, 1):
+                lines.append('#%d: %d stalls, %.3f secs total, %.3f worst:\n%s' %
+                             (rank, stalls, total, worst, place))
+            self.log('\n'.join(lines))
+
+    def log(self, message):
+        if self.logfile:
+            with open(self.logfile, 'a') as logfile:
+                print(message, file=logfile)
+        else:
+            print(message, file=sys.stderr)
@@ -0,0 +1,47 @@
+"""
+===============================================================================
+PyPhoto's "Performance Stats" window: the timing spans of perfstats.py, as
+a table of per-span counts, totals, and latencies, in msecs.
+
+"Refresh" redisplays the stats so far; "Reset" clears them (e.g., before
+opening the folder to be timed); "Save..." writes them to a JSON file, as
+PyPhoto's PerfStatsFile config does on exit.
+===============================================================================
+"""
+
+from tkinter import *
+from tkinter.filedialog import asksaveasfilename
+import perfstats
+
+
+class StatsView(Toplevel):
+
+    def __init__(self):
+        Toplevel.__init__(self)
+        self.title('PyPhoto Performance Stats')
+
+        btns = Frame(self)
+        Button(btns, text=' Refresh ', command=self.refresh).pack(side=LEFT, padx=5)
+        Button(btns, text=' Reset ', command=self.clickReset).pack(side=LEFT, padx=5)
+        Button(btns, text=' Save... ', command=self.clickSave).pack(side=LEFT, padx=5)
+        btns.pack(side=TOP, fill=X, pady=3)
+
+        self.text = Text(self, width=90, height=20, font=('courier', 10), wrap=NONE)
+        self.text.pack(side=TOP, expand=YES, fill=BOTH)
+        self.refresh()
+
+    def refresh(self):
+        self.text.config(state=NORMAL)
+        self.text.delete('1.0', END)
+        self.text.insert('1.0', perfstats.report())
+        self.text.config(state=DISABLED)
+
+    def clickReset(self):
+        perfstats.reset()
+        self.refresh()
+
+    def clickSave(self):
+        filename = asksaveasfilename(parent=self, defaultextension='.json',
+                                     initialfile='perfstats.json')
+        if filename:
+            perfstats.dump(filename)
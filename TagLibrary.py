@@ -0,0 +1,149 @@
+"""
+===============================================================================
+A persistent, library-wide tag database for a whole folder tree.
+
+Finding all images tagged X formerly meant findbytag.py re-reading every
+image in the tree, and PyPhoto knew only the tags of the folders it had
+open.  Here, the tags of every image under a library root are kept in an
+SQLite database, with an index per tag, so tag queries and tag counts for
+the whole tree take milliseconds.
+
+The database is refreshed incrementally: refresh() walks the tree (one
+scandir() per folder), and re-reads the tags of only images that are new or
+whose (size, mtime) changed, in parallel (see treescan.py); images no longer
+in the tree are dropped.  Tags are stored lowercase, as PyPhoto compares
+them.  Paths are stored relative to the root, so a library still works if
+its tree is moved or mounted elsewhere.
+
+The database file is "_PyPhoto-library.sqlite" in the root folder, or, for
+read-only trees, in the thumbs cache root (see viewer_thumbs.thumbCachePath).
+
+Used by pyphoto.py's "Library Search", utils/findbytag.py, and
+utils/walktest.py.  Run this file to refresh a library and show its stats.
+===============================================================================
+"""
+
+import os, sys, time, sqlite3
+from treescan import walkImages, scanFound
+from viewer_thumbs import thumbCachePath
+
+LIBFILE = '_PyPhoto-library.sqlite'
+COMMITEVERY = 1000      # files per transaction during refreshes
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    id      INTEGER PRIMARY KEY,
+    path    TEXT UNIQUE NOT NULL,      -- relative to the library root
+    size    INTEGER NOT NULL,
+    mtime   REAL NOT NULL,
+    status  TEXT NOT NULL              -- as treescan: tagged, untagged, ...
+);
+CREATE TABLE IF NOT EXISTS tags (
+    tag     TEXT NOT NULL,
+    file    INTEGER NOT NULL REFERENCES files(id) ON DELETE CASCADE,
+    PRIMARY KEY (tag, file)            -- the per-tag index
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS tags_file ON tags(file);
+"""
+
+
+class TagLibrary:
+    """
+    ---------------------------------------------------------------------------
+    One library root's database.  refresh() brings it up to date with the
+    tree; find(), tagCounts(), and statusCounts() answer from it as is.
+    A TagLibrary's connection must be used by only the thread that made it.
+    ---------------------------------------------------------------------------
+    """
+    def __init__(self, root, dbpath=None):
+        self.root = os.path.abspath(root)
+        self.dbpath = dbpath or thumbCachePath(self.root, LIBFILE)
+        self.db = sqlite3.connect(self.dbpath)
+        self.db.execute('PRAGMA foreign_keys = ON')
+        self.db.execute('PRAGMA journal_mode = WAL')   # readers during refreshes
+        self.db.executescript(SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    def refresh(self, jobs=None):
+        """
+        re-read new and changed images, drop removed ones; returns
+        (read, removed, unchanged) counts
+        """
+        known = {path: (fileid, size, mtime) for (fileid, path, size, mtime)
+                     in self.db.execute('SELECT id, path, size, mtime FROM files')}
+        seen = set()
+
+        def changed():
+            # runs on the scan pool's feeder thread: no db use here
+            for found in walkImages(self.root):
+                path = os.path.relpath(found[0], self.root)
+                seen.add(path)
+                old = known.get(path)
+                if old is None or old[1:] != found[1:]:
+                    yield found
+
+        read = 0
+        for result in scanFound(changed(), jobs):
+            self.store(result)
+            read += 1
+            if read % COMMITEVERY == 0:
+                self.db.commit()
+
+        removed = [(known[path][0],) for path in known.keys() - seen]
+        self.db.executemany('DELETE FROM files WHERE id = ?', removed)
+        self.db.commit()
+        return read, len(removed), len(seen) - read
+
+    def store(self, result):
+        # one image's scan result: replace its row and its tags
+        path = os.path.relpath(result['path'], self.root)
+        self.db.execute(
+            'INSERT INTO files (path, size, mtime, status) VALUES (?, ?, ?, ?) '
+            'ON CONFLICT (path) DO UPDATE SET '
+            'size = excluded.size, mtime = excluded.mtime, status = excluded.status',
+            (path, result['size'], result['mtime'], result['status']))
+        fileid = self.db.execute('SELECT id FROM files WHERE path = ?', (path,)).fetchone()[0]
+        self.db.execute('DELETE FROM tags WHERE file = ?', (fileid,))
+        tags = set(i.lower() for i in result['tags'] if i)   # no empty strings
+        self.db.executemany('INSERT INTO tags (tag, file) VALUES (?, ?)',
+                            [(tag, fileid) for tag in tags])
+
+    def find(self, tags):
+        """
+        absolute paths of images having all of tags (a AND b AND c), sorted
+        """
+        tags = sorted(set(i.lower() for i in tags if i))
+        if not tags:
+            return []
+        marks = ', '.join('?' * len(tags))
+        rows = self.db.execute(
+            'SELECT path FROM files WHERE id IN '
+            '(SELECT file FROM tags WHERE tag IN (%s) GROUP BY file HAVING COUNT(*) = ?) '
+            'ORDER BY path' % marks, tags + [len(tags)])
+        return [os.path.join(self.root, path) for (path,) in rows]
+
+    def tagCounts(self):
+        # {tag: number of images}, for all tags in the library
+        return dict(self.db.execute('SELECT tag, COUNT(*) FROM tags GROUP BY tag'))
+
+    def statusCounts(self):
+        # {status: number of images}: 'tagged', 'untagged', 'error', 'unsupported'
+        return dict(self.db.execute('SELECT status, COUNT(*) FROM files GROUP BY status'))
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print('Usage: python3 TagLibrary.py <library root folder>')
+        sys.exit(1)
+    start = time.perf_counter()
+    library = TagLibrary(sys.argv[1])
+    read, removed, unchanged = library.refresh()
+    print('Refreshed %s in %.2f secs: read %d, removed %d, unchanged %d' %
+          (library.dbpath, time.perf_counter() - start, read, removed, unchanged))
+    start = time.perf_counter()
+    counts = library.tagCounts()
+    print('Images by status:', library.statusCounts())
+    print('Tags: %d (counted in %.4f secs)' % (len(counts), time.perf_counter() - start))
+    library.close()
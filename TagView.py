@@ -12,12 +12,33 @@ B) When multiple images are selected, the current tags are the *intersection*
 
 NOTE: any modifications to the "current tags" are lost if an image is added or
 removed!
+
+KBR: for faster startup, pyexiv2 is imported on the first tag read, and the
+window itself is built on first use (a selection, or a ViewOne opened):
+folder scans use a TagView's tag reading and tag set before it has a window.
+
+KBR: initScan(imgfiles) reads the folder's tags in worker processes (see
+metascan.py), alongside the thumbnails loop; getTags() then waits only for
+the one image it's asked about, and pollScan() adds the rest as they come.
+The tag state (0/1/2, as getTags) of each image read is kept, for filters.
 """
-import pyexiv2
 import os
+import bisect
 from tkinter import *
-from tkinter.scrolledtext import *
 from CreateToolTip import *
+from TagPalette import TagPalette
+from metascan import MetaScan, tagState, MINFILES
+from perfstats import span
+
+pyexiv2 = None    # the module, once getExiv2() has imported it
+
+def getExiv2():
+    global pyexiv2
+    if pyexiv2 is None:
+        import pyexiv2 as exiv2           # pyexiv2 load is slow: defer it
+        exiv2.set_log_level(3)            # pyexiv2 magic
+        pyexiv2 = exiv2
+    return pyexiv2
 
 class TagView(Toplevel):
 
@@ -32,17 +53,27 @@ class TagView(Toplevel):
     ---------------------------------------------------------------------------
     """
     def __init__(self, imgdir):
-        Toplevel.__init__(self)
-        self.title(f"Tags:{imgdir}")
         self.folder = imgdir
+        self.built = False    # no window until ensureWindow()
+        self.scan = None      # MetaScan, while one is running
+        self.tagstates = {}   # imgfile => 0/1/2, for images read
+
+    def ensureWindow(self):
+        # build the Toplevel and its widgets, once
+        if self.built:
+            return
+        self.built = True
+        Toplevel.__init__(self)
+        self.title(f"Tags:{self.folder}")
         self.geometry("550x500")
                 
         # header row showing the filename
         self.imgName = Label(self, text="filename here")
         self.imgName.grid(row=0,column=0)
 
-        # 'Active' tags row
-        self.currTags = ScrolledText(self, height=7, wrap="word")
+        # 'Active' tags row: click to remove, right-click to favorite
+        self.currTags = TagPalette(self, onclick=self.removeCurrentTag,
+                                   onrightclick=self.favoriteCurrentTag, height=7)
         self.currTags.grid(row=1,column=0,pady=3,sticky='nsew')
 
         # Add-tag row
@@ -72,8 +103,9 @@ class TagView(Toplevel):
         self.btnNext.grid (row=0,column=3, padx=5)
         blah.grid(row=3, column=0, pady=2, ipady=2)
 
-        # Folder-wide tags row
-        self.btnFrame = ScrolledText(self, height=12, wrap="word")
+        # Folder-wide tags row: click to add, right-click to favorite
+        self.btnFrame = TagPalette(self, onclick=self.addToCurrentTag,
+                                   onrightclick=self.favoriteCurrentTag, height=12)
         self.btnFrame.grid(row=4,column=0,sticky='nsew',pady=3)
 
         # Resizing rules
@@ -83,14 +115,17 @@ class TagView(Toplevel):
         
         self.update()
 
-
-        self.allbtns = []
-        self.currbtns = []
-        pyexiv2.set_log_level(3) # pyexiv2 magic
-
         self.bind_all("<Next>", lambda event: self.clickNext())        
         self.bind_all("<Prior>", lambda event: self.clickPrev())
 
+        self.btnFrame.setTags(self.masterTagList)   # scanned before the window
+        self.ActiveViewOne(self.whoisit)
+
+    def destroy(self):
+        self.endScan()
+        if self.built:
+            Toplevel.destroy(self)
+
     def getImgTagsLC(self,imgfile):
       # 'Xmp.dc.subject' tags from the image, as lowercase and no empty strings
       # 
@@ -102,7 +137,7 @@ class TagView(Toplevel):
     def getImgTags(self, imgfile):
         imagePath = os.path.join(self.folder, imgfile)
         try:
-            with pyexiv2.Image(imagePath) as img:
+            with getExiv2().Image(imagePath) as img:
                 res = img.read_raw_xmp()
                 if len(res) == 0:
                     #print(f"git1 {imagePath}")
@@ -127,15 +162,35 @@ class TagView(Toplevel):
     def getTags(self, imgfile):
         # For an image in the folder, adds its tags to the folder list
 
-        # read all tags from provided imgfile
-        ok, taglist = self.getImgTagsLC(imgfile)
+        # read all tags from provided imgfile: from the scan, if it has it
+        if self.scan and imgfile in self.scan.chunkof:
+            ok, taglist = self.scan.get(imgfile)
+        else:
+            ok, taglist = self.getImgTags(imgfile)
+        return self.noteTags(imgfile, ok, taglist)
+
+    def noteTags(self, imgfile, ok, taglist):
+        state = tagState(ok, taglist)
+        self.tagstates[imgfile] = state
         if not ok:
             return 2
 
-        # add each to the master tag set 
-        self.masterTagList.update(taglist)
+        # add each to the master tag set; after doneScan, it's a sorted list
+        taglist = [i.lower() for i in taglist if i]
+        if isinstance(self.masterTagList, set):
+            self.masterTagList.update(taglist)
+        else:
+            for atag in taglist:
+                self.addToFullTag(atag)        # KBR e.g., files changed later
+
+        return state
 
-        return 0 if len(taglist) == 0 else 1
+    def getTagState(self, imgfile):
+        # 0/1/2 as getTags, if read; else read by getTags, so its tags are
+        # added to the tag list too (pollScan skips images already read)
+        if imgfile not in self.tagstates:
+            self.getTags(imgfile)
+        return self.tagstates[imgfile]
 
     def clickReset(self):
         # Reset button clicked: return current taglist to "original"
@@ -147,7 +202,7 @@ class TagView(Toplevel):
       # write tags to an image
         imagePath = os.path.join(self.folder, imgname)
         try:
-          with pyexiv2.Image(imagePath) as img:
+          with span('tags.write'), getExiv2().Image(imagePath) as img:
               # pyexiv2 magic
               try:
                   img.modify_xmp({'Xmp.dc.subject': taglist})
@@ -157,6 +212,7 @@ class TagView(Toplevel):
         except Exception as e:
           print(f"{imgname}:{e}") # TODO
           return False
+        self.tagstates[imgname] = tagState(True, taglist)
         return True
 
     def clickNext(self):
@@ -170,7 +226,11 @@ class TagView(Toplevel):
     def clickWrite(self):
       if len(self.image_names) == 0: # TODO disable write btn if no images
         return
-        
+      with span('tags.writeall'):
+        self.writeSelected()
+
+    def writeSelected(self):
+      # write the current taglist to the selected image(s)
       if len(self.image_names) == 1:
         # Write button clicked: write current taglist to the file.
         self.writeTags(self.image_names[0], list(self.currTagList)) # TODO failure
@@ -191,8 +251,33 @@ class TagView(Toplevel):
             self.writeTags(imgname, list(currtags2)) # TODO failure
       self.origCurrTagList = self.currTagList.copy() # new 'original'
 
-    def initScan(self):
+    def initScan(self, imgfiles=None, jobs=None):
+        # KBR imgfiles: scan these images' tags in the background, if worth it
+        self.endScan()
         self.masterTagList.clear()
+        self.tagstates = {}
+        if imgfiles and len(imgfiles) >= MINFILES and jobs != 0:
+            self.scan = MetaScan(self.folder, imgfiles, jobs)
+
+    def pollScan(self):
+        """
+        add the tags of images the scan has read since the last poll; returns
+        [(imgfile, state)] for them, or None once the scan is done
+        """
+        if not self.scan:
+            return None
+        # images already read (by getTags, a filter, or a write) are current
+        states = [(imgfile, self.noteTags(imgfile, ok, taglist))
+                      for (imgfile, ok, taglist) in self.scan.poll()
+                          if imgfile not in self.tagstates]
+        if self.scan.done():
+            self.endScan()
+        return states
+
+    def endScan(self):
+        if self.scan:
+            self.scan.close()
+            self.scan = None
 
     def getAllTags(self):
         return self.masterTagList
@@ -217,23 +302,8 @@ class TagView(Toplevel):
 
     def updateCurrentTags(self):
         # print(f"current tags:{self.currTagList}")
-        # delete all existing widgets
-        self.currTags.configure(state="normal") # magic
-        self.currTags.delete('1.0', END) 
-
-        # add each tag as a widget      
-        if len(self.currTagList) > 0:
-            for atag in sorted(list(self.currTagList)):
-
-                handler1 = lambda whichtag=atag: self.removeCurrentTag(whichtag)
-                abtn = Button(self.currTags, text=f" {atag} ", padx=2, pady=2, command=handler1)
-                # Right-click favorites the tag : binding magic
-                abtn.bind("<Button-3>", lambda e,c=atag: self.favoriteCurrentTag(c))
-                # TODO tooltip
-
-                self.currTags.window_create("insert", window=abtn, padx=2, pady=2)
-                self.currbtns.append(abtn)
-        self.currTags.configure(state="disabled") # magic
+        # the palette reuses its widgets: nothing accumulates across calls
+        self.currTags.setTags(self.currTagList)
 
     def showImage(self, imgname):
         #print(f"User clicked: {imgname}")
@@ -278,6 +348,26 @@ class TagView(Toplevel):
         
       self.updateCurrentTags()
 
+    def refreshImages(self, imgnames):
+      # KBR files changed on disk (e.g., tagged by another program)
+      for imgname in imgnames:
+        self.tagstates.pop(imgname, None)    # reread when next needed
+      if not self.built or not set(self.image_names) & set(imgnames):
+        return
+      if len(self.image_names) == 1:
+        self.showImage(self.image_names[0])   # reload its current tags
+      else:
+        # rebuild the common tags of all selected images, as anotherImage
+        common = None
+        for imgname in self.image_names:
+          ok, taglist = self.getImgTagsLC(imgname)
+          if ok:
+            common = set(taglist) if common is None else common.intersection(taglist)
+        self.currTagList.clear()
+        self.currTagList.update(sorted(common or ()))
+        self.origCurrTagList = self.currTagList.copy()
+        self.updateCurrentTags()
+
     def removeImage(self, imgname):
       # User has removed an image from the selection set
       if imgname not in self.image_names:
@@ -287,32 +377,18 @@ class TagView(Toplevel):
       # TODO the list of common tags may have changed - need to rebuild the set from scratch   
 
     def addToFullTag(self, newtag):
-        self.masterTagList.append(newtag)
-        self.doneScan()
+        # insert in sorted position: no full re-sort or palette rebuild
+        ix = bisect.bisect_left(self.masterTagList, newtag)
+        if ix == len(self.masterTagList) or self.masterTagList[ix] != newtag:
+            self.masterTagList.insert(ix, newtag)
+        if self.built:
+            self.btnFrame.addTag(newtag)
 
     def doneScan(self):
         self.masterTagList = sorted(self.masterTagList)
         #print(f"Final tags: {self.masterTagList}" )
-        # for each tag in masterTagList
-        #   create a button
-        self.btnFrame.configure(state="normal")
-        self.btnFrame.delete('1.0', END) 
-        for atag in self.masterTagList:
-
-#    widget = tk.Label(root, width=12, text=f"Widget #{COUNT}", bd=1, relief="raised",
-#                      bg="#5C9BD5", foreground="white", padx=4, pady=4)
-#    text.configure(state="normal")
-#    text.window_create("insert", window=widget, padx=10, pady=10)
-#    text.configure(state="disabled")
-
-            handler = lambda whichtag=atag: self.addToCurrentTag(whichtag)
-            abtn = Button(self.btnFrame, text=f" {atag} ", padx=2, pady=2, command=handler)
-            self.btnFrame.window_create("insert", window=abtn, padx=2, pady=2)
-            # Right-click favorites the tag : binding magic
-            abtn.bind("<Button-3>", lambda e,c=atag: self.favoriteCurrentTag(c))
-
-            self.allbtns.append(abtn) # TODO for gc: is this necessary?
-        self.btnFrame.configure(state="disabled")
+        if self.built:
+            self.btnFrame.setTags(self.masterTagList)   # else ensureWindow does
 
     def addClick(self):
         newtag = self.addEdit.get()
@@ -333,6 +409,11 @@ class TagView(Toplevel):
       
     def observe_update(self, action, item):
       #print(f"TV: update {action} {len(item) if item != None else 0} ")
+      if action == "clear" and not self.built:
+        self.currTagList.clear()   # nothing shown yet
+        self.image_names = []
+        return
+      self.ensureWindow()
       if action == "clear":
         self.currTagList.clear()
         self.updateCurrentTags()
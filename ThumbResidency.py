@@ -0,0 +1,205 @@
+"""
+===============================================================================
+Memory-budgeted residency for thumbnail images in folder windows.
+
+Formerly each folder window kept three copies of every thumb alive for the
+window's life: the PIL images (win.fullthumbs), the Tk images made eagerly
+by buildCanvas (win.savephotos), and the buttons (win.allbtns).  Here, a
+thumb is held only as its small encoded cache bytes until it is about to
+scroll into view; it is then converted to a Tk PhotoImage, and the decoded
+PIL copy is dropped.  Tk images of thumbs that have scrolled out of view are
+evicted least-recently-shown first whenever the process-wide total exceeds
+the budget, so several large folder windows can stay open at once.
+
+The budget is shared by all windows (it's one process's memory), and is
+set from the "ThumbMemoryMB" config in pyphoto.py via setBudget().
+===============================================================================
+"""
+
+import io
+from collections import OrderedDict
+from tkinter import PhotoImage as TkPhotoImage
+from PIL import Image
+from phototransfer import transferThumbs
+
+budget = 64 * 1024 * 1024     # bytes of Tk thumb images, all windows
+resident = OrderedDict()      # (manager, imgfile) => entry, oldest first
+residentbytes = 0
+spares = []                   # evicted Tk photos, recycled by transfers
+MAXSPARES = 64
+BATCH = 64                    # thumbs per PIL-to-Tk atlas transfer
+
+
+def setBudget(megabytes):
+    global budget
+    budget = int(megabytes * 1024 * 1024)
+    trimToBudget()
+
+
+def photoBytes(size):
+    # Tk photo images store 4 bytes per pixel
+    return size[0] * size[1] * 4
+
+
+def trimToBudget():
+    """
+    evict least-recently-shown Tk images until under budget; thumbs
+    currently in view in any window are never evicted (they'd just
+    come right back), so the budget is a soft limit for tiny budgets
+    """
+    global residentbytes
+    for key in list(resident):
+        if residentbytes <= budget:
+            break
+        manager, imgfile = key
+        if imgfile not in manager.visible:
+            resident.pop(key)
+            residentbytes -= manager.evict(imgfile)
+
+
+class ThumbEntry:
+    """
+    one thumb's state: encoded bytes (always), PIL image (until first
+    shown, only if no bytes are available), Tk image (while resident)
+    """
+    def __init__(self, btn, imgobj):
+        self.btn = btn
+        self.size = imgobj.size
+        self.encoded = getattr(imgobj, 'cachebytes', None)
+        self.pilimg = None if self.encoded else imgobj
+        self.photo = None
+
+    def getImage(self):
+        if self.pilimg is not None:
+            return self.pilimg
+        return Image.open(io.BytesIO(self.encoded))   # decode on demand
+
+    def dropImage(self):
+        """
+        after the first conversion, keep only compact encoded bytes;
+        thumbs without cache bytes (e.g., unsaveable) are encoded once
+        """
+        if self.encoded is None:
+            imgbuf = io.BytesIO()
+            self.pilimg.save(imgbuf, 'PNG', compress_level=1)
+            self.encoded = imgbuf.getvalue()
+        self.pilimg = None
+
+
+class ThumbResidency:
+    """
+    ---------------------------------------------------------------------------
+    Per-folder-window residency manager.  Buttons are registered with their
+    PIL thumb and a blank image; show(btns) is called with the buttons in or
+    near view, and converts any not yet resident.  release() frees all of a
+    window's images when it is closed.
+    ---------------------------------------------------------------------------
+    """
+    def __init__(self):
+        self.entries = {}          # imgfile => ThumbEntry
+        self.visible = set()       # imgfiles in view at last show()
+        self.blank = None          # shared empty image for evicted buttons
+
+    def getBlank(self):
+        if self.blank is None:
+            self.blank = TkPhotoImage(width=1, height=1)
+        return self.blank
+
+    def register(self, imgfile, imgobj, btn):
+        self.entries[imgfile] = ThumbEntry(btn, imgobj)
+        btn.config(image=self.getBlank())
+
+    def show(self, btns):
+        """
+        make Tk images for btns about to be visible, mark them most
+        recently used, then evict older off-screen images if over budget;
+        new images are made in batched transfers (see phototransfer.py)
+        """
+        self.visible = set(btn.imgfile for btn in btns)
+        pending = []
+        for btn in btns:
+            key = (self, btn.imgfile)
+            if key in resident:
+                resident.move_to_end(key)
+            elif btn.imgfile in self.entries:
+                pending.append(btn.imgfile)
+        for ix in range(0, len(pending), BATCH):
+            self.materialize(pending[ix:ix+BATCH])
+        trimToBudget()
+
+    def materialize(self, imgfiles):
+        global residentbytes
+        entries, imgs = [], []
+        for imgfile in imgfiles:
+            entry = self.entries[imgfile]
+            try:
+                img = entry.getImage()
+                img.load()                        # decode errors happen here
+            except:
+                print('Cannot convert thumb:', imgfile)
+                continue
+            entries.append((imgfile, entry))
+            imgs.append(img)
+
+        photos = transferThumbs(imgs, spares)
+        for (imgfile, entry), photo in zip(entries, photos):
+            entry.photo = photo
+            entry.btn.config(image=photo)
+            entry.dropImage()
+            resident[(self, imgfile)] = entry
+            residentbytes += photoBytes(entry.size)
+
+    def evict(self, imgfile):
+        # drop one Tk image, keep a few for reuse; return its bytes
+        entry = self.entries[imgfile]
+        entry.btn.config(image=self.getBlank())
+        if len(spares) < MAXSPARES:
+            spares.append(entry.photo)
+        entry.photo = None
+        return photoBytes(entry.size)
+
+    def unregister(self, imgfile):
+        # KBR file removed or changed: drop its thumb, resident or not
+        global residentbytes
+        if resident.pop((self, imgfile), None) is not None:
+            residentbytes -= self.evict(imgfile)
+        del self.entries[imgfile]
+        self.visible.discard(imgfile)
+
+    def replace(self, imgfile, imgobj):
+        """
+        KBR: a changed file's new thumb, for the same button; it's shown on
+        the next show(); returns False if the thumb bytes are unchanged
+        """
+        entry = self.entries[imgfile]
+        if entry.encoded is not None and entry.encoded == getattr(imgobj, 'cachebytes', None):
+            return False
+        self.unregister(imgfile)
+        self.register(imgfile, imgobj, entry.btn)
+        return True
+
+    def getSize(self, imgfile):
+        return self.entries[imgfile].size
+
+    def getThumbImage(self, imgfile):
+        """
+        the thumb's PIL image, decoded from its bytes (e.g., for ViewOne's
+        placeholder); None if unknown here or undecodable
+        """
+        entry = self.entries.get(imgfile)
+        if entry is None:
+            return None
+        try:
+            img = entry.getImage()
+            img.load()
+            return img
+        except:
+            return None
+
+    def release(self):
+        global residentbytes
+        for imgfile in self.entries:
+            if resident.pop((self, imgfile), None) is not None:
+                residentbytes -= photoBytes(self.entries[imgfile].size)
+        self.entries = {}
+        self.visible = set()
@@ -0,0 +1,163 @@
+"""
+===============================================================================
+Tiled rendering of images larger than the screen, for ViewOne's zoom and pan.
+
+ViewOne formerly resized the whole image on every zoom keypress, and drew
+the result as one PhotoImage covering the entire scroll region: zooming
+into a 20k x 15k scan made gigabyte images and took seconds per step.
+Here, such an image is drawn as a grid of TILE-pixel tiles, and only tiles
+intersecting the visible part of the canvas (plus a margin of one tile, for
+smooth scrolling) are resampled and made into Tk images, each directly from
+its own region of the source image via resize(box=).  A zoom step thus costs
+about one screenful of resampling, whatever the zoomed image's size.
+
+Tiles are cached per zoom level, so scrolling back, or zooming back to a
+recent level, reuses them.  A level is the displayed image size plus the
+filter used, so ViewOne's cheap preview tiles are never reused for its
+refined redraw.  The total number of cached tiles is bounded, so memory
+too is bounded by screen size.
+
+Images that fit the screen are not tiled: ViewOne.drawImageSized still shows
+them as one (reused) PhotoImage.  Resizing with box= requires Pillow 4.3+.
+===============================================================================
+"""
+
+import math
+from collections import OrderedDict
+from tkinter import NW
+from PIL import Image
+from phototransfer import pastePhoto
+from perfstats import span
+
+TILE = 256          # tile edge, pixels
+MAXTILES = 160      # Tk tile images cached, all levels (~40MB at 4 bytes/pixel)
+MAXLEVELS = 3       # zoom levels whose tiles are cached
+MAXSPARES = 16      # evicted tile photos kept to paste into
+
+
+class TiledImage:
+    """
+    ---------------------------------------------------------------------------
+    Draws a source PIL image scaled to a display size on a canvas, in tiles.
+    show() starts a level, render() (or schedule(), from scroll and resize
+    events) draws any visible tiles not yet drawn, hide() removes the tiles
+    from the canvas, and clear() also drops all cached tiles, for a new image.
+    The canvas's scrollregion is the caller's job, as for untiled images.
+    ---------------------------------------------------------------------------
+    """
+    def __init__(self, canvas):
+        self.canvas = canvas
+        self.source = None              # PIL image to resample from
+        self.size = None                # displayed (W, H), None if hidden
+        self.levels = OrderedDict()     # level => OrderedDict(tile => photo), LRU
+        self.level = None               # (size, filter) now shown
+        self.items = {}                 # tile => canvas item, this level only
+        self.spares = []
+        self.pending = None             # coalesced render request
+        if hasattr(Image, 'LANCZOS'):
+            self.filter = Image.LANCZOS
+        else:
+            self.filter = Image.ANTIALIAS
+
+    def isShown(self):
+        return self.size is not None
+
+    def show(self, source, size, filter=None):
+        """
+        draw source scaled to size (any source with the same aspect will do:
+        the tiles of a level don't depend on which decode they came from)
+        """
+        self.hide()
+        self.source, self.size = source, tuple(size)
+        self.filter = filter if filter is not None else self.filter
+        self.scale = (self.size[0] / source.size[0], self.size[1] / source.size[1])
+        self.level = (self.size, self.filter)
+        self.levels.setdefault(self.level, OrderedDict())
+        self.levels.move_to_end(self.level)
+        while len(self.levels) > MAXLEVELS:
+            level, tiles = self.levels.popitem(last=False)
+            self.keepSpares(tiles.values())
+        self.render()
+
+    def hide(self):
+        self.canvas.delete('tile')
+        self.items = {}
+        self.size = None
+
+    def clear(self):
+        self.hide()
+        for tiles in self.levels.values():
+            self.keepSpares(tiles.values())
+        self.levels.clear()
+        self.source = None
+
+    def schedule(self):
+        if self.size is not None and self.pending is None:
+            self.pending = self.canvas.after_idle(self.render)
+
+    def visibleTiles(self):
+        """
+        (col, row) of tiles in or one tile beyond the canvas's visible area
+        """
+        canvas = self.canvas
+        left, top = canvas.canvasx(0), canvas.canvasy(0)
+        right  = left + canvas.winfo_width()
+        bottom = top + canvas.winfo_height()
+        lastcol = math.ceil(self.size[0] / TILE) - 1
+        lastrow = math.ceil(self.size[1] / TILE) - 1
+        cols = range(max(int(left // TILE) - 1, 0), min(int(right // TILE) + 1, lastcol) + 1)
+        rows = range(max(int(top // TILE) - 1, 0),  min(int(bottom // TILE) + 1, lastrow) + 1)
+        return [(col, row) for row in rows for col in cols]
+
+    def render(self):
+        self.pending = None
+        if self.size is None:
+            return
+        tiles = self.levels[self.level]
+        wanted = self.visibleTiles()
+        for tile in wanted:
+            photo = tiles.get(tile)
+            if photo is None:
+                photo = tiles[tile] = self.makeTile(tile)
+            tiles.move_to_end(tile)
+            if tile not in self.items:
+                self.items[tile] = self.canvas.create_image(
+                    tile[0] * TILE, tile[1] * TILE, image=photo, anchor=NW, tags='tile')
+        self.trim(set(wanted))
+
+    def makeTile(self, tile):
+        left, top = tile[0] * TILE, tile[1] * TILE
+        right  = min(left + TILE, self.size[0])
+        bottom = min(top + TILE, self.size[1])
+        if self.source.size == self.size:
+            imgpil = self.source.crop((left, top, right, bottom))   # actual size
+        else:
+            scalex, scaley = self.scale
+            box = (left / scalex, top / scaley, right / scalex, bottom / scaley)
+            with span('view.resize'):
+                imgpil = self.source.resize((right - left, bottom - top), self.filter, box=box)
+        spare = self.spares.pop() if self.spares else None
+        return pastePhoto(imgpil, spare)[0]          # pasted iff same size
+
+    def trim(self, wanted):
+        """
+        drop least-recently-drawn tiles, oldest levels first, until at most
+        MAXTILES are cached; tiles now in view are never dropped
+        """
+        excess = sum(len(tiles) for tiles in self.levels.values()) - MAXTILES
+        for level, tiles in list(self.levels.items()):
+            current = (level == self.level)
+            for tile in list(tiles):
+                if excess <= 0:
+                    return
+                if current and tile in wanted:
+                    continue
+                self.keepSpares([tiles.pop(tile)])
+                if current and tile in self.items:
+                    self.canvas.delete(self.items.pop(tile))
+                excess -= 1
+
+    def keepSpares(self, photos):
+        for photo in photos:
+            if len(self.spares) < MAXSPARES:
+                self.spares.append(photo)
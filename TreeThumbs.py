@@ -0,0 +1,142 @@
+"""
+===============================================================================
+Thumbs for a multi-folder tree window: all images in a folder and all its
+subfolders, in one grid, with one TagView and master tag list for all.
+
+In a tree window, imgfile keys are paths relative to the root folder (e.g.,
+"day2/IMG_0042.jpg"), so TagView, ViewOne, and selections, which all join
+imgfiles to the window's folder, work unchanged.  N/P in ViewOne steps
+through the whole tree in grid order, by a NavIndex.ListIndex.
+
+The grid's buttons are made up front from folder listings alone (fast);
+thumbs are not.  Each folder's thumbs are loaded from its own thumbs cache
+(via makeThumbs, which also makes any missing thumbs) only when needed:
+    - at once, when any of its buttons scrolls into view (see need())
+    - else in the background, one folder per idle pass, in grid order,
+      so thumbs stream in without blocking the GUI for more than one
+      folder's cache load at a time.
+The tags of all the tree's images are read by one background MetaScan
+(TagView.initScan), in grid order, and added to the master tag list as it
+goes (pyphoto.pollTags), as for a folder window; folder loads then read no
+tags for cached thumbs, and new thumbs' watermarks take tags from the scan.
+
+Folder watching (FolderWatcher) is not used for tree windows.
+===============================================================================
+"""
+
+import os
+from viewer_thumbs import makeThumbs, sortedDisplayOrder, isTaggableImage
+
+IDLEMS = 10      # msecs between background folder loads
+
+
+class FolderTags:
+    """
+    makeThumbs' view of a shared TagView: its imgfiles are a subfolder's
+    names, but the TagView's are paths relative to the tree's root; scan
+    is the TagView's, so cached thumbs skip tag reads while it runs
+    """
+    def __init__(self, tagwin, prefix):
+        self.tagwin = tagwin
+        self.prefix = prefix
+
+    @property
+    def scan(self):
+        return self.tagwin.scan
+
+    def getTags(self, imgfile):
+        imgfile = self.prefix + imgfile
+        if imgfile in self.tagwin.tagstates:
+            return self.tagwin.tagstates[imgfile]    # read already, e.g., by the scan
+        return self.tagwin.getTags(imgfile)
+
+
+def listTree(root):
+    """
+    [(relative folder, [imgfile keys])] for root and all its subfolders
+    with taggable images, in display order (folders sorted by name)
+    """
+    folders = []
+    for (folder, subdirs, files) in os.walk(root):
+        subdirs.sort(key=str.lower)
+        relfolder = os.path.relpath(folder, root)
+        prefix = '' if relfolder == os.curdir else relfolder + os.sep
+        imgfiles = [prefix + imgfile for imgfile in
+                        filter(isTaggableImage, sortedDisplayOrder(folder))]
+        if imgfiles:
+            folders.append((prefix, imgfiles))
+    return folders
+
+
+class TreeThumbs:
+    """
+    ---------------------------------------------------------------------------
+    Loads a tree window's thumbs per folder, into its ThumbResidency, and
+    starts tagwin's scan of all their tags (with scanjobs workers).
+    imgfiles is the grid's order; setButtons() gives the grid's buttons
+    (by imgfile); start() begins background loading; stop() ends it.
+    ---------------------------------------------------------------------------
+    """
+    def __init__(self, widget, root, residency, tagwin, size, nothumbchanges=False,
+                 scanjobs=None):
+        self.widget = widget
+        self.root = root
+        self.residency = residency
+        self.tagwin = tagwin
+        self.size = size
+        self.nothumbchanges = nothumbchanges
+        self.folders = listTree(root)
+        self.folderof = {}                       # imgfile key => folder prefix
+        self.imgfiles = []
+        for (prefix, imgfiles) in self.folders:
+            self.imgfiles.extend(imgfiles)
+            for imgfile in imgfiles:
+                self.folderof[imgfile] = prefix
+        tagwin.initScan(self.imgfiles, scanjobs)   # keys are root-relative paths
+        self.loaded = set()                      # folder prefixes loaded
+        self.btns = {}
+        self.timer = None
+        self.onload = None                       # called after each folder load
+
+    def setButtons(self, btns):
+        self.btns = {btn.imgfile: btn for btn in btns}
+
+    def need(self, btns):
+        # load the folders of btns about to be shown, now
+        for prefix in {self.folderof[btn.imgfile] for btn in btns}:
+            if prefix not in self.loaded:
+                self.load(prefix)
+
+    def load(self, prefix):
+        self.loaded.add(prefix)
+        folder = os.path.join(self.root, prefix) if prefix else self.root
+        thumbs = makeThumbs(folder, size=self.size,
+                            nothumbchanges=self.nothumbchanges,
+                            _tagswin=FolderTags(self.tagwin, prefix))
+        for (imgfile, imgobj) in thumbs:
+            btn = self.btns.get(prefix + imgfile)
+            if btn is not None:
+                self.residency.register(btn.imgfile, imgobj, btn)
+        if self.onload:
+            self.onload(prefix)
+
+    def start(self):
+        if self.timer is None:
+            self.timer = self.widget.after(IDLEMS, self.loadNext)
+
+    def loadNext(self):
+        # one unloaded folder per pass: the GUI stays responsive between
+        self.timer = None
+        for (prefix, imgfiles) in self.folders:
+            if prefix not in self.loaded:
+                self.load(prefix)
+                self.timer = self.widget.after(IDLEMS, self.loadNext)
+                return
+
+    def stop(self):
+        if self.timer is not None:
+            self.widget.after_cancel(self.timer)
+            self.timer = None
+
+    def progress(self):
+        return len(self.loaded), len(self.folders)
@@ -4,18 +4,27 @@
 
 import os,traceback,sys
 from tkinter import *
-from viewer_thumbs import reorientImage, openImageSafely, sortedDisplayOrder, isTaggableImage
+from viewer_thumbs import reorientImage, openImageSafely
+from perfstats import span
 from windowicons import trySetWindowIcon
 
 from PIL import Image                # get image wrapper + widget
 from PIL.ImageTk import PhotoImage   # replaces tkinter's version
 
 from ObservableList import ObservableList
+from phototransfer import pastePhoto
+from TiledImage import TiledImage
+from NavIndex import NavIndex
+from ImagePrefetcher import ImagePrefetcher, loadImage, fitSize, scaleToFit, peekImageSize
 
 RunningOnMac = sys.platform.startswith('darwin')
 RunningOnWindows = sys.platform.startswith('win')
 RunningOnLinux = sys.platform.startswith('linux')
 
+POLLMS = 20   # KBR msecs between checks for a worker-thread image decode
+REFINEMS = 250                    # KBR idle msecs before a LANCZOS redraw
+PREVIEWFILTER = Image.BILINEAR    # KBR cheap filter while zooming
+
 ############################################################################
 # Canvas with dual scroll bars, used by both thumbnail and image windows
 ############################################################################
@@ -30,6 +39,7 @@ class ScrolledCanvas(Canvas):
         self.config(borderwidth=0)
         vbar = Scrollbar(container)
         hbar = Scrollbar(container, orient='horizontal')
+        self.vbar, self.hbar = vbar, hbar
 
         vbar.pack(side=RIGHT,  fill=Y)                 # pack canvas after bars
         hbar.pack(side=BOTTOM, fill=X)                 # so clipped first
@@ -68,6 +78,16 @@ class ViewOne(Toplevel):
     can be a major problem, as exceptions might occur anywhere and
     anytime for images with errors.  Here, and on next/prior image,
     call load() explicitly to force errors to happen immediately.
+
+    KBR: images are now decoded on a worker thread (ImagePrefetcher),
+    and an upscaled copy of the image's cached thumb is shown at once
+    while the decode runs.  Errors are still reported when the load
+    fails, and still stop the next/prior progression.
+
+    KBR: sizes bigger than the screen (zooms, actual size) are drawn
+    in tiles, only as far as in view (see TiledImage.py).  Zooms
+    and resizes draw with a cheap filter first, and are redrawn
+    with LANCZOS once input pauses (see scaleInteractive).
     --------------------------------------------------------------
     """
     _instance = None
@@ -75,6 +95,11 @@ class ViewOne(Toplevel):
       if not cls._instance:
         cls._instance = super(ViewOne, cls).__new__(cls)
         cls._instance.dialog = None
+        cls._instance.prefetcher = ImagePrefetcher()   # survives window closes
+        cls._instance.loadgen = 0                      # bumped per new image
+        cls._instance.pendingkey = None                # worker decode awaited
+        cls._instance.previewpending = None            # coalesced zoom draw
+        cls._instance.refinepending = None             # LANCZOS redraw timer
       return cls._instance
       
     def __init__(self, 
@@ -85,13 +110,21 @@ class ViewOne(Toplevel):
                  nothumbchanges=False,      # thumbs: pass along on "D"
                  selList=None,
                  tagw=None,
-                 appname=None):
+                 appname=None,
+                 thumbsource=None,          # imgfile => PIL thumb, or None
+                 navindex=None):            # N/P order: folder or shown thumbs
 
         if self.dialog is None or not self.winfo_exists():
           Toplevel.__init__(self)
           trySetWindowIcon(self, 'icons', 'tag')   # [SA] for win+lin
           self.dialog = self.tk
           self.canvas = ScrolledCanvas(self)        # tk canvas to be reused
+          self.shownfile = None                     # no image drawn yet
+          self.savephoto = None
+          self.tiles = TiledImage(self.canvas)      # KBR for sizes > screen
+          self.canvas.config(xscrollcommand=self.onXScroll,
+                             yscrollcommand=self.onYScroll)
+          self.canvas.bind('<Configure>', lambda event: self.tiles.schedule())
         else:
           self.lift()
                     
@@ -101,30 +134,13 @@ class ViewOne(Toplevel):
         self.selectionList = selList
         self.tagwin = tagw
         self.tagwin.ActiveViewOne(self) # TODO tagview uses this for next/prev
-        selList.setByName(imgfile)
-        
-        # try to load image
-        imgpath = os.path.join(imgdir, imgfile)   # img file to open
-        try:
-            # load img object to be reused by ops
-            imgpil = openImageSafely(imgpath)     # [2.2] avoid pillow files bug
-            imgpil.load()                         # [2.1] load now so errors here
-            imgpil = reorientImage(imgpil)        # [2.2] right-side up, iff needed 
-        except:
-            # TODO this section may not work with singleton
-            # [2.1] can fail on OSError+ in Pillow
-            traceback.print_exc()
-            self.destroy()
-            showerror('PyPhoto: Image Load',
-                      'Cannot load image file:\n%s' % imgpath)
-            if opener: 
-                opener.focus_force()              # abandon after error popup
-                if RunningOnLinux: opener.lift()  # else root win stays above
-            return                                # abandon after error popup
+        self.thumbsource = thumbsource
+        self.navindex = navindex or NavIndex(imgdir)
+        self.opener = opener
+        self.imgdir, self.imgfile, self.dirwinsize = imgdir, imgfile, dirwinsize
 
-        self.trueimage = imgpil                   # for all ops till N/P
-        #self.canvas = ScrolledCanvas(self)        # tk canvas to be reused
-        self.drawImageFirst()                     # show scaled or actual now
+        # start loading image: errors are reported when the decode ends
+        self.startLoad(imgfile, +1)               # show thumb or cached fit now
 
         # TODO most of the following section goes into the initialize-once area
         # bind keys/events for this image-view window
@@ -152,11 +168,10 @@ class ViewOne(Toplevel):
         # [SA] add next/prior image in this image's folder
         self.bind('<KeyPress-n>', self.onNextImage)
         self.bind('<KeyPress-p>', self.onPrevImage)
-        self.imgdir, self.imgfile, self.dirwinsize = imgdir, imgfile, dirwinsize
 
         # [SA] add actual/scaled size (actual=former version's only mode)
-        self.bind('<KeyPress-a>', lambda event: self.drawImageSized(self.trueimage))
-        self.bind('<KeyPress-s>', lambda event: self.drawImageFirst())
+        self.bind('<KeyPress-a>', self.onActualSize)
+        self.bind('<KeyPress-s>', self.onScaledSize)
         
         self.bind('<Destroy>', lambda event: self.cleanup())
         
@@ -170,6 +185,7 @@ class ViewOne(Toplevel):
 
     def cleanup(self):
         self.tagwin.ActiveViewOne(None) # TODO tagview uses this for next/prev
+        self.cancelScaling()
       
     def setTitle(self, imgfile):
         """
@@ -194,10 +210,153 @@ class ViewOne(Toplevel):
         else:
             return self.viewsize or (scrwide, scrhigh)   # user limit, or wm
 
+    #
+    # Loading
+    #
+
+    def startLoad(self, imgfile, direction):
+        """
+        KBR: switch to imgfile without blocking the GUI: draw a cached fit
+        now if there is one, else draw an upscaled copy of the image's
+        thumb and have the worker decode it; a newer call (N/P) replaces
+        a load still pending, whose result is then ignored here;
+        """
+        imgpath = os.path.join(self.imgdir, imgfile)
+        scrsize = self.getMaxSize()
+        self.imgfile = imgfile
+        self.setTitle(imgfile)
+        self.loadgen += 1
+        self.cancelScaling()                             # not for this image
+        self.pendingkey = None
+
+        entry = self.prefetcher.get(imgpath, scrsize)
+        if entry is not None:
+            self.finishLoad(imgfile, imgpath, entry)
+        else:
+            self.drawPlaceholder(imgfile, imgpath, scrsize)
+            self.pendingkey = self.prefetcher.request(imgpath, scrsize)
+            self.after(POLLMS, self.pollLoad, self.loadgen, imgfile, imgpath)
+        self.prefetchNeighbors(direction)
+
+    def pollLoad(self, loadgen, imgfile, imgpath):
+        if loadgen != self.loadgen or not self.winfo_exists():
+            return                                       # superseded or closed
+        done, entry = self.prefetcher.poll(self.pendingkey)
+        if not done:
+            self.after(POLLMS, self.pollLoad, loadgen, imgfile, imgpath)
+        else:
+            self.pendingkey = None
+            if entry is not None:
+                self.finishLoad(imgfile, imgpath, entry)
+            else:
+                self.failLoad(imgpath)
+
+    def finishLoad(self, imgfile, imgpath, entry):
+        self.setImage(imgpath, entry)        # (decoded, fit, truesize)
+        self.shownfile = imgfile
+        self.drawImageFirst()                # same size as placeholder: no jump
+
+    def failLoad(self, imgpath):
+        """
+        [2.1] can fail on OSError+ in Pillow: report, then abandon a first
+        open, else go back to the image shown before (error images stop
+        the next/prior progression: users must click a new thumb past it)
+        """
+        showerror('PyPhoto: Image Load',
+                  'Cannot load image file:\n%s' % imgpath)
+        if self.shownfile is None:
+            opener = self.opener
+            self.destroy()
+            if opener: 
+                opener.focus_force()              # abandon after error popup
+                if RunningOnLinux: opener.lift()  # else root win stays above
+        else:
+            self.imgfile = self.shownfile
+            self.setTitle(self.imgfile)
+            self.selectionList.setByName(self.imgfile)
+            self.drawImageFirst()
+            self.focus_force()
+            if RunningOnLinux: self.lift()        # else root stays above
+
+    def drawPlaceholder(self, imgfile, imgpath, scrsize):
+        """
+        KBR: stand-in while decoding: the thumb, upscaled (cheaply) to
+        the size the real image will be drawn at, which the header gives
+        """
+        thumb = self.thumbsource(imgfile) if self.thumbsource else None
+        if thumb is None:
+            return                                # keep showing the prior image
+        try:
+            newsize = fitSize(peekImageSize(imgpath), scrsize)
+            placeholder = thumb.convert('RGB').resize(newsize, Image.BILINEAR)
+        except:
+            return                                # the decode will report it
+        self.drawImageSized(placeholder)
+
+    def isLoading(self):
+        return self.pendingkey is not None
+
+    def setImage(self, imgpath, loaded):
+        """
+        KBR: switch to a new image's (decoded, fit, truesize) state
+        """
+        self.imgpath = imgpath
+        self.decodedimage, self.fitimage, self.truesize = loaded
+        self.tiles.clear()                               # tiles of prior image
+        isfull = self.decodedimage is not None and self.decodedimage.size == self.truesize
+        self.trueimage = self.decodedimage if isfull else None
+
+    def getTrueImage(self):
+        """
+        KBR: the full-size image, loaded on first use: for actual size,
+        and zooms or resizes larger than any reduced-scale decode
+        """
+        if self.trueimage is None:
+            self.trueimage = loadImage(self.imgpath)
+        return self.trueimage
+
+    def getSourceImage(self, needsize):
+        """
+        KBR: smallest image in hand that's at least needsize, to resize
+        from: the fit, the reduced decode, else the full-size image
+        """
+        needwide, needhigh = needsize
+        for imgpil in (self.fitimage, self.decodedimage, self.trueimage):
+            if imgpil is not None and imgpil.size[0] >= needwide and imgpil.size[1] >= needhigh:
+                return imgpil
+        return self.getTrueImage()
+
+    def prefetchNeighbors(self, direction, depth=2):
+        """
+        KBR: start decoding the next images in the direction of travel
+        """
+        nextfiles = self.navindex.neighbors(self.imgfile, direction, depth)
+        nextpaths = [os.path.join(self.imgdir, nextfile) 
+                         for nextfile in nextfiles if nextfile is not None]
+        self.prefetcher.prefetch(nextpaths, self.getMaxSize())
+
     #
     # Drawing
     #
 
+    def onActualSize(self, event):
+        if not self.isLoading():
+            self.cancelScaling()
+            self.drawImageScaled(self.truesize, Image.NEAREST)   # no resampling
+
+    def onXScroll(self, first, last):
+        self.canvas.hbar.set(first, last)
+        self.tiles.schedule()                            # KBR draw tiles now in view
+
+    def onYScroll(self, first, last):
+        self.canvas.vbar.set(first, last)
+        self.tiles.schedule()
+
+    def onScaledSize(self, event):
+        if not self.isLoading():
+            self.cancelScaling()
+            self.drawImageFirst()
+
     def drawImageFirst(self):
         """
         [SA] draw from self.trueimage, ether scaled or actual;
@@ -205,6 +364,10 @@ class ViewOne(Toplevel):
         trueimage is set by the first two of these only, and is
         used by most ops (viewimage is used by zooms and saves);
 
+        KBR: the fit is made once per image by the decode worker,
+        and cached with the reduced decode that zooms and resizes
+        start from, so that revisits via next/prior are instant too;
+
         resize large images to screen or fixed size initially;
         smaller images are still drawn by actual size, as before;
         viewsize is still experimental (scaling to screen size in
@@ -213,15 +376,8 @@ class ViewOne(Toplevel):
         [SA] imgpil.width and imgpil.height are not available in 
         earlier Pillows: use the older .size tuple-pair instead;
         """
-        imgpil = self.trueimage
-        imgwide, imghigh = imgpil.size                   # size in pixels (x,y)
-        scrwide, scrhigh = self.getMaxSize()             # wm screen size (x,y)
+        self.drawImageSized(self.fitimage)               # actual, or fit to W and H
 
-        if imgwide <= scrwide and imghigh <= scrhigh:    # too big for display?
-            self.drawImageSized(imgpil)                  # no:  win size per img
-        else:                                            # yes: resize to screen
-            self.onSizeToDisplayBoth()                   # scale to screen W and H
- 
         """
         # this else was not as good...
         diffwide = imgwide - scrwide                 # use most-exceeded edge
@@ -236,10 +392,46 @@ class ViewOne(Toplevel):
         """
         draw imgpil, as it is sized, in current window/canvas;
         imgpil may be the original actual size, or a temp resize;
+        KBR: a same-size prior photo is pasted into, not remade, and
+        its canvas item is kept: faster, and no flicker on next/prior;
+        """
+        self.tiles.hide()                                # KBR if tiled before
+        imgtk, reused = pastePhoto(imgpil, getattr(self, 'savephoto', None))
+        if not reused:
+            self.canvas.delete('all')                    # clear prior photo
+            self.canvas.create_image(0, 0, image=imgtk, anchor=NW)
+
+        self.savephoto = imgtk                           # keep reference on me
+        self.viewimage = imgpil                          # currently shown size
+        self.shownsize = imgpil.size
+        self.sizeWindow(imgtk.width(), imgtk.height())   # size in pixels
+
+    def drawImageScaled(self, newsize, filter):
+        """
+        KBR: draw the image at newsize: resized whole if that fits the
+        screen, else in tiles, of which only those in view are resampled
+        (zooming a 20k x 15k scan no longer resizes all of it per step);
+        pixels come from the smallest decode that's big enough;
+        """
+        imgpil = self.getSourceImage(newsize)
+        scrwide, scrhigh = self.getMaxSize()
+        if newsize[0] <= scrwide and newsize[1] <= scrhigh:
+            if imgpil.size != tuple(newsize):
+                with span('view.resize'):
+                    imgpil = imgpil.resize(newsize, filter)
+            self.drawImageSized(imgpil)
+        else:
+            self.tiles.hide()
+            self.canvas.delete('all')                    # untiled photo, if any
+            self.savephoto = self.viewimage = None
+            self.shownsize = tuple(newsize)
+            self.sizeWindow(*newsize)
+            self.tiles.show(imgpil, newsize, filter)
+
+    def sizeWindow(self, imgwide, imghigh):
+        """
+        size canvas and window for an image of the given size
         """
-        imgtk    = PhotoImage(image=imgpil)              # not file=imgpath
-        imgwide  = imgtk.width()                         # size in pixels
-        imghigh  = imgtk.height()                        # same as imgpil.size
         scrwide, scrhigh = self.getMaxSize()             # wm screen size (x,y)
         
         fullsize = (0, 0, imgwide, imghigh)              # scrollable
@@ -247,14 +439,9 @@ class ViewOne(Toplevel):
         viewhigh = min(imghigh, scrhigh)
 
         canvas = self.canvas
-        canvas.delete('all')                             # clear prior photo
         canvas.config(height=viewhigh, width=viewwide)   # viewable window size
         canvas.config(scrollregion=fullsize)             # scrollable area size
-        canvas.create_image(0, 0, image=imgtk, anchor=NW)
-
-        self.savephoto = imgtk                           # keep reference on me
-        self.viewimage = imgpil                          # currently shown size
-#        trace((scrwide, scrhigh), imgpil.size)
+#        trace((scrwide, scrhigh), (imgwide, imghigh))
 
         # [SA] move to upper-left if too big or partially off-screen
         self.update()
@@ -288,8 +475,9 @@ class ViewOne(Toplevel):
         [SA] start from self.trueimage, not last view size;
         [SA] lanczos filter not available in earlier Pillows;
         """
-        imgpil = self.trueimage                           # scale from full size
-        imgwide, imghigh = imgpil.size                    # img size in pixels
+        if self.isLoading():
+            return                                        # KBR no image yet
+        imgwide, imghigh = self.truesize                  # img size in pixels
         scrwide, scrhigh = self.getMaxSize()              # wm screen size (x,y)
         newwide, newhigh = scaler(scrwide, scrhigh, imgwide, imghigh)
         if hasattr(Image, 'LANCZOS'):
@@ -299,8 +487,7 @@ class ViewOne(Toplevel):
                 filter = Image.ANTIALIAS                      # shrink: antialias
             else:                                             # grow: bicub sharper
                 filter = Image.BICUBIC
-        newimg = imgpil.resize((newwide, newhigh), filter)
-        self.drawImageSized(newimg)
+        self.scaleInteractive((newwide, newhigh), filter) # KBR fast, then filter
 
     def onSizeToDisplayHeight(self, event):
         def scaleHigh(scrwide, scrhigh, imgwide, imghigh):
@@ -323,15 +510,8 @@ class ViewOne(Toplevel):
         should this happen in sizeToDisplaySide for all (tbd)?
         """
         def scaleBoth(scrwide, scrhigh, imgwide, imghigh):
-            scrwide, scrhigh = (int(x * .90) for x in (scrwide, scrhigh))
-            newwide, newhigh = imgwide, imghigh
-            if imgwide > scrwide:
-                newhigh = int(imghigh * (scrwide / imgwide))        
-                newwide = scrwide 
-            if imghigh > scrhigh:
-                newwide = int(imgwide * (scrhigh / imghigh))
-                newhigh = scrhigh    
-            return (newwide, newhigh)
+            # KBR shared with prefetch fits; min ratio fits both sides
+            return scaleToFit((imgwide, imghigh), (scrwide, scrhigh))
         self.sizeToDisplaySide(scaleBoth)
 
     #
@@ -343,9 +523,17 @@ class ViewOne(Toplevel):
         zoom in or out in increments;
         [SA] must use viewimage here, else not cumulative;
         [SA] lanczos filter not available in earlier Pillows;
+        KBR: size is cumulative, but pixels come from the smallest
+        decode that's big enough: full size only past the decode;
+        KBR: now shownsize, as zooms past screen size are tiled,
+        or the size of a zoom not yet drawn, for key repeats;
         """
-        imgpil = self.viewimage              # zoom from last display size
-        wide, high = imgpil.size             # may be scaled, actual, zoomed
+        if self.isLoading():
+            return                           # KBR no image yet
+        if self.previewpending:
+            wide, high = self.targetsize     # KBR coalesced key repeats
+        else:
+            wide, high = self.shownsize      # may be scaled, actual, zoomed
         if hasattr(Image, 'LANCZOS'):
             filter = Image.LANCZOS           # [SA] best for all, if available
         else:
@@ -353,8 +541,54 @@ class ViewOne(Toplevel):
                 filter = Image.ANTIALIAS     # also nearest, bilinear
             else:
                 filter = Image.BICUBIC
-        newimg = imgpil.resize((int(wide * factor), int(high * factor)), filter)
-        self.drawImageSized(newimg)
+        newsize = (max(int(wide * factor), 1), max(int(high * factor), 1))
+        self.scaleInteractive(newsize, filter)
+
+    def scaleInteractive(self, newsize, filter):
+        """
+        KBR: two-pass draw for zooms and resizes: held-down I/O keys
+        formerly queued a LANCZOS resize per repeat; now, each step
+        just sets the size, and one draw with a cheap filter runs when
+        the event queue is empty (so repeats that arrive during a draw
+        coalesce into the next one); the final size is redrawn with
+        filter once input has been idle for REFINEMS;
+        """
+        self.targetsize, self.targetfilter = newsize, filter
+        if self.refinepending:
+            self.after_cancel(self.refinepending)
+            self.refinepending = None
+        if self.previewpending is None:
+            self.previewpending = self.after_idle(self.drawPreview, self.loadgen)
+
+    def drawPreview(self, loadgen):
+        """
+        KBR: draws run update() (in sizeWindow), so events handled there
+        may rescale or switch images (N/P) before this one returns: skip
+        draws for a prior image, and replace any refine queued meanwhile
+        """
+        self.previewpending = None
+        if loadgen != self.loadgen:
+            return                                       # superseded
+        self.drawImageScaled(self.targetsize, PREVIEWFILTER)
+        if loadgen != self.loadgen:
+            return                                       # switched during draw
+        if self.refinepending:
+            self.after_cancel(self.refinepending)
+        self.refinepending = self.after(REFINEMS, self.drawRefined, loadgen)
+
+    def drawRefined(self, loadgen):
+        self.refinepending = None
+        if loadgen != self.loadgen:
+            return                                       # superseded
+        self.drawImageScaled(self.targetsize, self.targetfilter)
+
+    def cancelScaling(self):
+        if self.previewpending:
+            self.after_cancel(self.previewpending)
+            self.previewpending = None
+        if self.refinepending:
+            self.after_cancel(self.refinepending)
+            self.refinepending = None
 
     def onZoomIn(self, event, incr=.10):
         self.zoom(1.0 + incr)
@@ -403,37 +637,19 @@ class ViewOne(Toplevel):
         [2.1] must call viewer_thumb's sortedDisplayOrder(),
         not os.listdir() directly, so the next/prior order
         implemented here matches thumbs-display order;
-        """
-        currdir, currfile = self.imgdir, self.imgfile
-        allfiles = sortedDisplayOrder(currdir)
-        imgfiles = list(filter(isTaggableImage, allfiles))
-
-        currix = imgfiles.index(currfile)
-        newix  = currix + ixmod
-        newix  = len(imgfiles)-1 if newix < 0 else newix % len(imgfiles)
-        nextfile = imgfiles[newix]   # wrapped around
 
-        imgpath = os.path.join(currdir, nextfile)     # img file to open
-        try:
-            # open image object to be reused
-            nextimgpil = openImageSafely(imgpath)     # [2.2] avoid Pillow files bug
-            nextimgpil.load()                         # [2.1] load now so errors here
-            nextimgpil = reorientImage(nextimgpil)    # [2.2] right-side up, iff needed 
-        except:
-            # [2.1] can fail on OSError+ in Pillow
-            traceback.print_exc()
-            showerror('PyPhoto: Image Load',
-                      'Cannot load image file:\n%s' % imgpath)
-            self.focus_force()
-            if RunningOnLinux: self.lift()            # else root stays above
-        else:
-            # move iff image loaded
-            self.imgfile = nextfile
-            self.setTitle(nextfile)
-            self.trueimage = nextimgpil               # save for ops on image
-            self.drawImageFirst()                     # new image, same win/canvas
-            self.selectionList.setByName(nextfile)
-            #self.tagwin.showImage(nextfile) # KBR update tagview
+        KBR: the order is now cached and indexed (NavIndex.py),
+        and is the folder window's shown thumbs if filtered;
+        """
+        nextfile = self.navindex.step(self.imgfile, ixmod)   # wrapped around
+        if nextfile is None:
+            return                                           # folder emptied
+
+        # KBR move now; a load error is reported, and moves back, when the
+        # worker's decode ends (see failLoad)
+        self.startLoad(nextfile, ixmod)
+        self.selectionList.setByName(nextfile)
+        #self.tagwin.showImage(nextfile) # KBR update tagview
             
         """
         # or new window: this worked but was too twitchy...
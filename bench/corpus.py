@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+===============================================================================
+Synthetic image corpus for PyPhoto's benchmarks (see runbench.py).
+
+Makes a folder of generated images: a mix of JPEG, PNG, WebP, and TIFF, of
+several pixel sizes, with EXIF orientation tags (so thumbs are reoriented),
+and with XMP 'Xmp.dc.subject' tags drawn from a vocabulary with a skewed,
+Zipf-like distribution (a few tags on many images, many on a few), as in a
+real library.  Some images are left untagged.
+
+Everything is drawn from a random.Random(seed), so the same parameters make
+the same files (names, pixels, and tags) on every machine and run, and
+benchmark results compare across commits.  The parameters are saved in the
+folder's "_corpus.json"; makeCorpus() reuses a folder whose file matches,
+else remakes it.
+
+Usage:  python3 corpus.py <folder> [--count N] [--seed N] ...  (see --help)
+===============================================================================
+"""
+
+import os
+import sys
+import json
+import shutil
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image, ImageDraw
+
+MANIFEST = '_corpus.json'
+FORMATS = {'jpeg': '.jpg', 'png': '.png', 'webp': '.webp', 'tiff': '.tif'}
+ORIENTATION = 0x0112    # EXIF tag
+
+DEFAULTS = dict(count=200,
+                seed=1,
+                formats=['jpeg', 'jpeg', 'jpeg', 'png', 'webp', 'tiff'],  # drawn evenly
+                sizes=['1600x1200', '1200x1600', '800x600', '3000x2000'],
+                orientations=[1, 1, 1, 3, 6, 8],
+                vocabulary=60,          # distinct tags
+                tagged=0.7,             # share of images with tags
+                maxtags=6)              # tags per tagged image: 1..maxtags
+
+
+def corpusParams(**kw):
+    # DEFAULTS, updated by kw; unknown names are errors
+    params = dict(DEFAULTS)
+    for (name, value) in kw.items():
+        if name not in params:
+            raise ValueError('Unknown corpus parameter: %s' % name)
+        params[name] = value
+    return params
+
+
+def tagVocabulary(count):
+    return ['tag%02d' % i for i in range(count)]
+
+
+def drawImage(rand, size):
+    # deterministic content: a background and some shapes, so encoders work
+    img = Image.new('RGB', size, tuple(rand.randrange(256) for i in range(3)))
+    draw = ImageDraw.Draw(img)
+    width, height = size
+    for i in range(12):
+        x0, y0 = rand.randrange(width), rand.randrange(height)
+        x1, y1 = x0 + rand.randrange(width // 2), y0 + rand.randrange(height // 2)
+        color = tuple(rand.randrange(256) for i in range(3))
+        if rand.random() < 0.5:
+            draw.rectangle((x0, y0, x1, y1), fill=color)
+        else:
+            draw.ellipse((x0, y0, x1, y1), fill=color)
+    return img
+
+
+def saveImage(img, path, format, orientation):
+    exif = Image.Exif()
+    exif[ORIENTATION] = orientation
+    if format == 'jpeg':
+        img.save(path, 'JPEG', quality=85, exif=exif.tobytes())
+    elif format == 'webp':
+        img.save(path, 'WEBP', quality=80, exif=exif.tobytes())
+    elif format == 'png':
+        img.save(path, 'PNG', exif=exif.tobytes())
+    else:
+        img.save(path, 'TIFF', compression='tiff_lzw', tiffinfo={ORIENTATION: orientation})
+
+
+def pickTags(rand, vocab, maxtags):
+    # Zipf-like: tag i is drawn with weight 1/(i+1)
+    weights = [1 / (i + 1) for i in range(len(vocab))]
+    tags = set(rand.choices(vocab, weights, k=rand.randint(1, maxtags)))
+    return sorted(tags)
+
+
+def makeCorpus(folder, **kw):
+    """
+    ---------------------------------------------------------------------------
+    Make (or reuse) a corpus in folder, per DEFAULTS updated by kw.  Returns
+    its manifest: the parameters, and 'images', a list of [name, format,
+    size, orientation, tags] for each image, in name order.
+    ---------------------------------------------------------------------------
+    """
+    import pyexiv2
+    pyexiv2.set_log_level(3)                          # pyexiv2 magic
+    params = corpusParams(**kw)
+    manifestpath = os.path.join(folder, MANIFEST)
+    if os.path.exists(manifestpath):
+        with open(manifestpath) as manifestfile:
+            manifest = json.load(manifestfile)
+        if manifest['params'] == params:
+            return manifest                           # same parameters: reuse
+        shutil.rmtree(folder)
+    os.makedirs(folder, exist_ok=True)
+
+    rand = random.Random(params['seed'])
+    vocab = tagVocabulary(params['vocabulary'])
+    images = []
+    for i in range(params['count']):
+        format = rand.choice(params['formats'])
+        size = rand.choice(params['sizes'])
+        orientation = rand.choice(params['orientations'])
+        tagged = rand.random() < params['tagged']
+        tags = pickTags(rand, vocab, params['maxtags']) if tagged else []
+        name = 'img%05d%s' % (i, FORMATS[format])
+        path = os.path.join(folder, name)
+
+        width, height = map(int, size.split('x'))
+        saveImage(drawImage(rand, (width, height)), path, format, orientation)
+        if tags:
+            with pyexiv2.Image(path) as img:
+                img.modify_xmp({'Xmp.dc.subject': tags})
+        images.append([name, format, size, orientation, tags])
+
+    manifest = dict(params=params, images=images)
+    with open(manifestpath, 'w') as manifestfile:
+        json.dump(manifest, manifestfile, indent=1)
+    return manifest
+
+
+def getOptions(argv=None):
+    parser = argparse.ArgumentParser(description='Make a synthetic image corpus.')
+    parser.add_argument('folder', help='corpus folder (made or remade)')
+    parser.add_argument('--count', type=int, default=DEFAULTS['count'])
+    parser.add_argument('--seed', type=int, default=DEFAULTS['seed'])
+    parser.add_argument('--formats', nargs='+', choices=sorted(FORMATS),
+                        default=DEFAULTS['formats'], help='drawn evenly; repeat to weight')
+    parser.add_argument('--sizes', nargs='+', default=DEFAULTS['sizes'],
+                        help='WIDTHxHEIGHT pixel sizes')
+    parser.add_argument('--orientations', nargs='+', type=int,
+                        default=DEFAULTS['orientations'], help='EXIF orientations (1-8)')
+    parser.add_argument('--vocabulary', type=int, default=DEFAULTS['vocabulary'])
+    parser.add_argument('--tagged', type=float, default=DEFAULTS['tagged'])
+    parser.add_argument('--maxtags', type=int, default=DEFAULTS['maxtags'])
+    return parser.parse_args(argv)
+
+
+if __name__ == '__main__':
+    args = vars(getOptions())
+    folder = args.pop('folder')
+    manifest = makeCorpus(folder, **args)
+    tagged = sum(1 for image in manifest['images'] if image[4])
+    print('%s: %d images, %d tagged' % (folder, len(manifest['images']), tagged))
@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+===============================================================================
+PyPhoto benchmark suite: times the app's hot paths on a synthetic corpus
+(see corpus.py), and saves the results as JSON, so runs compare across
+commits and machines.
+
+Benchmarks, each run --runs times (with untimed setup between):
+
+    thumbs_cold      makeThumbs (makeThumbs_pklfile) with no thumbs cache:
+                     every thumb is made, and every image's tags read
+    thumbs_warm      makeThumbs again, all thumbs cached
+    tags_read        TagView.getImgTagsLC for every image
+    filter_tagged    pyphoto.simpleFilter, tagged and untagged, on a new
+                     TagView (so image tags are read, as on a first use)
+    filter_search    pyphoto.complexFilter for the 2 most common tags
+    write_multi      TagView.clickWrite of a tag added to --writes images
+                     at once (copies of corpus images: the corpus is intact)
+    util_walktest    utils/walktest.py, util_findbytag utils/findbytag.py,
+    util_thumbcache  utils/thumbcache.py --verify --stats, and util_bulktag
+    util_bulktag     utils/bulktag.py --rename --dry-run on the corpus, each
+                     run as a command (so Python startup is included)
+
+The output file has "meta" (commit, Python, Pillow, platform, corpus
+parameters) and "results": for each benchmark, its run times in secs, and
+their median and min.  --compare prints each median against a prior file's.
+
+Usage:  python3 runbench.py [--corpus folder] [--count N] [--out file] ...
+===============================================================================
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import tempfile
+import argparse
+import statistics
+import subprocess
+from collections import Counter
+from types import SimpleNamespace
+
+BENCHDIR = os.path.dirname(os.path.abspath(__file__))
+REPODIR = os.path.dirname(BENCHDIR)
+sys.path.insert(0, REPODIR)
+
+import PIL
+from corpus import makeCorpus, corpusParams
+from viewer_thumbs import makeThumbs, thumbCachePath
+from TagView import TagView
+import pyphoto
+
+PKLFILE = '_PyPhoto-thumbs.pkl'
+TSIZE = pyphoto.TSIZE
+
+BENCHES = []    # (name, function), in run order
+
+
+def bench(name):
+    # register a benchmark: function(ctx) returns its timed secs
+    def register(func):
+        BENCHES.append((name, func))
+        return func
+    return register
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - start
+
+
+def newTagView(folder):
+    # a TagView as a folder window's, with no background scan
+    tagwin = TagView(folder)
+    tagwin.initScan()
+    return tagwin
+
+
+def removeCache(folder):
+    for path in (thumbCachePath(folder, PKLFILE), os.path.join(folder, PKLFILE)):
+        if os.path.exists(path):
+            os.remove(path)
+
+
+@bench('thumbs_cold')
+def benchThumbsCold(ctx):
+    removeCache(ctx.corpus)
+    tagwin = newTagView(ctx.corpus)
+    return timed(makeThumbs, ctx.corpus, (TSIZE, TSIZE), 'thumbs', PKLFILE,
+                 False, None, False, tagwin)
+
+@bench('thumbs_warm')
+def benchThumbsWarm(ctx):
+    if not os.path.exists(thumbCachePath(ctx.corpus, PKLFILE)):
+        makeThumbs(ctx.corpus, size=(TSIZE, TSIZE), _tagswin=newTagView(ctx.corpus))
+    tagwin = newTagView(ctx.corpus)
+    return timed(makeThumbs, ctx.corpus, (TSIZE, TSIZE), 'thumbs', PKLFILE,
+                 False, None, False, tagwin)
+
+@bench('tags_read')
+def benchTagsRead(ctx):
+    tagwin = newTagView(ctx.corpus)
+    return timed(lambda: [tagwin.getImgTagsLC(imgfile) for imgfile in ctx.imgfiles])
+
+@bench('filter_tagged')
+def benchFilterTagged(ctx):
+    tagwin = newTagView(ctx.corpus)
+    def filters():
+        pyphoto.simpleFilter(tagwin, ctx.btns, True)
+        pyphoto.simpleFilter(tagwin, ctx.btns, False)
+    return timed(filters)
+
+@bench('filter_search')
+def benchFilterSearch(ctx):
+    tagwin = newTagView(ctx.corpus)
+    return timed(pyphoto.complexFilter, tagwin, ctx.btns, ctx.searchtags)
+
+@bench('write_multi')
+def benchWriteMulti(ctx):
+    scratch = os.path.join(ctx.scratch, 'write')
+    shutil.rmtree(scratch, ignore_errors=True)
+    os.makedirs(scratch)
+    names = ctx.imgfiles[:ctx.writes]
+    for name in names:
+        shutil.copy2(os.path.join(ctx.corpus, name), scratch)
+    tagwin = newTagView(scratch)
+    tagwin.image_names = list(names)              # a multiple selection
+    tagwin.origCurrTagList = set()                # their common tags: none
+    tagwin.currTagList = {'benchtag'}             # add one to all
+    return timed(tagwin.clickWrite)
+
+
+def runUtil(script, *args):
+    subprocess.run([sys.executable, os.path.join(REPODIR, 'utils', script)] + list(args),
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+
+@bench('util_walktest')
+def benchWalktest(ctx):
+    return timed(runUtil, 'walktest.py', ctx.corpus, '--jsonl')
+
+@bench('util_findbytag')
+def benchFindbytag(ctx):
+    return timed(runUtil, 'findbytag.py', ctx.corpus, ctx.searchtags[0], '--jsonl')
+
+@bench('util_thumbcache')
+def benchThumbcache(ctx):
+    return timed(runUtil, 'thumbcache.py', ctx.corpus, '--verify', '--stats')
+
+@bench('util_bulktag')
+def benchBulktag(ctx):
+    return timed(runUtil, 'bulktag.py', ctx.corpus, '--rename', ctx.searchtags[0],
+                 'renamed', '--dry-run', '-q')
+
+
+def gitCommit():
+    # (commit, dirty) of the tree benchmarked, if it's a git checkout
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPODIR,
+                                capture_output=True, text=True, check=True).stdout.strip()
+        status = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'],
+                                cwd=REPODIR, capture_output=True, text=True).stdout
+        return commit, bool(status.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+
+
+def runBenches(args):
+    params = corpusParams(count=args.count, seed=args.seed)
+    corpus = args.corpus or os.path.join(tempfile.gettempdir(),
+                                         'pyphoto-corpus-%d-%d' % (args.count, args.seed))
+    print('Corpus: %s' % corpus)
+    manifest = makeCorpus(corpus, **params)
+    imgfiles = [image[0] for image in manifest['images']]
+    tagcounts = Counter(tag for image in manifest['images'] for tag in image[4])
+    ctx = SimpleNamespace(
+        corpus=corpus, imgfiles=imgfiles, writes=args.writes,
+        btns=[SimpleNamespace(imgfile=imgfile) for imgfile in imgfiles],   # as grid buttons
+        searchtags=[tag for (tag, count) in tagcounts.most_common(2)],
+        scratch=tempfile.mkdtemp(prefix='pyphoto-bench-'))
+
+    results = {}
+    try:
+        for (name, func) in BENCHES:
+            if args.only and name not in args.only:
+                continue
+            runs = [func(ctx) for run in range(args.runs)]
+            results[name] = dict(runs=runs, median=statistics.median(runs), min=min(runs))
+            print('%-16s median %8.4f  min %8.4f' % (name, results[name]['median'], min(runs)))
+    finally:
+        shutil.rmtree(ctx.scratch, ignore_errors=True)
+
+    commit, dirty = gitCommit()
+    meta = dict(commit=commit, dirty=dirty, date=time.strftime('%Y-%m-%dT%H:%M:%S'),
+                python=platform.python_version(), pillow=PIL.__version__,
+                platform=platform.platform(), cpus=os.cpu_count(),
+                runs=args.runs, writes=args.writes, corpus=manifest['params'])
+    return dict(meta=meta, results=results)
+
+
+def compare(report, priorfile):
+    with open(priorfile) as prior:
+        prior = json.load(prior)
+    print('Against %s (commit %s):' % (priorfile, prior['meta'].get('commit')))
+    for (name, result) in report['results'].items():
+        old = prior['results'].get(name)
+        if old:
+            print('%-16s %8.4f => %8.4f  (%+.1f%%)' % (name, old['median'], result['median'],
+                  (result['median'] / old['median'] - 1) * 100 if old['median'] else 0))
+
+
+def getOptions(argv=None):
+    names = [name for (name, func) in BENCHES]
+    parser = argparse.ArgumentParser(description='Time PyPhoto on a synthetic corpus.')
+    parser.add_argument('--corpus', help='corpus folder (default: a temp folder)')
+    parser.add_argument('--count', type=int, default=200, help='corpus images')
+    parser.add_argument('--seed', type=int, default=1, help='corpus seed')
+    parser.add_argument('--runs', type=int, default=3, help='runs per benchmark')
+    parser.add_argument('--writes', type=int, default=50, help='images in write_multi')
+    parser.add_argument('--only', nargs='+', choices=names, help='benchmarks to run')
+    parser.add_argument('--out', default='benchresults.json', help='results file')
+    parser.add_argument('--compare', metavar='FILE', help="a prior run's results file")
+    return parser.parse_args(argv)
+
+
+if __name__ == '__main__':
+    args = getOptions()
+    report = runBenches(args)
+    with open(args.out, 'w') as outfile:
+        json.dump(report, outfile, indent=1)
+    print('Results: %s' % args.out)
+    if args.compare:
+        compare(report, args.compare)
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+===============================================================================
+Thumbs-cache benchmark: compare cache encodings and framings on a folder.
+
+The folder's thumbs are made once, then saved as a cache file with each
+combination of viewer_thumbs' "cacheencoding" (thumb bytes format) and
+"cacheframing" (cache file compression), as PyPhoto's CacheEncoding and
+CacheFraming configs would.  For each, reports:
+
+    size     bytes of the cache file
+    load     secs to read and unpickle the file (loadThumbCache)
+    decode   secs to decode all its thumbs (as ThumbResidency does on show)
+
+Times are medians of several runs.  Cache files are written to benchdir,
+which defaults to a temporary folder: pass a folder on the NAS or slow disk
+of interest to include its read times (though OS caches may hide these after
+the first run).
+
+Usage:  python3 cachebench.py imgdir [benchdir] [runs]
+===============================================================================
+"""
+
+import sys, os, io, time, shutil, tempfile, statistics
+from PIL import Image
+import viewer_thumbs
+from viewer_thumbs import (makeThumbEntry, encodeThumb, initMarks, isTaggableImage,
+                           sortedDisplayOrder, setCacheEncoding, saveThumbCache,
+                           loadThumbCache, loadCodecPlugins)
+
+ENCODINGS = ('native', 'webp', 'jpeg')
+FRAMINGS  = (None, 'zlib', 'lzma')
+
+
+def makeAllThumbs(imgdir, size):
+    # the folder's PIL thumbs, made once for all encodings
+    initMarks()
+    thumbs = []
+    for imgfile in filter(isTaggableImage, sortedDisplayOrder(imgdir)):
+        imgobj, entry = makeThumbEntry(imgdir, imgfile, size, markstate=0)
+        thumbs.append((imgfile, imgobj, entry[0] if entry else 0))
+    return thumbs
+
+
+def timed(func, runs):
+    times = []
+    for run in range(runs):
+        start = time.perf_counter()
+        result = func()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times), result
+
+
+def decodeAll(thumbcache):
+    for (imgfile, imgdat) in thumbcache.items():
+        loadCodecPlugins(imgfile)                 # 'native' AVIF thumbs
+        Image.open(io.BytesIO(imgdat[1])).load()
+
+
+def main(imgdir, benchdir, runs, size=(160, 160)):
+    print('Making thumbs for', imgdir)
+    thumbs = makeAllThumbs(imgdir, size)
+    print('%d thumbs\n' % len(thumbs))
+    print('%-8s %-6s %12s %10s %10s' % ('encoding', 'framing', 'size', 'load', 'decode'))
+
+    for encoding in ENCODINGS:
+        setCacheEncoding(encoding)
+        thumbcache = {imgfile: (modtime, encodeThumb(imgobj, imgfile))
+                          for (imgfile, imgobj, modtime) in thumbs}
+        decode = timed(lambda: decodeAll(thumbcache), runs)[0]
+        for framing in FRAMINGS:
+            setCacheEncoding(encoding, framing)
+            thumbpath = os.path.join(benchdir, 'bench-%s-%s.pkl' % (encoding, framing))
+            saveThumbCache(thumbpath, thumbcache)
+            load, loaded = timed(lambda: loadThumbCache(thumbpath), runs)
+            assert len(loaded) == len(thumbcache)
+            print('%-8s %-6s %12d %10.4f %10.4f' %
+                  (encoding, framing, os.path.getsize(thumbpath), load, decode))
+            os.remove(thumbpath)
+    setCacheEncoding()
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print('Usage: python3 cachebench.py imgdir [benchdir] [runs]')
+        sys.exit(1)
+    imgdir = os.path.abspath(sys.argv[1])
+    runs = int(sys.argv[3]) if len(sys.argv) > 3 else 5
+    if len(sys.argv) > 2:
+        main(imgdir, sys.argv[2], runs)
+    else:
+        benchdir = tempfile.mkdtemp()
+        try:
+            main(imgdir, benchdir, runs)
+        finally:
+            shutil.rmtree(benchdir)
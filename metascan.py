@@ -0,0 +1,164 @@
+"""
+===============================================================================
+Concurrent metadata scan: the tags of all images in one folder, read by a
+bounded pool of worker processes while the caller does other work.
+
+Opening a folder formerly read each image's tags (TagView.getTags) inside
+the thumbnails loop, one image at a time, so tag reads and image decodes
+waited on each other, and a warm open (all thumbs cached) still read every
+image serially before the grid appeared.  A MetaScan instead reads the
+folder's 'Xmp.dc.subject' tags in chunks, in display order, a few chunks
+ahead of its consumers:
+    - get(imgfile) waits for just that image's tags (its chunk is usually
+      done already), e.g., for a new thumb's watermark
+    - poll() returns, without waiting, all results finished since the last
+      poll, for GUIs that check on a timer (see TagView.pollScan)
+    - iterResults() yields all results as they finish, for scripts.
+
+Each result is (imgfile, isok, tags), as treescan.readTags: tags as stored,
+isok False if the image's tags could not be read.  tagState() maps these to
+the 0/1/2 (untagged/tagged/error) states of thumb watermarks.
+
+Used by TagView (folder windows) and utils/thumbcache.py; treescan.py is its
+counterpart for whole trees.  Run this file to time a folder's scan.
+===============================================================================
+"""
+
+import os, sys, time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from treescan import readTags
+
+MAXJOBS = 4        # default workers: tag reads are mostly file I/O
+CHUNKSIZE = 16     # images per worker task
+AHEAD = 2          # chunks queued per worker, beyond those being read
+MINFILES = 64      # smaller folders: starting workers costs more than it saves
+
+
+def tagState(isok, tags):
+    # a thumb's watermark state, as TagView.getTags: 0=untagged, 1=tagged, 2=error
+    if not isok:
+        return 2
+    return 1 if [i for i in tags if i] else 0
+
+
+def readChunk(imgdir, imgfiles):
+    # one task, in a worker process
+    return [(imgfile,) + readTags(os.path.join(imgdir, imgfile)) for imgfile in imgfiles]
+
+
+class MetaScan:
+    """
+    ---------------------------------------------------------------------------
+    Scan imgfiles (names in imgdir, in the order they'll be needed) with jobs
+    worker processes (default: up to MAXJOBS, one per CPU).  At most
+    jobs * (1 + AHEAD) chunks are queued at once, so a closed or abandoned
+    scan stops soon; get() of a later image queues through its chunk.
+    Results are kept, and each is also returned once by poll() or iterResults().
+    close() ends the scan; use from one thread only.
+    ---------------------------------------------------------------------------
+    """
+    def __init__(self, imgdir, imgfiles, jobs=None, chunksize=CHUNKSIZE):
+        self.imgdir = imgdir
+        self.jobs = jobs or min(MAXJOBS, os.cpu_count() or 1)
+        self.chunks = [imgfiles[i:i+chunksize] for i in range(0, len(imgfiles), chunksize)]
+        self.chunkof = {imgfile: ix for (ix, chunk) in enumerate(self.chunks)
+                                        for imgfile in chunk}
+        self.pending = {}               # chunk index => future, not yet collected
+        self.nextchunk = 0              # next chunk to queue
+        self.results = {}               # imgfile => (isok, tags), collected
+        self.ready = []                 # collected, not yet returned by poll()
+        self.pool = ProcessPoolExecutor(self.jobs)
+        self.feed()
+
+    def feed(self, through=-1):
+        # queue chunks up to the bound, and through chunk index through
+        limit = self.jobs * (1 + AHEAD)
+        while (self.nextchunk < len(self.chunks) and
+               (len(self.pending) < limit or self.nextchunk <= through)):
+            self.pending[self.nextchunk] = self.pool.submit(
+                       readChunk, self.imgdir, self.chunks[self.nextchunk])
+            self.nextchunk += 1
+
+    def collect(self, ix):
+        future = self.pending.pop(ix)
+        try:
+            chunk = future.result()
+        except Exception:               # e.g., a worker died: tags unknown
+            chunk = [(imgfile, False, []) for imgfile in self.chunks[ix]]
+        for (imgfile, isok, tags) in chunk:
+            self.results[imgfile] = (isok, tags)
+            self.ready.append((imgfile, isok, tags))
+
+    def get(self, imgfile):
+        """
+        (isok, tags) for one of the scan's images, waiting for it if need be
+        """
+        if imgfile not in self.results:
+            ix = self.chunkof[imgfile]
+            self.feed(through=ix)
+            self.collect(ix)
+            self.feed()
+        return self.results[imgfile]
+
+    def poll(self):
+        """
+        [(imgfile, isok, tags)] finished since the last poll, without waiting
+        """
+        for ix in [ix for (ix, future) in self.pending.items() if future.done()]:
+            self.collect(ix)
+        self.feed()
+        ready, self.ready = self.ready, []
+        return ready
+
+    def iterResults(self):
+        """
+        yield (imgfile, isok, tags) for all images not yet polled, as they
+        finish: for scripts
+        """
+        while True:
+            for result in self.poll():
+                yield result
+            if not self.pending:
+                break
+            wait(self.pending.values(), return_when=FIRST_COMPLETED)
+
+    def done(self):
+        return not self.pending and self.nextchunk == len(self.chunks)
+
+    def progress(self):
+        return len(self.results), len(self.chunkof)
+
+    def close(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
+        self.pending = {}
+        self.nextchunk = len(self.chunks)
+
+
+def scanFolder(imgdir, imgfiles=None, jobs=None):
+    """
+    yield (imgfile, isok, tags) for imgfiles in imgdir (default: all its
+    taggable images), as they finish
+    """
+    if imgfiles is None:
+        from viewer_thumbs import sortedDisplayOrder, isTaggableImage
+        imgfiles = list(filter(isTaggableImage, sortedDisplayOrder(imgdir)))
+    scan = MetaScan(imgdir, imgfiles, jobs)
+    try:
+        for result in scan.iterResults():
+            yield result
+    finally:
+        scan.close()
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print('Usage: python3 metascan.py <image folder> [jobs]')
+        sys.exit(1)
+    imgdir = sys.argv[1]
+    jobs = int(sys.argv[2]) if len(sys.argv) > 2 else None
+    start = time.perf_counter()
+    states = [0, 0, 0]
+    for (imgfile, isok, tags) in scanFolder(imgdir, jobs=jobs):
+        states[tagState(isok, tags)] += 1
+    print('Scanned %d images in %.2f secs: %d untagged, %d tagged, %d errors' %
+          (sum(states), time.perf_counter() - start, *states))
@@ -0,0 +1,147 @@
+"""
+===============================================================================
+Switchable timing spans for PyPhoto's hot paths.
+
+Code to be timed is wrapped in a named span:
+
+    with perfstats.span('thumb.resize'):
+        imgobj.thumbnail(size, Image.LANCZOS)
+
+When enabled, each span's duration is recorded under its name, and stats()
+gives per-name counts, total and mean secs, and percentile latencies (p50,
+p90, p99, max).  Percentiles are computed from each name's most recent
+MAXSAMPLES durations; counts and totals are exact.  When disabled (the
+default), span() returns a shared do-nothing context, so a span costs one
+call and a test: leave them in place.
+
+Span names, by area (see the modules that use them):
+    cache.load, cache.save       thumbs cache read+unpickle, pickle+write
+    tags.read, tags.write        TagView tag reads in thumbs loads, writes
+    tags.writeall                TagView.clickWrite, all selected images
+    thumb.open, thumb.resize     new thumbs: decode+reorient, LANCZOS downsize
+    thumb.encode                 new thumbs: encode for the cache
+    thumbs.load, grid.build      pyphoto folder opens: all thumbs, buttons
+    view.decode, view.fit        ViewOne images: decode (maybe reduced), fit
+    view.resize                  ViewOne zooms and size changes
+    ui.stall                     main-loop freezes, if watched (StallWatch.py)
+
+PyPhoto enables spans per its PerfStats config; stats are shown by its
+Help/Performance Stats window (StatsView.py), and are written to the
+PerfStatsFile config's file on exit, if one is set.
+===============================================================================
+"""
+
+import time, json, atexit, threading
+from collections import deque
+
+MAXSAMPLES = 10000     # latencies kept per span name, for percentiles
+
+enabled = False
+spans = {}             # name => SpanStats
+lock = threading.Lock()   # spans are also timed in ViewOne's decode thread
+
+
+class SpanStats:
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.samples = deque(maxlen=MAXSAMPLES)
+
+
+class NoSpan:
+    # the disabled span: does nothing, and is shared
+    def __enter__(self):
+        return self
+    def __exit__(self, *exc):
+        return False
+
+NOSPAN = NoSpan()
+
+
+class Span:
+    def __init__(self, name):
+        self.name = name
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+    def __exit__(self, *exc):
+        record(self.name, time.perf_counter() - self.start)
+        return False
+
+
+def span(name):
+    """
+    a context manager timing its block under name, if enabled
+    """
+    return Span(name) if enabled else NOSPAN
+
+
+def record(name, secs):
+    with lock:
+        stat = spans.get(name)
+        if stat is None:
+            stat = spans[name] = SpanStats()
+        stat.count += 1
+        stat.total += secs
+        stat.samples.append(secs)
+
+
+def setEnabled(flag, dumpfile=None):
+    """
+    turn spans on or off; if dumpfile, write stats to it on exit
+    """
+    global enabled
+    enabled = flag
+    if flag and dumpfile:
+        atexit.register(dump, dumpfile)
+
+
+def reset():
+    with lock:
+        spans.clear()
+
+
+def percentile(ordered, fraction):
+    # nearest-rank percentile of a sorted, nonempty list
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def stats():
+    """
+    {name: dict(count, total, mean, p50, p90, p99, max)}, times in secs
+    """
+    result = {}
+    with lock:
+        items = [(name, stat.count, stat.total, sorted(stat.samples))
+                     for (name, stat) in spans.items()]
+    for (name, count, total, ordered) in items:
+        result[name] = dict(count=count, total=total, mean=total / count,
+                            p50=percentile(ordered, .50), p90=percentile(ordered, .90),
+                            p99=percentile(ordered, .99), max=ordered[-1])
+    return result
+
+
+def report():
+    """
+    stats() as a text table, in msecs, by total time
+    """
+    lines = ['%-16s %8s %10s %9s %9s %9s %9s %9s' %
+             ('span', 'count', 'total', 'mean', 'p50', 'p90', 'p99', 'max')]
+    allstats = stats()
+    for name in sorted(allstats, key=lambda name: -allstats[name]['total']):
+        stat = allstats[name]
+        lines.append('%-16s %8d %10.1f %9.3f %9.3f %9.3f %9.3f %9.3f' %
+                     ((name, stat['count']) + tuple(stat[key] * 1000 for key in
+                      ('total', 'mean', 'p50', 'p90', 'p99', 'max'))))
+    if not allstats:
+        lines.append('(no spans recorded%s)' % ('' if enabled else ': PerfStats is off'))
+    return '\n'.join(lines)
+
+
+def dump(filename):
+    """
+    write stats() to filename, as JSON (times in secs)
+    """
+    with open(filename, 'w') as dumpfile:
+        json.dump(dict(date=time.strftime('%Y-%m-%dT%H:%M:%S'), spans=stats()),
+                  dumpfile, indent=1)
@@ -0,0 +1,142 @@
+"""
+===============================================================================
+PIL-to-Tk image transfer, shared by the thumbs grid and ViewOne.
+
+Making a new PIL.ImageTk.PhotoImage per image is a measurable share of wall
+time for big images and for thousands of thumbs.  Two cheaper paths:
+
+- pastePhoto(): reuse an existing PhotoImage by pasting into it when the
+  size matches.  No new Tk image is created, and a canvas item that shows
+  the photo is updated in place, so ViewOne's next/prior does not flicker.
+
+- transferThumbs(): batch many small images into one atlas image, make one
+  PIL-to-Tk transfer for the atlas, then split it into per-thumb Tk photos
+  with Tk-side copies (C memcpy, no Python per pixel).  Destination photos
+  may be spares recycled from evicted thumbs, of any size.
+
+Run this file for micro-benchmarks of both paths versus the former ones:
+    python3 phototransfer.py [numthumbs] [numfullscreens]
+===============================================================================
+"""
+
+from tkinter import PhotoImage as TkPhotoImage
+from PIL import Image
+from PIL.ImageTk import PhotoImage
+
+ATLASWIDE = 2048    # max atlas width in pixels: keeps one transfer moderate
+
+
+def pastePhoto(imgpil, photo=None):
+    """
+    ---------------------------------------------------------------------------
+    Return (photo, reused): paste imgpil into photo if it's a same-size
+    PIL.ImageTk.PhotoImage, else make a new one.  Callers that also show
+    the photo in a canvas can skip recreating the item when reused.
+    ---------------------------------------------------------------------------
+    """
+    if (isinstance(photo, PhotoImage) and
+        (photo.width(), photo.height()) == imgpil.size):
+        photo.paste(imgpil)
+        return photo, True
+    return PhotoImage(image=imgpil), False
+
+
+def hasAlpha(imgpil):
+    return imgpil.mode in ('RGBA', 'LA', 'PA', 'RGBa') or 'transparency' in imgpil.info
+
+
+def packAtlas(imgs, atlaswide=ATLASWIDE):
+    """
+    shelf-pack imgs left-to-right into rows; returns (atlas size, boxes)
+    """
+    boxes = []
+    x = y = rowhigh = fullwide = 0
+    for img in imgs:
+        wide, high = img.size
+        if x and x + wide > atlaswide:
+            x, y, rowhigh = 0, y + rowhigh, 0
+        boxes.append((x, y, x + wide, y + high))
+        x += wide
+        rowhigh = max(rowhigh, high)
+        fullwide = max(fullwide, x)
+    return (max(fullwide, 1), max(y + rowhigh, 1)), boxes
+
+
+def transferThumbs(imgs, spares=None):
+    """
+    ---------------------------------------------------------------------------
+    Convert a batch of small PIL images to Tk photos with a single PIL-to-Tk
+    transfer.  Returns a list of tkinter PhotoImages, in imgs order.  Photos
+    are popped from the spares list while it lasts, and are resized to fit
+    ("-shrink") and fully overwritten ("-compositingrule set").
+    ---------------------------------------------------------------------------
+    """
+    if not imgs:
+        return []
+    mode = 'RGBA' if any(hasAlpha(img) for img in imgs) else 'RGB'
+    size, boxes = packAtlas(imgs)
+    atlas = Image.new(mode, size)
+    for img, box in zip(imgs, boxes):
+        if img.mode != mode:
+            img = img.convert(mode)
+        atlas.paste(img, box[:2])
+    atlasphoto = PhotoImage(image=atlas)               # the one transfer
+
+    photos = []
+    for box in boxes:
+        photo = spares.pop() if spares else TkPhotoImage()
+        atlasphoto.tk.call(photo, 'copy', atlasphoto, '-from', *box,
+                '-shrink', '-compositingrule', 'set')
+        photos.append(photo)
+    return photos
+
+
+if __name__ == '__main__':
+
+    #--------------------------------------------------------------------------
+    # Micro-benchmarks: former per-image path versus the paths here
+    #--------------------------------------------------------------------------
+
+    import sys, time, random
+    from tkinter import Tk
+
+    numthumbs = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    numfulls  = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    root = Tk()
+    root.withdraw()
+    random.seed(42)
+
+    def noise(size):
+        return Image.frombytes('RGB', size, random.randbytes(size[0] * size[1] * 3))
+
+    def timeit(label, func, count):
+        start = time.perf_counter()
+        result = func()
+        root.update_idletasks()
+        elapsed = time.perf_counter() - start
+        print('%-38s %8.1f ms total  %8.3f ms each' % (label, elapsed * 1000, elapsed * 1000 / count))
+        return result
+
+    sizes = [(160, 120), (120, 160), (160, 160), (160, 107)]
+    thumbs = [noise(random.choice(sizes)) for i in range(numthumbs)]
+    print('Thumbs: %d images' % numthumbs)
+    keep = timeit('  PhotoImage per thumb (former)', lambda: [PhotoImage(t) for t in thumbs], numthumbs)
+    del keep
+    def batched():
+        photos = []
+        for i in range(0, len(thumbs), 64):
+            photos += transferThumbs(thumbs[i:i+64])
+        return photos
+    spares = timeit('  transferThumbs, batches of 64', batched, numthumbs)
+    timeit('  transferThumbs, reusing spares', lambda: transferThumbs(thumbs, spares), numthumbs)
+
+    wide, high = root.winfo_screenwidth(), root.winfo_screenheight()
+    fulls = [noise((wide, high)) for i in range(numfulls)]
+    print('Full-screen: %d images of %dx%d' % (numfulls, wide, high))
+    timeit('  PhotoImage per image (former)', lambda: [PhotoImage(image=f) for f in fulls], numfulls)
+    def pasted():
+        photo = None
+        for f in fulls:
+            photo, reused = pastePhoto(f, photo)
+    timeit('  pastePhoto into one reused photo', pasted, numfulls)
+    root.destroy()
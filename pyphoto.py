@@ -52,11 +52,19 @@ from ViewOne import *
 TSIZE = 160 # KBR magic number size of thumbnail
 
 # thumbnail generation code, developed earlier in book
-from viewer_thumbs import makeThumbs, isImageFileName, sortedDisplayOrder
+from viewer_thumbs import makeThumbs, isImageFileName, sortedDisplayOrder, updateThumbs
+from viewer_thumbs import isTaggableImage
 
 # [2.2] auto-rotation of tilted images, avoid Pillow too-many-open-files bug
-from viewer_thumbs import reorientImage, openImageSafely
+from viewer_thumbs import reorientImage, openImageSafely, setCacheRoot, setCacheEncoding
 from ObservableList import ObservableList
+import ThumbResidency
+from NavIndex import NavIndex, ListIndex
+from TreeThumbs import TreeThumbs
+from FolderWatcher import FolderWatcher
+import perfstats
+from perfstats import span
+from StallWatch import StallWatch
 
 # [SA] Mac port (and other backports)
 RunningOnMac = sys.platform.startswith('darwin')
@@ -91,6 +99,7 @@ class ScrolledCanvas(Canvas):
         self.config(borderwidth=0)
         vbar = Scrollbar(container)
         hbar = Scrollbar(container, orient='horizontal')
+        self.vbar, self.hbar = vbar, hbar
 
         vbar.pack(side=RIGHT,  fill=Y)                 # pack canvas after bars
         hbar.pack(side=BOTTOM, fill=X)                 # so clipped first
@@ -104,7 +113,40 @@ class ScrolledCanvas(Canvas):
 class ThumbCanvas(ScrolledCanvas):
 
     unselectedColor = None
-    
+    residency = None      # ThumbResidency manager for this window's thumbs
+    loader = None         # TreeThumbs, in tree windows: loads thumbs on demand
+    layoutbtns = []       # buttons in their current grid order
+    numcols = 1
+    linksize = 1
+
+    def __init__(self, container):
+        ScrolledCanvas.__init__(self, container)
+        self.pendingshow = None
+        self.config(yscrollcommand=self.onYScroll)
+
+    def onYScroll(self, first, last):
+        self.vbar.set(first, last)
+        self.scheduleShow()
+
+    def scheduleShow(self):
+        # coalesce scroll storms into one residency update
+        if self.pendingshow is None:
+            self.pendingshow = self.after_idle(self.showVisible)
+
+    def showVisible(self):
+        # give Tk images to thumbs in view, plus one row either side
+        self.pendingshow = None
+        if self.residency is None or not self.layoutbtns:
+            return
+        top = self.canvasy(0)
+        bottom = top + self.winfo_height()
+        firstrow = max(int(top // self.linksize) - 1, 0)
+        lastrow  = int(bottom // self.linksize) + 1
+        lo, hi = firstrow * self.numcols, (lastrow + 1) * self.numcols
+        if self.loader:
+            self.loader.need(self.layoutbtns[lo:hi])     # KBR tree: load folders
+        self.residency.show(self.layoutbtns[lo:hi])
+
     def observe_update(self, action, item):
         #print(f"Canvas: update {action} {len(item) if item != None else 0} ")
         if action == "clear":
@@ -138,6 +180,10 @@ class ThumbCanvas(ScrolledCanvas):
 
 canvas = None # TODO HACK
 selectionList = None # TODO HACK
+watchfolders = False # KBR set from configs: see FolderWatcher
+libraryroot = None   # KBR set from configs: see LibraryView
+scanjobs = None      # KBR set from configs: see metascan.py
+SCANMS = 100         # KBR msecs between checks for background-scanned tags
 
 def singleClick(btn, imgdir, fileimpacted, tagwin):
     # Single mouse click handling (selection). 
@@ -168,8 +214,9 @@ def updateCanvas(canvas, btns, tagwin, clearSelection=True): # TODO canvas class
 
     width = int(canvas.winfo_width())
     height = int(canvas.winfo_height())
-    numcols = int(width / linksize)
+    numcols = max(int(width / linksize), 1)
     numrows = int(math.ceil(numthumbs / numcols))
+    canvas.layoutbtns, canvas.numcols, canvas.linksize = btns, numcols, linksize
 
     fullsize = (0, 0,                                   # upper left  X,Y
         (linksize * numcols), (linksize * numrows) )    # lower right X,Y
@@ -184,7 +231,34 @@ def updateCanvas(canvas, btns, tagwin, clearSelection=True): # TODO canvas class
                     window=abtn, width=linksize, height=linksize)
             colpos += linksize
         rowpos += linksize
+    canvas.scheduleShow()
       
+def makeThumbButton(canvas, imgfile, imgobj, residency, tagwin, dirwinsize):
+    # one thumb's button and its click handlers; its image is lazy
+    # (imgobj=None: registered later, when its folder loads: TreeThumbs)
+    win = canvas.master
+    link  = Button(canvas, relief="raised")
+    link.imgfile = imgfile
+    if imgobj is not None:
+        residency.register(imgfile, imgobj, link)
+    
+    def handler1(event, _link=link, _imgfile=imgfile):
+        singleClick(_link, win.imgdir, _imgfile, tagwin)
+    link.bind('<Button-1>', handler1)
+    
+    def handler3(event, _link=link, _imgfile=imgfile):
+        ctrlClick(_link, win.imgdir, _imgfile, tagwin)
+    link.bind('<Control-Button-1>', handler3)
+
+    def handler2(event, _imgfile=imgfile):
+        ViewOne(win.imgdir, _imgfile, dirwinsize, viewsize, canvas.master, nothumbchanges, selectionList, tagwin, appname,
+                thumbsource=residency.getThumbImage, navindex=win.navindex)
+        #ViewOne(imgdir, _imgfile, dirwinsize, viewsize, win, nothumbchanges)
+    link.bind('<Double-1>', handler2)
+    
+    # TODO shift+click to select range of images
+    return link
+
 def buildCanvas(canvas, dirwinsize, numcols, thumbs, tagwin): # TODO canvas class method
 
     win = canvas.master    
@@ -211,45 +285,64 @@ def buildCanvas(canvas, dirwinsize, numcols, thumbs, tagwin): # TODO canvas clas
         (linksize * numcols), (linksize * numrows) )    # lower right X,Y
     canvas.config(scrollregion=fullsize)                # scrollable area size
 
+    # Tk images are made lazily, as thumbs scroll into view
+    residency = ThumbResidency.ThumbResidency()
+    canvas.residency = residency
+
     rowpos = 0
-    savephotos = []
     allbtns = []
     while thumbs:
         thumbsrow, thumbs = thumbs[:numcols], thumbs[numcols:]
         colpos = 0
         for (imgfile, imgobj) in thumbsrow:
-            photo = PhotoImage(imgobj)
-            link  = Button(canvas, image=photo, relief="raised")
-            link.imgfile = imgfile
+            link = makeThumbButton(canvas, imgfile, imgobj, residency, tagwin, dirwinsize)
             allbtns.append(link) # keep reference to avoid gc
             
-            def handler1(event, _link=link, _imgfile=imgfile):
-                singleClick(_link, win.imgdir, _imgfile, tagwin)
-            link.bind('<Button-1>', handler1)
-            
-            def handler3(event, _link=link, _imgfile=imgfile):
-                ctrlClick(_link, win.imgdir, _imgfile, tagwin)
-            link.bind('<Control-Button-1>', handler3)
-
-            def handler2(event, _imgfile=imgfile):
-                ViewOne(win.imgdir, _imgfile, dirwinsize, viewsize, canvas.master, nothumbchanges, selectionList, tagwin, appname)
-                #ViewOne(imgdir, _imgfile, dirwinsize, viewsize, win, nothumbchanges)
-            link.bind('<Double-1>', handler2)
-            
-        # TODO shift+click to select range of images
-            
             #link.pack(side=LEFT, expand=YES, padx=4, pady=4) # appears to be unnecessary?
             canvas.create_window(colpos, rowpos, anchor=NW,
                     window=link, width=linksize, height=linksize)
             colpos += linksize
-            savephotos.append(photo)
         rowpos += linksize
         
     if len(allbtns) > 0:
       unSelectedColor = allbtns[0].cget("background")
       canvas.setUnSelectColor(unSelectedColor)
-      
-    return savephotos, allbtns
+
+    canvas.layoutbtns, canvas.numcols, canvas.linksize = allbtns, max(numcols, 1), max(linksize, 1)
+    canvas.scheduleShow()
+    return residency, allbtns
+
+def buildTreeCanvas(canvas, root, tagwin, dirwinsize, nothumbchanges):
+    """
+    KBR: a tree window's grid: buttons for all images in root and its
+    subfolders (keyed by relative paths), but no thumbs yet; each folder's
+    thumbs load when its buttons scroll into view, else in the background
+    """
+    win = canvas.master
+    residency = ThumbResidency.ThumbResidency()
+    canvas.residency = residency
+    loader = TreeThumbs(win, root, residency, tagwin, (TSIZE, TSIZE), nothumbchanges,
+                        scanjobs)                 # also starts the tree's tags scan
+    allbtns = [makeThumbButton(canvas, imgfile, None, residency, tagwin, dirwinsize)
+                   for imgfile in loader.imgfiles]
+    loader.setButtons(allbtns)
+    canvas.loader = loader
+
+    def onload(prefix):
+        loaded, total = loader.progress()
+        win.basetitle = '%s: %s [tree%s] (D=open)' % (appname, root,
+                    '' if loaded == total else ', %d/%d folders' % (loaded, total))
+        if not tagwin.scan:
+            win.title(win.basetitle)          # else pollTags shows it, with tags
+        canvas.scheduleShow()                 # its thumbs may be in view
+    loader.onload = onload
+
+    if allbtns:
+        canvas.setUnSelectColor(allbtns[0].cget("background"))
+    canvas.config(width=dirwinsize[0])
+    updateCanvas(canvas, allbtns, tagwin, False)   # relaid on <Configure>
+    loader.start()
+    return residency, allbtns
 
 def complexFilter(tagwin, btns, searchlist):
   # all thumbs which match a tag search set
@@ -266,27 +359,100 @@ def complexFilter(tagwin, btns, searchlist):
 def simpleFilter(tagwin, btns, taggedonly):
   # identify tagged / untagged
     subthumbs = []
+    # KBR by tag states, read once by the folder's tags scan (or here)
     for btn in btns:
-        ok, tags = tagwin.getImgTagsLC(btn.imgfile)
+        state = tagwin.getTagState(btn.imgfile)
         
         if taggedonly:
-            if ok and len(tags):
+            if state == 1:
                 subthumbs.append(btn)
         else:
-            if ok and not len(tags):
+            if state == 0:
                 subthumbs.append(btn)
     return subthumbs                
 
+def pollTags(win):
+    # KBR add the folder's tags as its background scan reads them (TagView.initScan)
+    win.tagwin.pollScan()
+    if win.tagwin.scan:
+        win.title('%s [tags %d/%d]' % ((win.basetitle,) + win.tagwin.scan.progress()))
+        win.scantimer = win.after(SCANMS, lambda: pollTags(win))
+    else:
+        win.title(win.basetitle)
+        win.scantimer = None
+
+def setNavOrder(win):
+    # KBR ViewOne's N/P walks the thumbs shown, not the whole folder
+    if win.currbtns is win.allbtns:
+        win.navindex.setSubset(None)
+    else:
+        win.navindex.setSubset(btn.imgfile for btn in win.currbtns)
+
+def onFolderChanges(win, names):
+    """
+    KBR: apply a FolderWatcher's changes: only the named files' thumbs,
+    tags, and buttons are redone, instead of reopening the whole folder;
+    names=None means the watch lost track, so recheck every file
+    """
+    canvas = win.thumbcanvas
+    if names is None:
+        names = set(os.listdir(win.imgdir)) | {btn.imgfile for btn in win.allbtns}
+    made, removed = updateThumbs(win.imgdir, names, (TSIZE, TSIZE), _tagswin=win.tagwin)
+
+    byname = {btn.imgfile: btn for btn in win.allbtns}
+    changed = set()
+    for imgfile in removed:
+        btn = byname.pop(imgfile, None)
+        if btn:
+            win.residency.unregister(imgfile)
+            btn.destroy()
+            changed.add(imgfile)
+    for (imgfile, imgobj) in made:
+        btn = byname.get(imgfile)
+        if btn is None:
+            byname[imgfile] = makeThumbButton(canvas, imgfile, imgobj, 
+                                   win.residency, win.tagwin, win.dirwinsize)
+            changed.add(imgfile)
+        elif win.residency.replace(imgfile, imgobj):
+            changed.add(imgfile)
+    if not changed:
+        return                                    # e.g., only touched
+
+    win.allbtns = sorted(byname.values(), key=lambda btn: btn.imgfile.lower())
+    if win.currfilter:
+        # new and changed files are run through the current filter (their
+        # tag states are fresh: see updateThumbs); others keep their place
+        kept = {btn.imgfile for btn in win.currbtns} - changed
+        passed = {btn.imgfile for btn in 
+                      win.currfilter([byname[imgfile] for imgfile in changed if imgfile in byname])}
+        win.currbtns = [btn for btn in win.allbtns if btn.imgfile in kept or btn.imgfile in passed]
+    else:
+        win.currbtns = win.allbtns
+    setNavOrder(win)
+
+    # a removed file may have been selected; else keep the selection
+    selected = selectionList.get_items()
+    lostselection = any((item if isinstance(item, str) else item.imgfile) in removed
+                        for item in selected)
+    updateCanvas(canvas, win.currbtns, win.tagwin, lostselection)
+    win.tagwin.refreshImages(changed)
+
 def onViewAll(win, canvas):
+    win.currfilter = None
     win.currbtns = win.allbtns
+    setNavOrder(win)
     updateCanvas(canvas, win.allbtns, win.tagwin)
 
 def onTaggedOnly(win):
-    win.currbtns = simpleFilter(win.tagwin, win.allbtns, True)
+    win.currfilter = lambda btns: simpleFilter(win.tagwin, btns, True)
+    win.currbtns = win.currfilter(win.allbtns)
+    setNavOrder(win)
     updateCanvas(canvas, win.currbtns, win.tagwin)
 
 def onUnTaggedOnly(win):
-    win.currbtns = simpleFilter(win.tagwin, win.allbtns, False)
+    win.currfilter = lambda btns: simpleFilter(win.tagwin, btns, False)
+    win.currbtns = win.currfilter(win.allbtns)
+    setNavOrder(win)
     updateCanvas(canvas, win.currbtns, win.tagwin)
 
 def searchExec(win, taglist): # TODO Need 'win' as a callback arg
@@ -295,7 +461,9 @@ def searchExec(win, taglist): # TODO Need 'win' as a callback arg
       win.filterview = None
       return
       
-    win.currbtns = complexFilter(win.tagwin, win.allbtns, taglist)
+    win.currfilter = lambda btns: complexFilter(win.tagwin, btns, taglist)
+    win.currbtns = win.currfilter(win.allbtns)
+    setNavOrder(win)
     updateCanvas(canvas, win.currbtns, win.tagwin)
 
 def onFilter(parentwin):
@@ -327,6 +495,8 @@ def build_menu(win, dirwinsize, viewsize, nothumbchanges, canvas):
     
     file_menu = tk.Menu(menu_bar, tearoff=0)
     file_menu.add_command(label="Open...", command=lambda: onDirectoryOpen(win, dirwinsize, viewsize, nothumbchanges))
+    file_menu.add_command(label="Open Tree...", command=lambda: onDirectoryOpen(win, dirwinsize, viewsize, nothumbchanges, True))
+    file_menu.add_command(label="Library Search...", command=lambda: onLibrarySearch(win, dirwinsize, viewsize, nothumbchanges))
     file_menu.add_command(label="Exit", command=lambda: onQuit(win))
     menu_bar.add_cascade(label="File", menu=file_menu)
     
@@ -346,6 +516,11 @@ def build_menu(win, dirwinsize, viewsize, nothumbchanges, canvas):
     nav_menu.add_command(label="Next") # TODO implementation
     nav_menu.add_command(label="Select All", command=lambda: selectAll(win))
     menu_bar.add_cascade(label="Nav", menu=nav_menu)
+
+    help_menu = tk.Menu(menu_bar, tearoff=0)
+    help_menu.add_command(label="Help...", command=lambda: onHelp(win))
+    help_menu.add_command(label="Performance Stats...", command=onPerfStats)
+    menu_bar.add_cascade(label="Help", menu=help_menu)
     
     win.config(menu=menu_bar)
 
@@ -359,10 +534,13 @@ def viewThumbs(imgdir,                         # open this folder
                dirwinsize=(),                  # size of this thumbs window
                viewsize=(),                    # size of each image-view window
                numcols=None,                   # fixed, else per #thumbnails 
-               nothumbchanges=False):          # don't detect image changes?
+               nothumbchanges=False,           # don't detect image changes?
+               recursive=False):               # KBR subfolders too? (TreeThumbs)
     """
     --------------------------------------------------------------
     Make main (Tk) or pop-up (Toplevel) thumbnail-buttons window.
+    KBR: with recursive, a tree window: imgdir and all its subfolders
+    in one grid, whose thumbs load per folder as needed (TreeThumbs).
     Uses fixed-size buttons, and a bi-scrollable canvas.
 
     Sets scrollable (full) size of canvas, and places thumbs 
@@ -383,8 +561,10 @@ def viewThumbs(imgdir,                         # open this folder
         
     win = kind()
     win.imgdir = imgdir
+    win.navindex = NavIndex(imgdir)         # KBR ViewOne's N/P order
     helptxt = 'D=open'
-    win.title('%s: %s (%s)' % (appname, imgdir, helptxt))
+    win.basetitle = '%s: %s%s (%s)' % (appname, imgdir, ' [tree]' if recursive else '', helptxt)
+    win.title(win.basetitle)
     trySetWindowIcon(win, 'icons', 'tag')   # [SA] for win+lin
 
     # [SA] add new Help button
@@ -406,32 +586,60 @@ def viewThumbs(imgdir,                         # open this folder
     win.bind('<KeyPress-question>', lambda event: onHelp(win))
 
     tagwin=TagView(imgdir)
-    tagwin.initScan()
+    if recursive:
+        tagwin.initScan()     # KBR tree: scanned once listed (TreeThumbs)
+    else:
+        # KBR read all tags in the background, while thumbs load (metascan.py)
+        tagwin.initScan(list(filter(isTaggableImage, sortedDisplayOrder(imgdir))), scanjobs)
 
     # make or load thumbs ==> [(imgfile, imgobj)]
-    thumbs = makeThumbs(imgdir,                             # all images in folder
+    if recursive:
+        thumbs = None                                       # per folder, later
+    else:
+        with span('thumbs.load'):
+            thumbs = makeThumbs(imgdir,                     # all images in folder
                         size=(TSIZE, TSIZE),                # fixed thumbnails size
                         busywindow=win,                     # announce in GUI
                         nothumbchanges=nothumbchanges,      # don't detect changes? 
                         _tagswin=tagwin)
                         
-    tagwin.doneScan()
+    tagwin.doneScan()     # KBR scanned tags are added as read (pollTags)
     selectionList.add_observer(tagwin)
     
     width, height = dirwinsize                      # [SA] new configs model
     canvas = ThumbCanvas(win)                    # init viewable window size
     canvas.config(height=height, width=width)       # changes if user resizes
 
-    # NOTE: keeping reference to avoid gc
+    # NOTE: keeping reference to avoid gc; Tk images live in the residency
     win.currbtns = None
-    win.savephotos, win.allbtns = buildCanvas(canvas, dirwinsize, numcols, thumbs, tagwin)
-    win.fullthumbs = thumbs
+    win.currfilter = None                # KBR filter that made currbtns, if any
+    win.loader = None
+    if recursive:
+        win.residency, win.allbtns = buildTreeCanvas(canvas, imgdir, tagwin, dirwinsize,
+                                                     nothumbchanges)
+        win.loader = canvas.loader
+        win.navindex = ListIndex(win.loader.imgfiles)
+    else:
+        with span('grid.build'):
+            win.residency, win.allbtns = buildCanvas(canvas, dirwinsize, numcols, thumbs, tagwin)
     win.currbtns = win.allbtns
+    del thumbs   # PIL copies are owned by the residency manager now
+    win.thumbcanvas = canvas
+    win.dirwinsize  = dirwinsize
+
+    # KBR keep grid, tags, and cache current with changes by other programs
+    win.watcher = None
+    if watchfolders and not recursive:
+        win.watcher = FolderWatcher(win, imgdir, lambda names: onFolderChanges(win, names),
+                                    ignore=['_PyPhoto-thumbs.pkl'])
     
     
     win.tagwin     = tagwin
     win.imgdir     = imgdir
     win.filterview = None
+    win.scantimer  = None
+    if tagwin.scan:
+        pollTags(win)
     
     # bind keys/events for this directory-view window
     win.bind('<KeyPress-d>', 
@@ -447,7 +655,9 @@ def viewThumbs(imgdir,                         # open this folder
     win.bind('<Left>',  lambda event: canvas.xview_scroll(-1, 'units'))
     win.bind('<Right>', lambda event: canvas.xview_scroll(+1, 'units'))
     
-    win.bind('<Destroy>', lambda event: cleanup(win))
+    # KBR a toplevel's binding also fires for each destroyed child (e.g., a
+    # removed file's button): clean up only when the window itself goes
+    win.bind('<Destroy>', lambda event: cleanup(win) if event.widget is win else None)
     
     win.bind('<Control-a>', lambda event: selectAll(win))
     canvas.bind('<Configure>', lambda event: resize(canvas,event))
@@ -464,28 +674,64 @@ def viewThumbs(imgdir,                         # open this folder
 # Utilities, having multiple class and non-class clients
 ############################################################################
 def cleanup(win):
+    if getattr(win, 'scantimer', None):
+        win.after_cancel(win.scantimer)
+    if getattr(win, 'watcher', None):
+        win.watcher.stop()
+    if getattr(win, 'loader', None):
+        win.loader.stop()
+    if getattr(win, 'residency', None):
+        win.residency.release()
     if win.tagwin:
         win.tagwin.destroy()
     if win.filterview:
         win.filterview.destroy()
 
-def onDirectoryOpen(parentwin, dirwinsize, viewsize, nothumbchanges):
+def onDirectoryOpen(parentwin, dirwinsize, viewsize, nothumbchanges, recursive=False):
     """
     open a new image directory in a new main window;
-    available via "D" in both thumb and img windows
+    available via "D" in both thumb and img windows;
+    KBR recursive: with all its subfolders, in one tree window
     """
     dirname = askdirectory(parent=parentwin,mustexist=True)
     #dirname = openDialog.show()
     if dirname:
         viewThumbs(dirname, Toplevel, dirwinsize, viewsize, 
-                   nothumbchanges=nothumbchanges)
+                   nothumbchanges=nothumbchanges, recursive=recursive)
     else:
         parentwin.focus_force()   # [SA] for Mac
 
+def onLibrarySearch(parentwin, dirwinsize, viewsize, nothumbchanges):
+    """
+    KBR search tags across all folders of the library tree (config
+    "LibraryRoot", else ask); results open their folders' windows
+    """
+    from LibraryView import LibraryView          # sqlite: load on first use
+    root = libraryroot or askdirectory(parent=parentwin, mustexist=True,
+                                       title='Choose library root folder')
+    if not root:
+        parentwin.focus_force()   # [SA] for Mac
+        return
+    def onopen(folder, imgfile):
+        win = viewThumbs(folder, Toplevel, dirwinsize, viewsize, 
+                         nothumbchanges=nothumbchanges)
+        for btn in win.allbtns:
+            if btn.imgfile == imgfile:
+                selectionList.set(btn)           # the result, selected
+                break
+    LibraryView(root, onopen)
+
 def onQuit(parentwin):
     cleanup(parentwin)
     parentwin.destroy()
 
+def onPerfStats():
+    """
+    KBR show the hot paths' timing spans (perfstats.py; config PerfStats)
+    """
+    from StatsView import StatsView
+    StatsView()
+
 def onHelp(parentwin):
     """
     [SA] new help dialog - simple but sufficient;
@@ -531,8 +777,23 @@ HelpText = ('PyPhoto 2.2\n'
             '\n'
             'A "_PyPhoto-thumbs.pkl" file is created in each opened image '
             'folder when possible, to store image thumbnails for fast access.  '
+            'For read-only folders (e.g., optical discs), it is stored in '
+            'a local cache folder instead (config "CacheRoot").  '
             'Its thumbs are kept in sync with images.\n'
             '\n'
+            'File/Open Tree opens a folder and all its subfolders in one '
+            'window, with one tags list; thumbs load per folder as they '
+            'scroll into view.\n'
+            '\n'
+            'File/Library Search finds tags in all folders of a tree, '
+            'from a "_PyPhoto-library.sqlite" tag database in its root '
+            'folder (config "LibraryRoot").  Refresh it after tagging '
+            'outside PyPhoto.\n'
+            '\n'
+            'Help/Performance Stats shows where time goes in folder opens, '
+            'image views, and tag writes, if enabled by config "PerfStats" '
+            '(config "PerfStatsFile" also saves them on exit).\n'
+            '\n'
             'PyPhoto source-code distributions (but not apps or '
             'executables) require installation of the Pillow extension '
             'package from https://pypi.python.org/pypi/Pillow.\n'
@@ -558,7 +819,19 @@ if __name__ == '__main__':
     defaults = dict(InitialSize='1500x900',          # size of dir/thumbs window
                     InitialFolder='images-mixed',   # None = ask for dir
                     ViewSize=None,                  # None = scale to screen
-                    NoThumbChanges=False)           # True = skip change detection [2.1]
+                    NoThumbChanges=False,           # True = skip change detection [2.1]
+                    ThumbMemoryMB=64,               # Tk thumb images budget, all windows
+                    WatchFolders=True,              # track changes in open folders
+                    CacheRoot=None,                 # None = platform's user cache folder
+                    CacheAlways=False,              # True = cache there even if writable
+                    CacheEncoding='native',         # thumbs as 'native', 'webp', or 'jpeg'
+                    CacheFraming=None,              # None, 'zlib', or 'lzma' cache files
+                    LibraryRoot=None,               # tag database tree, None = ask
+                    ScanJobs=None,                  # tag-read workers, None = per CPUs, 0 = none
+                    PerfStats=False,                # True = time hot paths (Help menu)
+                    PerfStatsFile=None,             # write timings here on exit, if any
+                    StallMs=0,                      # log main-loop stalls over this, 0 = off
+                    StallLog=None)                  # stalls log file, None = stderr
     configs = getConfigs('PyPhoto', defaults)       # load from file or args
 
     imgdir     = configs.InitialFolder
@@ -568,6 +841,16 @@ if __name__ == '__main__':
     viewsize   = viewsize.split('x') if viewsize else ()   # e.g., '800x600'
     viewsize   = list(map(int, viewsize))                  # (800, 600)
     nothumbchanges = configs.NoThumbChanges
+    ThumbResidency.setBudget(float(configs.ThumbMemoryMB))
+    watchfolders = configs.WatchFolders in (True, 'True', '1')   # file or cmdline
+    libraryroot = configs.LibraryRoot
+    scanjobs = None if configs.ScanJobs in (None, 'None') else int(configs.ScanJobs)
+    perfstats.setEnabled(configs.PerfStats in (True, 'True', '1'),            # see perfstats.py
+                         None if configs.PerfStatsFile in (None, 'None') else configs.PerfStatsFile)
+    setCacheRoot(configs.CacheRoot,                                # unwritable folders
+                 configs.CacheAlways in (True, 'True', '1'))
+    setCacheEncoding(configs.CacheEncoding,                        # see cachebench.py
+                     None if configs.CacheFraming in (None, 'None') else configs.CacheFraming)
     
     if imgdir and os.path.exists(imgdir):
         mainwin = viewThumbs(imgdir, Tk, dirwinsize, viewsize, 
@@ -581,6 +864,11 @@ if __name__ == '__main__':
                command=handler).pack(expand=YES, fill=BOTH)
         trySetWindowIcon(mainwin, 'icons', 'tag')   # [SA] for win+lin
 
+    # KBR log GUI freezes, with what froze it (see StallWatch.py)
+    if int(configs.StallMs):
+        stallwatch = StallWatch(mainwin, int(configs.StallMs),
+                                None if configs.StallLog in (None, 'None') else configs.StallLog)
+
     if RunningOnMac:
         # Mac requires menus, deiconifies, focus
 
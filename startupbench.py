@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+===============================================================================
+Startup benchmark: time PyPhoto's launch to a usable thumbs grid.
+
+Each run starts a fresh Python process, so module imports are really timed
+(though OS file caches stay warm after the first run).  Each run reports:
+
+    import   secs to import pyphoto and everything it imports
+    paint    secs from there until the folder window is up with the thumbs
+             in view drawn (the same viewThumbs() the app calls)
+    total    wall secs for the whole process, including interpreter startup
+
+The first run also builds the folder's thumbs cache if it has none, so it is
+reported but left out of the medians.
+
+Usage:  python3 startupbench.py imgdir [runs]
+===============================================================================
+"""
+
+import sys, os, time, json, subprocess, statistics
+
+
+def child(imgdir):
+    # one launch, timed from just before the app's imports
+    start = time.perf_counter()
+    from tkinter import Tk
+    import pyphoto
+    from ObservableList import ObservableList
+    imported = time.perf_counter()
+
+    pyphoto.selectionList = ObservableList()          # as in pyphoto's main
+    win = pyphoto.viewThumbs(imgdir, Tk, (1500, 900), ())
+    win.update()                                      # map, layout, show thumbs
+    win.update()
+    painted = time.perf_counter()
+    win.destroy()
+    print(json.dumps(dict(imports=imported - start, paint=painted - imported)))
+
+
+def main(imgdir, runs):
+    results = []
+    for run in range(runs + 1):
+        start = time.perf_counter()
+        output = subprocess.run([sys.executable, __file__, '--child', imgdir],
+                                capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)))
+        total = time.perf_counter() - start
+        if output.returncode != 0:
+            print(output.stderr)
+            sys.exit('Run failed')
+        times = json.loads(output.stdout.strip().splitlines()[-1])
+        times['total'] = total
+        print('%s %2d: import %.3f  paint %.3f  total %.3f' %
+              ('warmup' if run == 0 else 'run   ', run,
+               times['imports'], times['paint'], times['total']))
+        if run > 0:
+            results.append(times)
+
+    print('median:    import %.3f  paint %.3f  total %.3f' %
+          tuple(statistics.median(times[key] for times in results)
+                    for key in ('imports', 'paint', 'total')))
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 2 and sys.argv[1] == '--child':
+        child(os.path.abspath(sys.argv[2]))
+    elif len(sys.argv) > 1:
+        main(os.path.abspath(sys.argv[1]), int(sys.argv[2]) if len(sys.argv) > 2 else 5)
+    else:
+        print('Usage: python3 startupbench.py imgdir [runs]')
@@ -0,0 +1,168 @@
+"""
+===============================================================================
+Parallel image-tree scanner: the tags of every image in a folder tree.
+
+The utils scripts formerly walked trees with os.walk(), called mimetypes on
+every file, and read each image's tags with pyexiv2 serially: hours for a
+300k-image archive.  Here, the tree is walked with os.scandir() (whose
+entries carry file types, and on Windows sizes and modtimes, without extra
+stats), images are recognized by a set of extensions computed once from
+mimetypes' tables, and tags are read by a pool of worker processes.  Results
+are yielded as workers finish them, in no particular order, so consumers can
+stream them: see writeResults for JSON-lines and CSV output.
+
+Each result is a dict:
+    path     image file path (under the scanned root)
+    size     bytes
+    mtime    modification time (secs)
+    status   'tagged', 'untagged', 'error' (tags unreadable), or
+             'unsupported' (an image type that can't be tagged: not read)
+    tags     list of 'Xmp.dc.subject' tags, as stored (empty if none)
+
+Used by utils/walktest.py, utils/findbytag.py, and TagLibrary.py.
+===============================================================================
+"""
+
+import os, sys, csv, json, mimetypes, multiprocessing
+
+unsupported_formats = (".gif",".svg",".avif") # KBR currently un-tag-able image formats
+FIELDS = ('path', 'size', 'mtime', 'status', 'tags')
+
+pyexiv2 = None
+
+
+def imageExtensions():
+    """
+    [SA] images are detected by mimetype, not a hardcoded set: here, by
+    all extensions mimetypes maps to an 'image/*' type, computed once
+    """
+    mimetypes.init()
+    mimetypes.add_type("image/webp", ".webp") # python 3.10 doesn't support yet
+    mimetypes.add_type("image/avif", ".avif")
+    return frozenset(ext for (ext, mimetype) in mimetypes.types_map.items()
+                             if mimetype.split('/')[0] == 'image')
+
+IMAGE_EXTS = imageExtensions()
+
+
+def isImageFileName(filename):
+    return os.path.splitext(filename)[1].lower() in IMAGE_EXTS
+
+
+def walkImages(root, counts=None):
+    """
+    yield (path, size, mtime) for all image files in the tree at root,
+    by scandir(); folders are visited in sorted order, unreadable ones
+    are skipped; non-image files are counted in counts['ignored'], if given
+    """
+    stack = [root]
+    while stack:
+        folder = stack.pop()
+        try:
+            with os.scandir(folder) as entries:
+                entries = sorted(entries, key=lambda entry: entry.name)
+        except OSError as e:
+            print(f"Cannot scan '{folder}': {e}", file=sys.stderr)
+            continue
+        subdirs = []
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.append(entry.path)
+                elif isImageFileName(entry.name) and entry.is_file():
+                    stat = entry.stat()
+                    yield entry.path, stat.st_size, stat.st_mtime
+                elif counts is not None:
+                    counts['ignored'] = counts.get('ignored', 0) + 1
+            except OSError:
+                pass                                  # removed while scanning
+        stack.extend(reversed(subdirs))               # depth-first, in order
+
+
+def readTags(imagePath):
+    """
+    (isok, tags) for one image, as the utils scripts' getTags
+    """
+    global pyexiv2
+    if pyexiv2 is None:
+        import pyexiv2 as exiv2                       # only in readers
+        exiv2.set_log_level(3)                        # pyexiv2 magic
+        pyexiv2 = exiv2
+    try:
+        with pyexiv2.Image(imagePath) as img:
+            res = img.read_raw_xmp()
+            if len(res) == 0:
+                return True, []
+            try:
+                return True, img.read_xmp()['Xmp.dc.subject']
+            except:
+                return True, [] # no Xmp.dc.subject
+    except:
+        return False, [] # couldn't parse xmp
+
+
+def scanFile(found):
+    # one result, in a worker process
+    path, size, mtime = found
+    isok, tags = readTags(path)
+    status = 'error' if not isok else ('tagged' if tags else 'untagged')
+    return dict(path=path, size=size, mtime=mtime, status=status, tags=tags)
+
+
+def scanTree(root, jobs=None, chunksize=64, counts=None):
+    """
+    ---------------------------------------------------------------------------
+    Yield a result dict (see above) for every image in the tree at root, as
+    soon as each is ready.  Tags are read by jobs worker processes (default:
+    one per CPU) while the tree is still being walked.  Unsupported images
+    are yielded without being read.  Non-image files are counted in
+    counts['ignored'], if counts (a dict) is passed.
+    ---------------------------------------------------------------------------
+    """
+    return scanFound(walkImages(root, counts), jobs, chunksize)
+
+
+def scanFound(founds, jobs=None, chunksize=64):
+    """
+    scanTree for any iterable of (path, size, mtime), e.g., just the files
+    changed since a prior scan (see TagLibrary.refresh)
+    """
+    def readable():
+        for found in founds:
+            if found[0].lower().endswith(unsupported_formats):
+                unsupported.append(found)
+            else:
+                yield found
+
+    unsupported = []       # filled by the walk, on the pool's feeder thread
+    with multiprocessing.Pool(jobs) as pool:
+        for result in pool.imap_unordered(scanFile, readable(), chunksize):
+            yield result
+            while unsupported:
+                yield unsupportedResult(unsupported.pop())
+    while unsupported:
+        yield unsupportedResult(unsupported.pop())
+
+
+def unsupportedResult(found):
+    path, size, mtime = found
+    return dict(path=path, size=size, mtime=mtime, status='unsupported', tags=[])
+
+
+def writeResults(results, format='jsonl', outfile=None):
+    """
+    stream results to outfile (default stdout) as they arrive: 'jsonl' is
+    one JSON object per line; 'csv' has a header row, and tags joined by ';'
+    """
+    outfile = outfile or sys.stdout
+    if format == 'csv':
+        writer = csv.writer(outfile)
+        writer.writerow(FIELDS)
+        for result in results:
+            writer.writerow([result['path'], result['size'], result['mtime'],
+                             result['status'], ';'.join(result['tags'])])
+            outfile.flush()                           # for pipes: don't batch
+    else:
+        for result in results:
+            outfile.write(json.dumps(result) + '\n')
+            outfile.flush()
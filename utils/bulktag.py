@@ -0,0 +1,402 @@
+#!/usr/bin/env python3
+"""
+===============================================================================
+Bulk tag editing: add, remove, and rename 'Xmp.dc.subject' tags in many
+image files at once, with a pool of worker processes.
+
+Does the jobs of addTag.py, remTag.py, and renameTag.py in one command, but
+opens each file once (read, edit, and write in one pyexiv2 session), skips
+the write for files the edit doesn't change, and edits files in parallel.
+Edits are applied to each file in their command-line order; tags are
+compared ignoring case, and added and renamed tags are lowercase, as
+PyPhoto writes them.
+
+Files are given as image files and folders on the command line (folders'
+subfolders too with -r), or as a list of paths on stdin with --stdin
+(e.g., from findbytag.py).
+
+Runs are journaled (--journal, a JSON-lines file): the edits and every
+planned file are recorded before any file is written, then each file as it
+is completed, with its tags before and after.  If a run dies (power cut, bad
+file, Ctrl+C), --resume finishes it: only planned files not yet completed
+are edited, with no rescan of the tree.  --undo restores the tags of all
+files the journal's run changed (skipping any whose tags have changed since,
+unless --force), and is itself journaled and resumable.  Each worker also
+records a file's tags before it writes them, durably, in an intent file
+beside the journal, so files written just before a crash are restored too.
+
+Usage:  python3 bulktag.py [--add TAG] [--remove TAG] [--rename OLD NEW]
+                           [-r] [--stdin] [--jobs N] [--dry-run]
+                           [--journal FILE] [paths...]
+        python3 bulktag.py --resume [--journal FILE]
+        python3 bulktag.py --undo [--force] [--journal FILE]
+===============================================================================
+"""
+
+import os
+import sys
+import time
+import json
+import glob
+import argparse
+import mimetypes
+import multiprocessing
+import pyexiv2
+
+unsupported_formats = (".gif",".svg",".avif") # KBR currently un-tag-able image formats
+
+intentfile = None   # a worker's intent file (see Journal), if journaling
+
+def isImageFileName(filename):
+    """
+    ---------------------------------------------------------------------------
+    [SA] Detect images by filename's mimetype (not hardcoded set)
+    ---------------------------------------------------------------------------
+    """
+    mimetype = mimetypes.guess_type(filename)[0]                    # (type?, encoding?)
+    return mimetype != None and mimetype.split('/')[0] == 'image'   # e.g., 'image/jpeg'
+
+def isTaggable(filename):
+    return isImageFileName(filename) and not filename.lower().endswith(unsupported_formats)
+
+def applyEdits(taglist, edits):
+    """
+    the tags after edits, a list of ('add', tag), ('remove', tag), and
+    ('rename', oldtag, newtag), all lowercase; untouched tags keep their
+    case and order, and no tag appears twice
+    """
+    result = [i for i in taglist if i] # remove empty strings
+    for edit in edits:
+        lowered = [i.lower() for i in result]
+        if edit[0] == 'add':
+            if edit[1] not in lowered:
+                result.append(edit[1])
+        elif edit[0] == 'remove':
+            result = [i for i in result if i.lower() != edit[1]]
+        elif edit[0] == 'rename' and edit[1] in lowered:
+            # the new name may already be there: keep just one
+            result = [edit[2] if i.lower() == edit[1] else i for i in result
+                          if i.lower() != edit[2]]
+    return result
+
+def editFile(task):
+    """
+    one file's read-modify-write, in a worker process; returns
+    (path, status, tags before, tags after), status one of
+    'changed', 'unchanged', or 'error'
+    """
+    imagePath, edits, dryrun = task
+    try:
+        with pyexiv2.Image(imagePath) as img:
+            try:
+                taglist = img.read_xmp()['Xmp.dc.subject']
+            except:
+                taglist = [] # no Xmp or no Xmp.dc.subject
+            newlist = applyEdits(taglist, edits)
+            if newlist == taglist:
+                return imagePath, 'unchanged', taglist, newlist
+            if not dryrun:
+                if intentfile:
+                    writeIntent(imagePath, taglist, newlist)
+                # pyexiv2 magic: an empty list won't replace the key
+                img.modify_xmp({'Xmp.dc.subject': newlist if newlist else ""})
+            return imagePath, 'changed', taglist, newlist
+    except Exception as e:
+        return imagePath, 'error', str(e), None
+
+def restoreFile(task):
+    """
+    undo one file's edit, in a worker process: back to tags before, if its
+    tags are still those the edit made (or force); returns (path, status),
+    status one of 'restored', 'conflict', 'unchanged', or 'error'
+    """
+    imagePath, before, after, force = task
+    try:
+        with pyexiv2.Image(imagePath) as img:
+            try:
+                taglist = img.read_xmp()['Xmp.dc.subject']
+            except:
+                taglist = []
+            if taglist == before:
+                return imagePath, 'unchanged'
+            if taglist != after and not force:
+                return imagePath, 'conflict' # edited since: leave it
+            img.modify_xmp({'Xmp.dc.subject': before if before else ""})
+            return imagePath, 'restored'
+    except Exception as e:
+        return imagePath, 'error'
+
+def initWorker(intentprefix=None):
+    global intentfile
+    pyexiv2.set_log_level(3) # pyexiv2 magic
+    if intentprefix:
+        intentfile = open(f"{intentprefix}{os.getpid()}", 'a', encoding='utf8')
+
+def writeIntent(imagePath, before, after):
+    # before a file is written, in a worker: synced, so a resume knows its tags before
+    intentfile.write(json.dumps(dict(intent=imagePath, before=before, after=after)) + '\n')
+    intentfile.flush()
+    os.fsync(intentfile.fileno())
+
+def findFiles(paths, recursive):
+    # taggable image files in paths: files, and folders' files
+    for path in paths:
+        if os.path.isdir(path):
+            if recursive:
+                for root, dirs, files in os.walk(path):
+                    dirs.sort()
+                    for filename in sorted(files):
+                        if isTaggable(filename):
+                            yield os.path.join(root, filename)
+            else:
+                for filename in sorted(os.listdir(path)):
+                    fullfile = os.path.join(path, filename)
+                    if isTaggable(filename) and os.path.isfile(fullfile):
+                        yield fullfile
+        elif os.path.isfile(path):
+            if isTaggable(path):
+                yield path
+        else:
+            print(f"'{path}' does not exist")
+
+class Journal:
+    """
+    ---------------------------------------------------------------------------
+    A bulk run's JSON-lines journal.  Records, one per line:
+        {"bulktag": 1, "edits": [...]}        the run's edits, first
+        {"plan": path}                        each file to edit
+        {"planned": count}                    all files are planned
+        {"done": path, "before": [...], "after": [...], "status": ...}
+        {"failed": path, "error": message}    retried on resume
+        {"undone": path, "status": ...}       by --undo
+    Every record is flushed as written, and fsynced every SYNCEVERY records,
+    so a crash may lose the last completions: files then written but not
+    "done" would be found unchanged on resume.  So workers also write
+        {"intent": path, "before": [...], "after": [...]}
+    to their own intent files (path + INTENTS + pid), synced before each
+    file is written; a resume that finds a file's tags already at its
+    intent's "after" records it as changed from the intent's "before".
+    Intent files are deleted when a run completes.  A torn last line is
+    ignored.
+    ---------------------------------------------------------------------------
+    """
+    INTENTS = '.intent-'
+    SYNCEVERY = 256
+
+    def __init__(self, path):
+        self.path = path
+        self.edits = None
+        self.plan = []
+        self.planned = False
+        self.done = {}            # path => (before, after, status)
+        self.intents = {}         # path => (before, after), from intent files
+        self.undone = set()
+        self.file = None
+        self.unsynced = 0
+
+    def load(self):
+        with open(self.path, encoding='utf8') as file:
+            for line in file:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue # torn write at a crash
+                if 'bulktag' in record:
+                    self.edits = [tuple(edit) for edit in record['edits']]
+                elif 'plan' in record:
+                    self.plan.append(record['plan'])
+                elif 'planned' in record:
+                    self.planned = True
+                elif 'done' in record:
+                    self.done[record['done']] = (record['before'], record['after'], record['status'])
+                elif 'undone' in record:
+                    if record['status'] in ('restored', 'unchanged'):
+                        self.undone.add(record['undone'])
+        if self.edits is None:
+            raise ValueError(f"'{self.path}' is not a bulktag journal")
+        for intentpath in self.intentFiles():
+            with open(intentpath, encoding='utf8') as file:
+                for line in file:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+                    self.intents[record['intent']] = (record['before'], record['after'])
+        return self
+
+    def intentFiles(self):
+        return glob.glob(glob.escape(self.path + self.INTENTS) + '*')
+
+    def removeIntents(self):
+        for intentpath in self.intentFiles():
+            os.remove(intentpath)
+
+    def open(self, mode):
+        self.file = open(self.path, mode, encoding='utf8')
+
+    def write(self, **record):
+        self.file.write(json.dumps(record) + '\n')
+        self.file.flush()
+        self.unsynced += 1
+        if self.unsynced >= self.SYNCEVERY:
+            self.sync()
+
+    def sync(self):
+        os.fsync(self.file.fileno())
+        self.unsynced = 0
+
+    def close(self):
+        if self.file:
+            self.sync()
+            self.file.close()
+            self.file = None
+
+class EditAction(argparse.Action):
+    # --add/--remove/--rename all append to one list, keeping their order
+    def __call__(self, parser, namespace, values, option_string=None):
+        values = values if isinstance(values, list) else [values]
+        edits = getattr(namespace, self.dest) or []
+        edits.append((option_string.lstrip('-'),) + tuple(v.lower().strip("'\"") for v in values))
+        setattr(namespace, self.dest, edits)
+
+def parseArgs():
+    parser = argparse.ArgumentParser(description='Add, remove, and rename image tags in bulk.')
+    parser.add_argument('paths', nargs='*', help='image files and folders')
+    parser.add_argument('--add', action=EditAction, dest='edits', metavar='TAG')
+    parser.add_argument('--remove', action=EditAction, dest='edits', metavar='TAG')
+    parser.add_argument('--rename', action=EditAction, dest='edits', nargs=2, metavar=('OLD', 'NEW'))
+    parser.add_argument('-r', '--recursive', action='store_true', help="include folders' subfolders")
+    parser.add_argument('--stdin', action='store_true', help='read more paths from stdin, one per line')
+    parser.add_argument('--jobs', type=int, default=os.cpu_count(), help='worker processes')
+    parser.add_argument('--dry-run', action='store_true', help='report changes, but write nothing')
+    parser.add_argument('-q', '--quiet', action='store_true', help="don't list changed files")
+    parser.add_argument('--journal', default='bulktag-journal.jsonl', help='journal file')
+    parser.add_argument('--resume', action='store_true', help="finish the journal's run")
+    parser.add_argument('--undo', action='store_true', help="restore the journal's changed files")
+    parser.add_argument('--force', action='store_true', help='--undo files edited since, too')
+    args = parser.parse_args()
+    if args.resume or args.undo:
+        if args.resume and args.undo:
+            parser.error('use one of --resume or --undo')
+        if args.edits or args.paths or args.stdin:
+            parser.error('--resume and --undo take their edits and files from the journal')
+        if not os.path.exists(args.journal):
+            parser.error(f"no journal '{args.journal}'")
+        return args
+    if not args.edits:
+        parser.error('nothing to do: use --add, --remove, or --rename')
+    if not args.paths and not args.stdin:
+        parser.error('no files: give paths, or --stdin')
+    if os.path.exists(args.journal) and not args.dry_run:
+        parser.error(f"journal '{args.journal}' exists: --resume or --undo it, "
+                     "delete it, or use another --journal")
+    return args
+
+def allPaths(args):
+    yield from args.paths
+    if args.stdin:
+        for line in sys.stdin:
+            if line.strip():
+                yield line.rstrip('\r\n')
+
+def planRun(args):
+    """
+    a new run's files; journaled before any is written, so a resume
+    needs no rescan
+    """
+    files = [os.path.abspath(f) for f in findFiles(allPaths(args), args.recursive)]
+    if not args.dry_run:
+        journal = Journal(args.journal)
+        journal.open('w')
+        journal.removeIntents()                   # any left by a prior run
+        journal.write(bulktag=1, edits=args.edits)
+        for imagePath in files:
+            journal.write(plan=imagePath)
+        journal.write(planned=len(files))
+        journal.sync()
+        return journal, files
+    return None, files
+
+def resumeRun(args):
+    # the journal's run: its files not yet done, appending to it
+    journal = Journal(args.journal).load()
+    if not journal.planned:
+        sys.exit(f"'{args.journal}' was not fully planned: nothing was edited, start over")
+    args.edits = journal.edits
+    files = [imagePath for imagePath in journal.plan if imagePath not in journal.done]
+    print(f"Resuming: {len(journal.done)} done, {len(files)} to go")
+    journal.open('a')
+    return journal, files
+
+def runEdits(args):
+    counts = dict(changed=0, unchanged=0, error=0)
+    start = time.perf_counter()
+
+    journal, files = resumeRun(args) if args.resume else planRun(args)
+    tasks = ((imagePath, args.edits, args.dry_run) for imagePath in files)
+    intentprefix = journal.path + journal.INTENTS if journal else None
+    try:
+        with multiprocessing.Pool(args.jobs, initializer=initWorker,
+                                  initargs=(intentprefix,)) as pool:
+            for imagePath, status, before, after in pool.imap_unordered(editFile, tasks, chunksize=32):
+                if status == 'unchanged' and journal and imagePath in journal.intents:
+                    if journal.intents[imagePath][1] == after:
+                        # written by the run that died, but not journaled "done"
+                        before, status = journal.intents[imagePath][0], 'changed'
+                counts[status] += 1
+                if status == 'error':
+                    print(f"{imagePath} : error : {before}")
+                elif status == 'changed' and not args.quiet:
+                    print(f"{imagePath} : {before} => {after}" if args.dry_run else imagePath)
+                if journal and status == 'error':
+                    journal.write(failed=imagePath, error=before)
+                elif journal:
+                    journal.write(done=imagePath, status=status, before=before, after=after)
+        if journal:
+            journal.close()          # all files have records: intents are moot
+            journal.removeIntents()
+    finally:
+        if journal:
+            journal.close()
+
+    elapsed = time.perf_counter() - start
+    total = sum(counts.values())
+    print(f"{'Would change' if args.dry_run else 'Changed'}:{counts['changed']}"
+          f" Unchanged:{counts['unchanged']} Errors:{counts['error']}"
+          f" Files:{total} in {elapsed:.1f}s ({total / elapsed if elapsed else 0:.0f} files/sec)")
+
+def runUndo(args):
+    counts = dict(restored=0, unchanged=0, conflict=0, error=0)
+    start = time.perf_counter()
+
+    journal = Journal(args.journal).load()
+    tasks = [(imagePath, before, after, args.force)
+                 for imagePath, (before, after, status) in journal.done.items()
+                     if status == 'changed' and imagePath not in journal.undone]
+    print(f"Undoing: {len(tasks)} files")
+    journal.open('a')
+    try:
+        with multiprocessing.Pool(args.jobs, initializer=initWorker) as pool:
+            for imagePath, status in pool.imap_unordered(restoreFile, tasks, chunksize=32):
+                counts[status] += 1
+                if status in ('conflict', 'error'):
+                    print(f"{imagePath} : {status}")
+                elif status == 'restored' and not args.quiet:
+                    print(imagePath)
+                journal.write(undone=imagePath, status=status)
+    finally:
+        journal.close()
+
+    elapsed = time.perf_counter() - start
+    print(f"Restored:{counts['restored']} Unchanged:{counts['unchanged']}"
+          f" Conflicts:{counts['conflict']} Errors:{counts['error']} in {elapsed:.1f}s")
+
+def main():
+    args = parseArgs()
+    if args.undo:
+        runUndo(args)
+    else:
+        runEdits(args)
+
+if __name__ == '__main__':
+    main()
@@ -1,39 +1,8 @@
 import os
 import sys
-import pyexiv2
-import mimetypes
 
-def isImageFileName(filename):
-    """
-    ---------------------------------------------------------------------------
-    [SA] Detect images by filename's mimetype (not hardcoded set)
-    ---------------------------------------------------------------------------
-    """
-    mimetype = mimetypes.guess_type(filename)[0]                    # (type?, encoding?)
-    return mimetype != None and mimetype.split('/')[0] == 'image'   # e.g., 'image/jpeg'
-
-def getTags(imagePath):
-    try:
-        with pyexiv2.Image(imagePath) as img:
-            res = img.read_raw_xmp()
-            if len(res) == 0:
-                return True, []
-            try:
-                return True, img.read_xmp()['Xmp.dc.subject']
-            except:
-                return True, [] # no Xmp.dc.subject
-    except:
-        return False, [] # couldn't parse xmp
-
-tags_dict = {}
-def accumulateTags(taglist):
-    for atag in taglist:
-        lc = atag.lower()
-        x = tags_dict.get(lc)
-        if x is None:
-            tags_dict[lc] = 1
-        else:
-            tags_dict[lc] += 1
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from treescan import scanTree, writeResults
 
 def lookForTag(taglist, findtag):
     for atag in taglist:
@@ -41,36 +10,56 @@ def lookForTag(taglist, findtag):
             return True
     return False
 
-def walkit(rootPath, findtag):
-    unsupported_formats = (".gif",".svg",".avif") # KBR currently un-tag-able image formats
-    
-    for root, dirs, files in os.walk(rootPath):
-        for filename in files:
-            
-            fullfile = os.path.join(root, filename)
-            if not isImageFileName(fullfile):
-                continue
-            
-            if fullfile.lower().endswith(unsupported_formats):
-                continue
-            
-            isok, tags = getTags(fullfile)
-            if not isok or len(tags) == 0:
-                continue
-            
-            if lookForTag(tags, findtag):
-                print(f"{fullfile}")
+def fromLibrary(rootPath, findtag, jobs=None, refresh=True):
+    # KBR answer from the tree's tag database (see TagLibrary.py)
+    from TagLibrary import TagLibrary
+    library = TagLibrary(rootPath)
+    if refresh:
+        library.refresh(jobs)            # re-reads only new and changed images
+    for path in library.find([findtag]):
+        print(path)
+    library.close()
+
+def walkit(rootPath, findtag, jobs=None, format=None):
+    # KBR tags are read in parallel by treescan; matches print as found
+    results = scanTree(rootPath, jobs)
+    matches = (result for result in results
+                   if result['tags'] and lookForTag(result['tags'], findtag))
+    if format:
+        writeResults(matches, format)
+        return
+    for result in matches:
+        print(f"{result['path']}", flush=True)
             
     
     
 
 def usage():
-    print("Usage: python3 findbytag.py <path to root folder> <tag>")
+    print("Usage: python3 findbytag.py <path to root folder> <tag> [--jsonl | --csv] [--jobs N]")
+    print("       python3 findbytag.py <path to root folder> <tag> --library [--norefresh] [--jobs N]")
     exit()
 
 def existErr(trypath):
     print(f"Folder path '{sys.argv[1]}' doesnt exist!")
     usage()
+
+def getOptions(args):
+    # --jsonl/--csv: matching images' full results; --jobs N: reader processes;
+    # --library: use the tag database, --norefresh: as is, without a tree walk
+    format, jobs, library, refresh = None, None, False, True
+    while args:
+        arg = args.pop(0)
+        if arg in ('--jsonl', '--csv'):
+            format = arg[2:]
+        elif arg == '--library':
+            library = True
+        elif arg == '--norefresh':
+            refresh = False
+        elif arg == '--jobs' and args:
+            jobs = int(args.pop(0))
+        else:
+            usage()
+    return format, jobs, library, refresh
     
 if __name__ == '__main__':
     if len(sys.argv) < 3:
@@ -78,5 +67,9 @@ if __name__ == '__main__':
     if not os.path.exists(sys.argv[1]):
         existErr(sys.argv[1])
         
-    pyexiv2.set_log_level(3) # pyexiv2 magic
-    walkit(sys.argv[1], sys.argv[2].lower().strip("'\""))
\ No newline at end of file
+    format, jobs, library, refresh = getOptions(sys.argv[3:])
+    findtag = sys.argv[2].lower().strip("'\"")
+    if library:
+        fromLibrary(sys.argv[1], findtag, jobs, refresh)
+    else:
+        walkit(sys.argv[1], findtag, jobs, format)
@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+"""
+===============================================================================
+Tree-wide maintenance of PyPhoto thumbs caches (_PyPhoto-thumbs.pkl files).
+
+Walks a folder tree and, for each folder with a thumbs cache (in the folder,
+or under the cache root for read-only folders: see viewer_thumbs.py's
+thumbCachePath), runs the selected operations:
+
+    --stats     report entries, bytes, and hit ratio (the share of the
+                folder's images whose cached thumb is current, as an open
+                of the folder would find it)
+    --verify    report missing, stale, wrong-size, undecodable, and orphaned
+                (image gone) thumbs; exit status is 1 if any were found
+    --prune     drop orphaned and undecodable thumbs
+    --build     make missing, stale, wrong-size, and undecodable thumbs,
+                creating caches for folders that have none
+    --compact   re-encode all thumbs and rewrite the cache per --encoding and
+                --framing (e.g., after changing PyPhoto's CacheEncoding)
+
+A cache left fully current by these is saved with a fresh folder fingerprint,
+so PyPhoto's next open of its folder takes the fast path.  Folders are
+processed in parallel, by --jobs processes.
+
+Usage:  python3 thumbcache.py <root folder> [operations] [options]
+===============================================================================
+"""
+
+import os
+import sys
+import io
+import argparse
+from itertools import repeat
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image
+from viewer_thumbs import (FINGERPRINT, thumbCachePath, loadThumbCache, saveThumbCache,
+                           folderFingerprint, makeThumbEntry, encodeThumb, initMarks,
+                           isTaggableImage, setCacheEncoding, setCacheRoot,
+                           loadCodecPlugins)
+from treescan import readTags
+from metascan import tagState
+
+TSIZE = 160     # pyphoto.py's thumbs size
+
+def markState(imgpath):
+    # watermark for a new thumb, as TagView.getTags: 0=untagged, 1=tagged, 2=error
+    return tagState(*readTags(imgpath))
+
+def findCache(imgdir, pklfile):
+    # the folder's cache path, if it has a cache (None if not)
+    thumbpath = thumbCachePath(imgdir, pklfile)
+    if os.path.exists(thumbpath):
+        return thumbpath
+    infolder = os.path.join(imgdir, pklfile)
+    if os.path.exists(infolder):
+        return infolder # e.g., on a read-only disc, not yet copied locally
+    return None
+
+def folderImages(imgdir):
+    # {imgfile: modtime} for the folder's taggable images
+    images = {}
+    for entry in os.scandir(imgdir):
+        if isTaggableImage(entry.name) and entry.is_file():
+            images[entry.name] = entry.stat().st_mtime
+    return images
+
+def decodeThumb(imgdat, imgfile):
+    try:
+        loadCodecPlugins(imgfile)               # e.g., 'native' AVIF thumbs
+        imgobj = Image.open(io.BytesIO(imgdat))
+        imgobj.load()
+        return imgobj
+    except:
+        return None
+
+def rightSize(imgdir, imgfile, thumbobj, size):
+    # a thumb's longer side is the size, unless its image is smaller than that
+    longest = max(thumbobj.size)
+    if longest > size:
+        return False
+    if longest >= size - 1:
+        return True
+    try:
+        with Image.open(os.path.join(imgdir, imgfile)) as imgobj: # reads header only
+            return longest >= min(max(imgobj.size), size) - 1
+    except:
+        return True # a placeholder: not a size issue
+
+def checkFolder(imgdir, args):
+    """
+    run the selected operations on one folder's cache; returns a dict of
+    counts, or None if the folder has no cache and none is to be built
+    """
+    setCacheRoot(args.cacheroot)
+    setCacheEncoding(args.encoding, args.framing)
+    thumbpath = findCache(imgdir, args.pkl)
+    if thumbpath is None and not args.build:
+        return None
+
+    dirtime = os.stat(imgdir).st_mtime_ns
+    images = folderImages(imgdir)
+    cachebytes = os.path.getsize(thumbpath) if thumbpath else 0
+    thumbcache = loadThumbCache(thumbpath) if thumbpath else {}
+    stored = thumbcache.pop(FINGERPRINT, None)
+
+    # classify every image and every cached thumb
+    decoding = args.verify or args.prune or args.build or args.compact
+    missing, stale, wrongsize, broken, current = [], [], [], [], []
+    orphans = [imgfile for imgfile in thumbcache if imgfile not in images]
+    decoded = {}
+    for imgfile, imgtime in images.items():
+        if imgfile not in thumbcache:
+            missing.append(imgfile)
+            continue
+        thumbtime, imgdat = thumbcache[imgfile]
+        if abs(imgtime - thumbtime) > 2: # modtimeMatch's FAT32 allowance
+            stale.append(imgfile)
+            continue
+        if decoding:
+            thumbobj = decoded[imgfile] = decodeThumb(imgdat, imgfile)
+            if thumbobj is None:
+                broken.append(imgfile)
+                continue
+            if not rightSize(imgdir, imgfile, thumbobj, args.size):
+                wrongsize.append(imgfile)
+                continue
+        current.append(imgfile)
+
+    result = dict(folder=imgdir, cache=thumbpath, entries=0,
+                  bytes=cachebytes, images=len(images), hits=0,
+                  missing=len(missing), stale=len(stale), wrongsize=len(wrongsize),
+                  broken=len(broken), orphans=len(orphans),
+                  pruned=0, built=0, compacted=0, saved=False)
+    changed = False
+
+    if args.prune:
+        for imgfile in orphans + broken:
+            del thumbcache[imgfile]
+        result['pruned'] = len(orphans) + len(broken)
+        changed |= bool(result['pruned'])
+        orphans, broken = [], []
+
+    if args.build:
+        initMarks()
+        for imgfile in sorted(missing + stale + wrongsize + broken, key=str.lower):
+            markstate = markState(os.path.join(imgdir, imgfile))
+            imgobj, entry = makeThumbEntry(imgdir, imgfile, (args.size, args.size), markstate)
+            decoded.pop(imgfile, None)
+            if entry:
+                thumbcache[imgfile] = entry
+                result['built'] += 1
+                current.append(imgfile)
+        changed |= bool(result['built'])
+        missing, stale, wrongsize, broken = [], [], [], []
+
+    if args.compact:
+        for imgfile, (thumbtime, imgdat) in list(thumbcache.items()):
+            thumbobj = decoded.get(imgfile) or decodeThumb(imgdat, imgfile)
+            if thumbobj is not None:
+                thumbcache[imgfile] = (thumbtime, encodeThumb(thumbobj, imgfile))
+                result['compacted'] += 1
+        changed = True
+
+    # fully current now? then a fresh fingerprint enables PyPhoto's fast open
+    if not (missing or stale or wrongsize or broken or orphans):
+        fingerprint = folderFingerprint(imgdir, dirtime)
+    else:
+        fingerprint = None
+    if changed or fingerprint != stored:
+        if fingerprint:
+            thumbcache[FINGERPRINT] = fingerprint
+        if args.build or args.prune or args.compact:
+            savepath = thumbCachePath(imgdir, args.pkl)
+            created = not os.path.exists(savepath)
+            saveThumbCache(savepath, thumbcache)
+            if fingerprint and created and os.stat(imgdir).st_mtime_ns != dirtime:
+                # a new cache file in the folder changed its modtime: refingerprint
+                dirtime = os.stat(imgdir).st_mtime_ns
+                thumbcache[FINGERPRINT] = (dirtime, fingerprint[1])
+                saveThumbCache(savepath, thumbcache)
+            result['cache'] = savepath
+            result['bytes'] = os.path.getsize(savepath) if os.path.exists(savepath) else 0
+            result['saved'] = True
+    result['entries'] = len(thumbcache) - (FINGERPRINT in thumbcache)
+    result['hits'] = len(current)
+    return result
+
+def walkFolders(rootPath, pklfile):
+    # folders worth a look: those with images, or a cache to check for orphans
+    for root, dirs, files in os.walk(rootPath):
+        dirs.sort()
+        if pklfile in files or any(isTaggableImage(f) for f in files):
+            yield root
+
+def report(result, args):
+    problems = (result['missing'] + result['stale'] + result['wrongsize'] +
+                result['broken'] + result['orphans'])
+    if args.stats:
+        ratio = result['hits'] / result['images'] if result['images'] else 1.0
+        print(f"{result['folder']}: entries:{result['entries']} bytes:{result['bytes']}"
+              f" hit ratio:{ratio:.1%}")
+    if args.verify and problems:
+        print(f"{result['folder']}: missing:{result['missing']} stale:{result['stale']}"
+              f" wrong-size:{result['wrongsize']} undecodable:{result['broken']}"
+              f" orphans:{result['orphans']}")
+    if result['saved']:
+        print(f"{result['folder']}: pruned:{result['pruned']} built:{result['built']}"
+              f" compacted:{result['compacted']} => {result['cache']}")
+    return problems
+
+def main():
+    parser = argparse.ArgumentParser(description='Maintain PyPhoto thumbs caches in a folder tree.')
+    parser.add_argument('root', help='root folder of the tree')
+    parser.add_argument('--stats', action='store_true', help='report entries, bytes, hit ratio')
+    parser.add_argument('--verify', action='store_true', help='report thumbs not matching their folder')
+    parser.add_argument('--prune', action='store_true', help='drop orphaned and undecodable thumbs')
+    parser.add_argument('--build', action='store_true', help='make missing and out-of-date thumbs')
+    parser.add_argument('--compact', action='store_true', help='re-encode and rewrite caches')
+    parser.add_argument('--size', type=int, default=TSIZE, help='thumbs size (default %d)' % TSIZE)
+    parser.add_argument('--encoding', choices=('native', 'webp', 'jpeg'), default='native',
+                        help='thumb format for new and compacted thumbs')
+    parser.add_argument('--framing', choices=('zlib', 'lzma'), default=None,
+                        help='cache file compression (default none)')
+    parser.add_argument('--cacheroot', default=None, help="PyPhoto's CacheRoot, if set")
+    parser.add_argument('--pkl', default='_PyPhoto-thumbs.pkl', help='cache file name')
+    parser.add_argument('--jobs', type=int, default=os.cpu_count(), help='worker processes')
+    args = parser.parse_args()
+
+    if not (args.stats or args.verify or args.prune or args.build or args.compact):
+        parser.error('select at least one of --stats --verify --prune --build --compact')
+    if not os.path.isdir(args.root):
+        print(f"Folder path '{args.root}' doesnt exist!")
+        sys.exit(2)
+
+    totals = dict(caches=0, entries=0, bytes=0, images=0, hits=0, problems=0)
+    folders = walkFolders(args.root, args.pkl)
+    with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+        for result in pool.map(checkFolder, folders, repeat(args), chunksize=4):
+            if result is None:
+                continue
+            totals['problems'] += report(result, args)
+            totals['caches'] += 1
+            for key in ('entries', 'bytes', 'images', 'hits'):
+                totals[key] += result[key]
+
+    ratio = totals['hits'] / totals['images'] if totals['images'] else 1.0
+    print(f"Caches:{totals['caches']} Entries:{totals['entries']} Bytes:{totals['bytes']}"
+          f" Hit ratio:{ratio:.1%} Problems found:{totals['problems']}")
+    if args.verify and totals['problems'] and not (args.build or args.prune):
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
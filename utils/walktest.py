@@ -1,29 +1,8 @@
 import os
 import sys
-import pyexiv2
-import mimetypes
 
-def isImageFileName(filename):
-    """
-    ---------------------------------------------------------------------------
-    [SA] Detect images by filename's mimetype (not hardcoded set)
-    ---------------------------------------------------------------------------
-    """
-    mimetype = mimetypes.guess_type(filename)[0]                    # (type?, encoding?)
-    return mimetype != None and mimetype.split('/')[0] == 'image'   # e.g., 'image/jpeg'
-
-def getTags(imagePath):
-    try:
-        with pyexiv2.Image(imagePath) as img:
-            res = img.read_raw_xmp()
-            if len(res) == 0:
-                return True, []
-            try:
-                return True, img.read_xmp()['Xmp.dc.subject']
-            except:
-                return True, [] # no Xmp.dc.subject
-    except:
-        return False, [] # couldn't parse xmp
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from treescan import scanTree, writeResults
 
 tags_dict = {}
 def accumulateTags(taglist):
@@ -35,36 +14,46 @@ def accumulateTags(taglist):
         else:
             tags_dict[lc] += 1
 
-def walkit(rootPath):
-    ignore = 0
+def fromLibrary(rootPath, jobs=None, refresh=True):
+    # KBR tag counts from the tree's tag database (see TagLibrary.py)
+    from TagLibrary import TagLibrary
+    library = TagLibrary(rootPath)
+    if refresh:
+        library.refresh(jobs)            # re-reads only new and changed images
+    status = library.statusCounts()
+    print(f"Images:{sum(status.values())} Unsupported:{status.get('unsupported', 0)}"
+          f" Errors:{status.get('error', 0)}")
+    counts = library.tagCounts()
+    keys = sorted(counts)
+    print(f"Tagged files: {status.get('tagged', 0) + status.get('untagged', 0)} Tag count:{len(keys)}")
+    for atag in keys:
+        print(f" {atag}: {counts[atag]}")
+    library.close()
+
+def walkit(rootPath, jobs=None, format=None):
+    # KBR tags are read in parallel by treescan; format streams raw results
+    counts = dict(ignored=0)
+    results = scanTree(rootPath, jobs, counts=counts)
+    if format:
+        writeResults(results, format)
+        return
+
     images = 0
     errors = 0
     unsupp = 0
     tagged = 0
-    
-    unsupported_formats = (".gif",".svg",".avif") # KBR currently un-tag-able image formats
-    for root, dirs, files in os.walk(rootPath):
-        for filename in files:
-            
-            fullfile = os.path.join(root, filename)
-            if not isImageFileName(fullfile):
-                ignore += 1
-                continue
+    for result in results:
+        images += 1
+        if result['status'] == 'unsupported':
+            unsupp += 1
+            continue
+        if result['status'] == 'error':
+            errors += 1
+            continue
+        tagged += 1
+        accumulateTags(result['tags'])
             
-            images += 1
-            
-            if fullfile.lower().endswith(unsupported_formats):
-                unsupp += 1
-                continue
-            
-            isok, tags = getTags(fullfile)
-            if not isok:
-                errors += 1
-                continue
-            tagged += 1
-            accumulateTags(tags)
-            
-    print(f"Ignored:{ignore} Images:{images} Unsupported:{unsupp} Errors:{errors}")
+    print(f"Ignored:{counts['ignored']} Images:{images} Unsupported:{unsupp} Errors:{errors}")
     #print(tags_dict)
     keys = list(tags_dict.keys())
     keys.sort()
@@ -75,12 +64,31 @@ def walkit(rootPath):
     
 
 def usage():
-    print("Usage: python3 walktest.py <path to root folder>")
+    print("Usage: python3 walktest.py <path to root folder> [--jsonl | --csv] [--jobs N]")
+    print("       python3 walktest.py <path to root folder> --library [--norefresh] [--jobs N]")
     exit()
 
 def existErr(trypath):
     print(f"Folder path '{sys.argv[1]}' doesnt exist!")
     usage()
+
+def getOptions(args):
+    # --jsonl/--csv: stream per-image results instead; --jobs N: reader processes;
+    # --library: use the tag database, --norefresh: as is, without a tree walk
+    format, jobs, library, refresh = None, None, False, True
+    while args:
+        arg = args.pop(0)
+        if arg in ('--jsonl', '--csv'):
+            format = arg[2:]
+        elif arg == '--library':
+            library = True
+        elif arg == '--norefresh':
+            refresh = False
+        elif arg == '--jobs' and args:
+            jobs = int(args.pop(0))
+        else:
+            usage()
+    return format, jobs, library, refresh
     
 if __name__ == '__main__':
     if len(sys.argv) < 2:
@@ -88,5 +96,8 @@ if __name__ == '__main__':
     if not os.path.exists(sys.argv[1]):
         existErr(sys.argv[1])
         
-    pyexiv2.set_log_level(3) # pyexiv2 magic
-    walkit(sys.argv[1])    
\ No newline at end of file
+    format, jobs, library, refresh = getOptions(sys.argv[2:])
+    if library:
+        fromLibrary(sys.argv[1], jobs, refresh)
+    else:
+        walkit(sys.argv[1], jobs, format)
@@ -148,6 +148,8 @@ VERSION 2.1, Nov-2017: rereleased with new PyGadgets packages.
 
     4) Works for unwriteable folders (e.g., BD-R discs): thumb saves are simply
        skipped, but the folder may open _very_ slowly due to thumb recreations
+       KBR: RESOLVED - such folders' caches are now saved under a local cache
+       root instead (see thumbCachePath), so they open at warm-cache speed
 
     5) Allows image-change detection to be turned off, to avoid full thumbnail 
        regens when file modtimes are skewed between filesystems or platforms.  
@@ -182,16 +184,38 @@ VERSION 2.0, Sep-2017 [SA]: standalone release of book's PyGadgets.
 ===============================================================================
 """
 
-import os, sys, math, mimetypes, shutil, errno, pickle, traceback, io
+import os, sys, re, math, mimetypes, shutil, errno, pickle, traceback, io, time
 import base64 # KBR watermark images
+import hashlib # KBR folder fingerprints
+import zlib    # KBR optional cache compression
+from perfstats import span   # KBR hot-path timing, if enabled
 from tkinter import *
-import pillow_avif                # KBR avif support
+#KBR pillow_avif is imported on first need: see loadCodecPlugins
 #KBR TODO doesn't work import pillow_svg.SvgImagePlugin  # KBR svg support
 from PIL import Image                   # <== required for thumbs
 from PIL.ImageTk import PhotoImage      # <== required for JPEG display
 from PIL.ExifTags import TAGS           # <== required for orientation tag [2.2]
 
 tagwin = None
+avifloaded = False
+FINGERPRINT = '\0fingerprint'    # KBR thumbs-cache key: no filename has a NUL
+cacheroot = None                 # KBR folder for external thumbs caches (None=default)
+cachealways = False              # KBR True=external caches even for writable folders
+volumeids = {}                   # KBR (mount point, its stat) => volume id
+cacheencoding = 'native'         # KBR thumb bytes format: 'native', 'webp', 'jpeg'
+cacheframing = None              # KBR cache file compression: None, 'zlib', 'lzma'
+THUMBQUALITY = 85                # KBR quality of webp/jpeg cache encodings
+SAVESECS = 5                     # KBR max secs between iterThumbs cache saves
+
+def loadCodecPlugins(imgname):
+    """
+    KBR: import codec plugins only for files that need them; importing
+    pillow_avif (and its native library) formerly slowed every startup
+    """
+    global avifloaded
+    if not avifloaded and imgname.lower().endswith(('.avif', '.avifs')):
+        import pillow_avif                # KBR avif support, registers with PIL
+        avifloaded = True
 
 ###############################################################################
 # Choose your weapon (use 2.1 file or 2.0 subdir mode)
@@ -292,6 +316,7 @@ def openImageSafely(imgpath):
     file, at https://learning-python.com/thumbspage/viewer_thumbs.py.
     --------------------------------------------------------------------------
     """
+    loadCodecPlugins(imgpath)                   # KBR lazy plugin imports
     fileobj = open(imgpath, mode='rb')          # was Image.open(imgpath)
     filedat = fileobj.read()
     fileobj.close()                             # force file to close now
@@ -326,6 +351,7 @@ def getImageFormat(imgname):    # imgobj no longer used
     except:
         from PIL.Image import EXTENSION                # else assume init() was run
 
+    loadCodecPlugins(imgname)                          # KBR its extensions too
     ext = os.path.splitext(imgname)[1].lower()         # lookup ext in Pillow table
     format = EXTENSION[ext]                            # fairly brittle, this...
     return format
@@ -371,9 +397,13 @@ def makeThumbs_pklfile(imgdir, size, pklfile, busywindow, nothumbchanges):
     may raise IOError, or other (non-image files skipped to avoid exceptions). 
     Checks image modtime against pickled thumb modtime to see if image changed 
     since thumb created, removes orphaned thumbs for files no longer in imgdir.
+    KBR: each returned thumb also carries its encoded cache bytes in attribute
+    "cachebytes", so GUIs can drop decoded copies and re-decode on demand.
 
     The pickled thumbs object is a single dictionary of tuples:
         {image-file-name: (image-file-modtime, thumb-file-save-bytes)}  
+    KBR: plus one folder fingerprint, under key FINGERPRINT, which lets
+    opens of unchanged folders skip all per-file checks.
 
     Pickling PIL objects directly fails (why?), so pickles raw file-save bytes.
     It _almost_ works to pickle thumb image parts in dicts that map to keyword
@@ -413,23 +443,15 @@ def makeThumbs_pklfile(imgdir, size, pklfile, busywindow, nothumbchanges):
     ---------------------------------------------------------------------------
     """
     global tagwin
-    global markImg # TODO HACK
-    global errMarkImg # TODO HACK
 
-    # KBR Initialize the watermark images.
-    if markImg is None:
-        markImg=Image.open(io.BytesIO(base64.b64decode(markbytes)))
-        errMarkImg =Image.open(io.BytesIO(base64.b64decode(errMarkBytes)))
-
-    MODTIME, FILEBYTES = 0, 1  # dicts are expensive
-    thumbpath = os.path.join(imgdir, pklfile)
-
-    mimetypes.add_type("image/webp", ".webp") # python 3.10 doesn't support yet
+    thumbpath = thumbCachePath(imgdir, pklfile)
 
     # announce in GUIs
     busylabel = None
     if (busywindow and 
-        (not os.path.exists(thumbpath) or os.path.getsize(thumbpath) == 0)):
+        (not os.path.exists(thumbpath) or os.path.getsize(thumbpath) == 0) and
+        (thumbpath == os.path.join(imgdir, pklfile) or 
+         not os.path.exists(os.path.join(imgdir, pklfile)))):
         message = 'Building thumbnail images cache...'
         busylabel = Label(busywindow, text=message)
         busylabel.config(height=10, width=len(message)+10, cursor='watch')
@@ -437,22 +459,82 @@ def makeThumbs_pklfile(imgdir, size, pklfile, busywindow, nothumbchanges):
         busywindow.lift()
         busywindow.update()
 
+    # KBR the work is done by iterThumbs; thumbs that could not be
+    # cached are omitted here, as before
+    thumbs = [(imgfile, imgobj) for (imgfile, imgobj, status) 
+                  in iterThumbs(imgdir, size, pklfile, nothumbchanges, tagwin)
+                      if status != 'failed']
+
+    # the show's over...
+    if busylabel:
+        busylabel.destroy()
+
+    return thumbs    # [(image-filename, PIL-thumb-image-object)]
+
+
+def iterThumbs(imgdir, size=(100, 100), pklfile='_PyPhoto-thumbs.pkl', 
+               nothumbchanges=False, tagswin=None, savesecs=SAVESECS):
+    """
+    ---------------------------------------------------------------------------
+    KBR: makeThumbs_pklfile as a generator, with no GUI: yields a tuple
+    (image-filename, PIL-thumb-image-object, status) for each image as soon
+    as its thumb is available, in display order; status is 'cached' (from
+    the thumbs cache), 'made' (new or changed image), 'placeholder' (image
+    unreadable), or 'failed' (thumb made, but it cannot be cached).  For
+    scripts and exporters that need not wait for, or hold, a whole folder.
+
+    The cache is saved as thumbs are made, at most every savesecs, and at
+    the end; also if the consumer stops early (the generator is closed), so
+    its work is kept.  Watermarks use tagswin.getTags(imgfile), as for the
+    GUI; with no tagswin, thumbs are not watermarked.  Partial saves carry
+    no folder fingerprint, so the next open checks every file; nor do saves
+    of runs with 'failed' thumbs, so their images are retried.
+    ---------------------------------------------------------------------------
+    """
+    initMarks()                # KBR Initialize the watermark images.
+
+    MODTIME, FILEBYTES = 0, 1  # dicts are expensive
+    thumbpath = thumbCachePath(imgdir, pklfile)
+
+    mimetypes.add_type("image/webp", ".webp") # python 3.10 doesn't support yet
+
+    def getTags(imgfile, cached=False):
+        # KBR with a tags scan running (TagView.initScan), cached thumbs'
+        # tags arrive from it: only new thumbs' watermarks wait for tags
+        if not tagswin or (cached and getattr(tagswin, 'scan', None)):
+            return 0
+        with span('tags.read'):
+            return tagswin.getTags(imgfile)
+
     # load existing thumbs cache
-    if not os.path.exists(thumbpath):
-        thumbcache = {}
-    else:
-        try:
-            thumbfile  = open(thumbpath, 'rb')
-            thumbcache = pickle.load(thumbfile)
-            thumbfile.close()
-        except:
-            # e.g., permissions?
-            # make all new in memory, and try save at end
-            traceback.print_exc()  
-            print('Cannot load thumbs-cache file: skipped')
-            thumbcache = {}
+    thumbcache = loadThumbCache(thumbpath)
+    if not thumbcache and thumbpath != os.path.join(imgdir, pklfile):
+        # KBR first external open: start from an in-folder cache, if any
+        # (e.g., one burned to the disc with the images), then save locally
+        thumbcache = loadThumbCache(os.path.join(imgdir, pklfile))
     thumbcachechanged = False
 
+    # KBR warm open: if the folder's fingerprint is as when the cache was
+    # saved, all cached thumbs are current and there are no new images, so
+    # skip all per-file reconciliation (see folderFingerprint); with
+    # nothumbchanges, in-place edits are ignored and the folder modtime
+    # (one stat) suffices
+    stored = thumbcache.pop(FINGERPRINT, None)
+    dirtime = os.stat(imgdir).st_mtime_ns
+    fingerprint = None
+    if stored and stored[0] == dirtime:
+        if not nothumbchanges:
+            fingerprint = folderFingerprint(imgdir, dirtime)
+        if nothumbchanges or fingerprint == stored:
+            for imgfile in sorted(thumbcache, key=str.lower):
+                if isTaggableImage(imgfile):
+                    imgobj = cachedThumb(thumbcache[imgfile][FILEBYTES], imgfile)
+                    markstate = getTags(imgfile, cached=True) # load tags for cached thumb
+                    yield (imgfile, imgobj, 'cached')
+            return
+    if fingerprint is None:
+        fingerprint = folderFingerprint(imgdir, dirtime)    # taken before changes
+
     # remove orphaned thumbs: image deleted or renamed
     for thumbname in list(thumbcache.keys()):              # for all thumbs (keys)
         imgpath = os.path.join(imgdir, thumbname)          # img dir file
@@ -465,106 +547,450 @@ def makeThumbs_pklfile(imgdir, size, pklfile, busywindow, nothumbchanges):
                 print('Could not remove thumb:', thumbname)
 
     # make new thumbs: for any/all new or changed images
-    thumbs = []
-    sortedimgs = sortedDisplayOrder(imgdir)                   # ignore case/plat diffs
-    for imgfile in sortedimgs:                                # for all files, by name
-      
-        if not isTaggableImage(imgfile): # don't show un-tag-able files
-            continue
-            
-        # check cache+timestamps
-        if ((imgfile in thumbcache) and 
-            (nothumbchanges or 
-               modtimeMatch(imgfile, imgdir, thumbtime=thumbcache[imgfile][MODTIME]) 
-               )): 
-            # use already-created thumb
-            imgdat = thumbcache[imgfile][FILEBYTES]           # file-save bytes
-            imgobj = Image.open(io.BytesIO(imgdat))           # pickled data => pil obj
-            thumbs.append((imgfile, imgobj))                  # in py-sorted() order
-
-            markstate = tagwin.getTags(imgfile) # load tags for cached thumb
+    finished = False
+    anyfailed = False
+    lastsave = time.monotonic()
+    unsaved = thumbcachechanged
+    try:
+        sortedimgs = sortedDisplayOrder(imgdir)               # ignore case/plat diffs
+        for imgfile in sortedimgs:                            # for all files, by name
+          
+            if not isTaggableImage(imgfile): # don't show un-tag-able files
+                continue
+                
+            # check cache+timestamps
+            if ((imgfile in thumbcache) and 
+                (nothumbchanges or 
+                   modtimeMatch(imgfile, imgdir, thumbtime=thumbcache[imgfile][MODTIME]) 
+                   )): 
+                # use already-created thumb
+                imgdat = thumbcache[imgfile][FILEBYTES]       # file-save bytes
+                imgobj = cachedThumb(imgdat, imgfile)         # pickled data => pil obj
+                markstate = getTags(imgfile, cached=True) # load tags for cached thumb
+                yield (imgfile, imgobj, 'cached')             # in py-sorted() order
+
+            else:
+                # new or changed: make new thumb
+#                print('Making thumb for', imgfile)
+                markstate = getTags(imgfile)
+                imgobj, entry = makeThumbEntry(imgdir, imgfile, size, markstate)
+                if entry:
+                    thumbcache[imgfile] = entry             # pickled tuple
+                    thumbcachechanged = unsaved = True
+                    status = 'placeholder' if getattr(imgobj, 'placeholder', False) else 'made'
+                else:
+                    status = 'failed'
+                    anyfailed = True
+
+                # KBR save progress now and then, not per thumb (whole-file rewrites)
+                if unsaved and time.monotonic() - lastsave >= savesecs:
+                    saveThumbCache(thumbpath, thumbcache)
+                    lastsave, unsaved = time.monotonic(), False
+                yield (imgfile, imgobj, status)             # yielded tuple
+        finished = True
+
+    finally:
+        # update pickle file if any changes (KBR or a new fingerprint);
+        # an unfinished scan's cache is current only for the files it saw,
+        # and one with failed thumbs lacks them: a fingerprint would skip them
+        if finished and not anyfailed:
+            thumbcache[FINGERPRINT] = fingerprint
+            if thumbcachechanged or fingerprint != stored:
+                saveThumbCache(thumbpath, thumbcache)
+        elif finished:
+            if thumbcachechanged or stored:
+                saveThumbCache(thumbpath, thumbcache)       # without fingerprint
+        elif unsaved:
+            saveThumbCache(thumbpath, thumbcache)
+
+
+def cachedThumb(imgdat, imgfile):
+    # KBR 'native' thumbs are in their image's format: e.g., AVIF needs its
+    # plugin (this also covers ThumbResidency's later re-decodes)
+    loadCodecPlugins(imgfile)
+    imgobj = Image.open(io.BytesIO(imgdat))           # pickled data => pil obj
+    imgobj.cachebytes = imgdat                        # KBR for lazy re-decodes
+    return imgobj
+
+
+def folderFingerprint(imgdir, dirtime):
+    """
+    ---------------------------------------------------------------------------
+    KBR: (folder modtime, digest of all images' (name, size, mtime_ns)), as
+    stored in the thumbs cache under key FINGERPRINT.  The folder modtime
+    changes on adds, removes, and renames; the digest also catches in-place
+    edits.  One scandir(), instead of 2 stats per image plus a listdir().
+    ---------------------------------------------------------------------------
+    """
+    entries = []
+    for entry in os.scandir(imgdir):
+        if isTaggableImage(entry.name) and entry.is_file():
+            stat = entry.stat()
+            entries.append((entry.name, stat.st_size, stat.st_mtime_ns))
+    digest = hashlib.sha1()
+    for (name, size, modtime) in sorted(entries):
+        digest.update(('%s\0%d\0%d\n' % (name, size, modtime)).encode('utf8', 'surrogateescape'))
+    return (dirtime, digest.hexdigest())
+
+
+def setCacheRoot(path, always=False):
+    """
+    KBR: set from pyphoto's "CacheRoot" and "CacheAlways" configs
+    """
+    global cacheroot, cachealways
+    cacheroot = path
+    cachealways = always
+
+
+def defaultCacheRoot():
+    # KBR the platform's per-user cache folder
+    if sys.platform.startswith('win'):
+        base = os.environ.get('LOCALAPPDATA') or os.path.expanduser('~')
+        return os.path.join(base, 'PyTagger', 'thumbs')
+    elif sys.platform.startswith('darwin'):
+        return os.path.expanduser('~/Library/Caches/PyTagger')
+    else:
+        base = os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache')
+        return os.path.join(base, 'pytagger')
 
+
+def mountPoint(path):
+    # KBR the folder path is mounted at: the root of its volume
+    path = os.path.realpath(path)
+    while not os.path.ismount(path):
+        parent = os.path.dirname(path)
+        if parent == path:
+            break
+        path = parent
+    return path
+
+
+def linuxVolumeId(mount):
+    """
+    KBR: the UUID, else label, of the filesystem mounted at mount, per
+    /proc/self/mounts and /dev/disk's links; optical discs have them too
+    """
+    unescape = lambda field: re.sub(r'\\([0-7]{3})', lambda m: chr(int(m.group(1), 8)), field)
+    device = None
+    with open('/proc/self/mounts') as mounts:
+        for line in mounts:
+            fields = line.split()
+            if len(fields) > 1 and unescape(fields[1]) == mount:
+                device = unescape(fields[0])             # last wins: over-mounts
+    if device and device.startswith('/dev/'):
+        device = os.path.realpath(device)
+        for kind in ('by-uuid', 'by-label'):
+            linkdir = os.path.join('/dev/disk', kind)
+            if os.path.isdir(linkdir):
+                for name in os.listdir(linkdir):
+                    if os.path.realpath(os.path.join(linkdir, name)) == device:
+                        return name
+    return None
+
+
+def macVolumeId(mount):
+    # KBR the volume UUID, else name, of the filesystem mounted at mount
+    import plistlib, subprocess
+    info = subprocess.run(['diskutil', 'info', '-plist', mount],
+                          capture_output=True, timeout=10).stdout
+    info = plistlib.loads(info) if info else {}
+    return info.get('VolumeUUID') or info.get('VolumeName')
+
+
+def volumeId(imgdir):
+    """
+    ---------------------------------------------------------------------------
+    KBR: an id for the volume holding imgdir, that differs per disc in the
+    same drive.  On Windows, st_dev is the volume serial number; elsewhere,
+    it's the device (the drive), so this is the filesystem's UUID or label
+    when it can be found, else st_dev.  Ids are kept per mount point and its
+    stat, so a disc change is a new lookup.  Returns a filename-safe string.
+    ---------------------------------------------------------------------------
+    """
+    try:
+        stat = os.stat(imgdir)
+    except OSError:
+        return '0'
+    volume = None
+    if not sys.platform.startswith('win'):
+        mount = mountPoint(imgdir)
+        try:
+            mountstat = os.stat(mount)
+            key = (mount, mountstat.st_dev, mountstat.st_ino, mountstat.st_mtime)
+        except OSError:
+            key = None
+        if key and key in volumeids:
+            volume = volumeids[key]
         else:
-            # new or changed: make new thumb
-#            print('Making thumb for', imgfile)
-            phfile  = None
-            imgpath = os.path.join(imgdir, imgfile)           # open and downsize
             try:
-                # [2.2] avoid Pillow too-many-open-files bug
-                imgobj = openImageSafely(imgpath)
+                if sys.platform.startswith('darwin'):
+                    volume = macVolumeId(mount)
+                else:
+                    volume = linuxVolumeId(mount)
+            except Exception:
+                volume = None                            # st_dev will do
+            if key:
+                volumeids[key] = volume
+    if not volume:
+        return '%x' % stat.st_dev
+    return re.sub(r'[^A-Za-z0-9._-]', '_', volume)
 
-                # [2.2] reorient image to right-side up, iff needed
-                imgobj = reorientImage(imgobj)
 
-                # make thumb, changes imgobj in-place
-                if hasattr(Image, 'LANCZOS'):
-                    imgobj.thumbnail(size, Image.LANCZOS)     # now called this,
-                else:                                         # newer Pillows only
-                    imgobj.thumbnail(size, Image.ANTIALIAS)   # best downsize filter
-            except:
-                # on any rare exception, not always IOError
-                # don't skip: make+use a placeholder instead of omitting
-                traceback.print_exc()
-                print('Error making thumb, trying placeholder: ', imgpath)
-                phpath, phfile = findPlaceholder()
-                if phpath:
-                    # [2.2] avoid Pillow too-many-open-files bug
-                    imgobj = openImageSafely(phpath)
-                else:
-                    # fallback: use a white borderless image (no name ok)
-                    imgobj = Image.new(mode='1', size=size, color='#FFFFFF') 
-                imgobj.thumbnail(size, Image.ANTIALIAS)
+def thumbCachePath(imgdir, pklfile):
+    """
+    ---------------------------------------------------------------------------
+    KBR: where imgdir's thumbs cache is kept.  Normally pklfile in imgdir, as
+    always; but if imgdir is not writable (BD-R discs, read-only shares), or
+    "cachealways" is set, a file in the cache root, named for the volume (see
+    volumeId: a filesystem UUID or label, or the volume serial number on
+    Windows) and a hash of imgdir's absolute path, so same-named folders on
+    different discs don't collide.  Where no volume id can be found, the
+    device is used, and discs in the same drive share a cache file: its
+    per-entry modtimes then keep thumbs from being reused for other images.
+    Falls back on the in-folder path if the cache root can't be made.
+    ---------------------------------------------------------------------------
+    """
+    infolder = os.path.join(imgdir, pklfile)
+    if not cachealways:
+        if os.path.exists(infolder):
+            writable = os.access(infolder, os.W_OK) and os.access(imgdir, os.W_OK)
+        else:
+            writable = os.access(imgdir, os.W_OK)
+        if writable:
+            return infolder
+
+    imgdir = os.path.abspath(imgdir)
+    volume = volumeId(imgdir)
+    pathhash = hashlib.sha1(imgdir.encode('utf8', 'surrogateescape')).hexdigest()[:24]
+    root = cacheroot or defaultCacheRoot()
+    try:
+        os.makedirs(root, exist_ok=True)
+    except OSError:
+        traceback.print_exc()
+        print('Cannot make thumbs-cache root: using image folder')
+        return infolder
+    return os.path.join(root, '%s-%s-%s' % (volume, pathhash, pklfile))
 
-            # KBR apply a watermark image for files with tags or errors
-            markstate = tagwin.getTags(imgfile)
-            if markstate == 1:                # image has tags
-                imgobj.paste(markImg, (5, 5))
-            elif markstate == 2:              # image has tag error
-                imgobj.paste(errMarkImg, (5,5))
 
-            try:
-                # add img-modtime + thumb-img-bytes to cache
-                tiffs = ('.tif', '.tiff')
-                extras = {} 
-                if imgfile.lower().endswith(tiffs):
-                    # workaround for C lib hardcrash, per [SA] note ahead
-                    extras = dict(compression='raw')
-
-                # [2.2] pass format for older pills that botch image.name
-                imagename = phfile or imgfile
-                imgfmt = getImageFormat(imagename)
-
-                # direct pickles fail, so pickle file-save binary data
-                imgbuf = io.BytesIO()
-                imgbuf.name = imagename                     # force PIL img format?
-                imgobj.save(imgbuf, imgfmt, **extras)       # save to byte buffer
-                imgdat = imgbuf.getvalue()                  # saves phfile too
-
-                modtime = os.path.getmtime(imgpath)
-                thumbcache[imgfile] = (modtime, imgdat)     # pickled tuple
-                thumbcachechanged = True
-                thumbs.append((imgfile, imgobj))            # returned tuple
-            except:
-                traceback.print_exc()  
-                print('Error updating cache - may remake thumb:', imgpath)
+def initMarks():
+    # KBR decode the embedded watermark images, once
+    global markImg, errMarkImg
+    if markImg is None:
+        markImg=Image.open(io.BytesIO(base64.b64decode(markbytes)))
+        errMarkImg =Image.open(io.BytesIO(base64.b64decode(errMarkBytes)))
 
-    # update pickle file if any changes
-    if thumbcachechanged:
-        try:
+
+def setCacheEncoding(encoding='native', framing=None):
+    """
+    KBR: set from pyphoto's "CacheEncoding" and "CacheFraming" configs
+    """
+    global cacheencoding, cacheframing
+    if encoding not in ('native', 'webp', 'jpeg'):
+        raise ValueError('Unknown thumbs-cache encoding: %s' % encoding)
+    if framing not in (None, 'zlib', 'lzma'):
+        raise ValueError('Unknown thumbs-cache framing: %s' % framing)
+    cacheencoding = encoding
+    cacheframing = framing
+
+
+def unframeCache(data):
+    """
+    KBR: a cache file's pickle bytes; compressed files are recognized by
+    their own headers (a pickle starts with its protocol opcode, 0x80)
+    """
+    if data.startswith(b'\xfd7zXZ\x00'):
+        import lzma
+        return lzma.decompress(data)
+    elif data.startswith(b'\x78'):
+        return zlib.decompress(data)
+    return data
+
+
+def frameCache(data):
+    if cacheframing == 'zlib':
+        return zlib.compress(data, 6)
+    elif cacheframing == 'lzma':
+        import lzma
+        return lzma.compress(data, preset=1)
+    return data
+
+
+def loadThumbCache(thumbpath):
+    """
+    load a pickled thumbs cache dict, or return an empty one;
+    KBR: the file may be zlib- or lzma-compressed (see frameCache)
+    """
+    if not os.path.exists(thumbpath):
+        return {}
+    try:
+        with span('cache.load'):
+            thumbfile  = open(thumbpath, 'rb')
+            thumbdata  = thumbfile.read()                # one read: NAS-friendly
+            thumbfile.close()
+            return pickle.loads(unframeCache(thumbdata))
+    except:
+        # e.g., permissions?
+        # make all new in memory, and try save at end
+        traceback.print_exc()  
+        print('Cannot load thumbs-cache file: skipped')
+        return {}
+
+
+def saveThumbCache(thumbpath, thumbcache):
+    try:
+        with span('cache.save'):
+            thumbdata  = frameCache(pickle.dumps(thumbcache))   # one big object
             thumbfile  = open(thumbpath, 'wb')                   # save cache dict
-            thumbcache = pickle.dump(thumbcache, thumbfile)      # one big object
-            thumbfile.close()                                    # shelves are complex
-        except:
-            # e.g., unwriteable optical disk?
-            # use thumbs list in memory, rebuild on each open
-            traceback.print_exc()  
-            print('Cannot save thumbs-cache file: skipped')
+            thumbfile.write(thumbdata)                           # shelves are complex
+            thumbfile.close()
+    except:
+        # e.g., unwriteable optical disk?
+        # use thumbs list in memory, rebuild on each open
+        traceback.print_exc()  
+        print('Cannot save thumbs-cache file: skipped')
 
-    # the show's over...
-    if busylabel:
-        busylabel.destroy()
 
-    return thumbs    # [(image-filename, PIL-thumb-image-object)]
+def makeThumbEntry(imgdir, imgfile, size, markstate):
+    """
+    ---------------------------------------------------------------------------
+    KBR: make one new thumb, watermarked per markstate (see TagView.getTags).
+    Returns (PIL-thumb-image-object, (image-file-modtime, thumb-file-bytes));
+    the cache entry is None if the thumb could not be saved.  A placeholder
+    thumb is returned for images that cannot be read, as before.
+    Factored out of makeThumbs_pklfile for use by updateThumbs too.
+    ---------------------------------------------------------------------------
+    """
+    phfile  = None
+    imgpath = os.path.join(imgdir, imgfile)           # open and downsize
+    try:
+        with span('thumb.open'):
+            # [2.2] avoid Pillow too-many-open-files bug
+            imgobj = openImageSafely(imgpath)
+
+            # [2.2] reorient image to right-side up, iff needed
+            imgobj = reorientImage(imgobj)
+
+        # make thumb, changes imgobj in-place
+        with span('thumb.resize'):
+            if hasattr(Image, 'LANCZOS'):
+                imgobj.thumbnail(size, Image.LANCZOS)     # now called this,
+            else:                                         # newer Pillows only
+                imgobj.thumbnail(size, Image.ANTIALIAS)   # best downsize filter
+    except:
+        # on any rare exception, not always IOError
+        # don't skip: make+use a placeholder instead of omitting
+        traceback.print_exc()
+        print('Error making thumb, trying placeholder: ', imgpath)
+        phpath, phfile = findPlaceholder()
+        if phpath:
+            # [2.2] avoid Pillow too-many-open-files bug
+            imgobj = openImageSafely(phpath)
+        else:
+            # fallback: use a white borderless image (no name ok)
+            imgobj = Image.new(mode='1', size=size, color='#FFFFFF') 
+        imgobj.thumbnail(size, getattr(Image, 'LANCZOS', None) or Image.ANTIALIAS)
+        imgobj.placeholder = True                     # KBR for iterThumbs
+
+    # KBR apply a watermark image for files with tags or errors
+    if markstate == 1:                # image has tags
+        imgobj.paste(markImg, (5, 5))
+    elif markstate == 2:              # image has tag error
+        imgobj.paste(errMarkImg, (5,5))
+
+    try:
+        # add img-modtime + thumb-img-bytes to cache
+        with span('thumb.encode'):
+            imgdat = encodeThumb(imgobj, phfile or imgfile)   # saves phfile too
+        modtime = os.path.getmtime(imgpath)
+        imgobj.cachebytes = imgdat                  # KBR for lazy re-decodes
+        return imgobj, (modtime, imgdat)
+    except:
+        traceback.print_exc()  
+        print('Error updating cache - may remake thumb:', imgpath)
+        return imgobj, None
+
+
+def encodeThumb(imgobj, imagename):
+    """
+    ---------------------------------------------------------------------------
+    KBR: a thumb's cache bytes, in the "cacheencoding" format: 'native' saves
+    it in its image's own format, as before (raw TIFFs, PNG screenshots, etc.);
+    'webp' and 'jpeg' normalize all thumbs to a small lossy format.  Cached
+    thumbs in any format load, so changing this needs no cache rebuild: new
+    and changed thumbs simply use the new format.
+    ---------------------------------------------------------------------------
+    """
+    imgbuf = io.BytesIO()
+    if cacheencoding == 'webp':
+        if imgobj.mode not in ('RGB', 'RGBA'):
+            alpha = 'A' in imgobj.getbands() or 'transparency' in imgobj.info
+            imgobj = imgobj.convert('RGBA' if alpha else 'RGB')
+        imgobj.save(imgbuf, 'WEBP', quality=THUMBQUALITY, method=4)
+        return imgbuf.getvalue()
+    elif cacheencoding == 'jpeg':
+        if imgobj.mode not in ('RGB', 'L'):
+            imgobj = imgobj.convert('RGB')
+        imgobj.save(imgbuf, 'JPEG', quality=THUMBQUALITY)
+        return imgbuf.getvalue()
+
+    tiffs = ('.tif', '.tiff')
+    extras = {} 
+    if imagename.lower().endswith(tiffs):
+        # workaround for C lib hardcrash, per [SA] note ahead
+        extras = dict(compression='raw')
+
+    # [2.2] pass format for older pills that botch image.name
+    imgfmt = getImageFormat(imagename)
+
+    # direct pickles fail, so pickle file-save binary data
+    imgbuf.name = imagename                     # force PIL img format?
+    imgobj.save(imgbuf, imgfmt, **extras)       # save to byte buffer
+    return imgbuf.getvalue()
+
+
+def updateThumbs(imgdir, imgfiles, size=(100, 100),
+                 pklfile='_PyPhoto-thumbs.pkl', _tagswin=None):
+    """
+    ---------------------------------------------------------------------------
+    KBR: incremental makeThumbs_pklfile, for folder watchers: remake only the
+    named files' thumbs, drop those of named files now gone, and rewrite the
+    cache file once.  Tags of remade files are (re)read via _tagswin.  Returns
+    ([(image-filename, PIL-thumb-image-object)], [removed-image-filename]);
+    files whose cached thumb is still current are returned with that thumb
+    (callers can compare its "cachebytes").  Names that are not taggable
+    images are ignored.
+    ---------------------------------------------------------------------------
+    """
+    global tagwin
+    tagwin = _tagswin
+    initMarks()
+    thumbpath = thumbCachePath(imgdir, pklfile)
+    thumbcache = loadThumbCache(thumbpath)
+    thumbcachechanged = False
+
+    made, removed = [], []
+    for imgfile in sorted(set(imgfiles), key=str.lower):
+        if not isTaggableImage(imgfile):
+            continue
+        if not os.path.exists(os.path.join(imgdir, imgfile)):
+            removed.append(imgfile)
+            if thumbcache.pop(imgfile, None) is not None:
+                thumbcachechanged = True
+        elif (imgfile in thumbcache and
+              modtimeMatch(imgfile, imgdir, thumbtime=thumbcache[imgfile][0])):
+            # unchanged (e.g., chmod, or a lost-track recheck): cached thumb
+            made.append((imgfile, cachedThumb(thumbcache[imgfile][1], imgfile)))
+        else:
+            markstate = tagwin.getTags(imgfile)
+            imgobj, entry = makeThumbEntry(imgdir, imgfile, size, markstate)
+            if entry:
+                thumbcache[imgfile] = entry
+                thumbcachechanged = True
+            made.append((imgfile, imgobj))
+
+    if thumbcachechanged:
+        saveThumbCache(thumbpath, thumbcache)
+    return made, removed
 
 
 ###############################################################################
@@ -721,6 +1147,7 @@ def makeThumbs_subdir(imgdir, size, subdir, busywindow):
 #            print('Making thumb for', thumbpath)
             imgpath = os.path.join(imgdir, imgfile)
             try:
+                loadCodecPlugins(imgpath)
                 imgobj = Image.open(imgpath)            # else make new thumb
                 if hasattr(Image, 'LANCZOS'):                
                     imgobj.thumbnail(size, Image.LANCZOS)    # [SA] now called this